@@ -52,8 +52,9 @@ def retrain_with_new_data(**context):
     # Utiliser le même trainer que pour l'entraînement normal
     from trainer import train_from_database
     
-    # Mais avec plus d'époques pour l'entraînement continu
-    result = train_from_database(num_epochs=10)
+    # Mais avec plus d'époques pour l'entraînement continu: seule la tête dense
+    # est réentraînée, les embeddings des images déjà vues sont lus dans MinIO
+    result = train_from_database(num_epochs=10, training_mode="embeddings")
     
     print(f"✅ Réentraînement terminé:")
     print(f"  - Précision: {result['accuracy']:.2%}")
@@ -154,10 +154,12 @@ def train_model(**context):
     try:
         if training_data['training_mode'] == 'minio_keys':
             # Entraîner avec les clés S3
+            # Lecture en flux des shards TFRecord (images non empaquetées lues une à une)
             result = train_from_s3_keys(
                 training_data['s3_keys'],
                 training_data['labels'],
-                num_epochs=5
+                num_epochs=5,
+                loader="shards"
             )
         else:
             # Entraîner avec les données par défaut
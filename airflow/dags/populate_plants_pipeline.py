@@ -6,6 +6,9 @@ from datetime import datetime
 import pandas as pd
 from io import BytesIO
 import requests 
+import sys
+
+sys.path.append('/opt/airflow/ml/models')
 
 from scripts.populate_database import populate_initial_metadata
 
@@ -78,6 +81,31 @@ def _download_and_upload_to_s3(**kwargs):
         except Exception as e:
             print(f"An unexpected error occurred processing {url_source} for S3 upload: {e}. Skipping upload.")
 
+def _pack_dataset_shards(**kwargs):
+    """
+    Packs uploaded images into pre-resized TFRecord shards for training.
+
+    Only images missing from the shard manifest are packed, so each run of
+    this DAG produces new shards for the newly ingested rows only.
+    """
+    from dataset_shards import pack_new_images
+
+    df = MySqlHook(mysql_conn_id='mysql_default').get_pandas_df(
+        sql="SELECT url_s3, label FROM plants_data WHERE image_exists = TRUE AND url_s3 IS NOT NULL;"
+    )
+    prefix = f"s3://{S3_BUCKET_NAME}/"
+    rows = df[df['url_s3'].str.startswith(prefix)]
+    s3_keys = [url_s3[len(prefix):] for url_s3 in rows['url_s3']]
+
+    summary = pack_new_images(
+        s3_keys,
+        list(rows['label']),
+        S3Hook(aws_conn_id='s3_connec').get_conn(),
+        bucket_name=S3_BUCKET_NAME
+    )
+    print(f"Packed {summary['new_images']} new images, {summary['total_images']} images in {summary['total_shards']} shards.")
+    return summary
+
 with DAG(
     dag_id='plants_data_ingestion_pipeline',
     start_date=datetime(2023, 1, 1),
@@ -95,6 +123,8 @@ with DAG(
         been uploaded to S3 yet.
     3.  **Download & Upload:** Downloads images and uploads them to MinIO/S3,
         then updates the database with the S3 paths.
+    4.  **Pack Shards:** Writes the newly uploaded images, resized and labelled,
+        into ~100 MB TFRecord shards under `packed/` (incremental via a manifest).
     """
 ) as dag:
     populate_dandelion_task = PythonOperator(
@@ -124,4 +154,10 @@ with DAG(
         provide_context=True,
     )
 
-    [populate_dandelion_task, populate_grass_task] >> get_new_data_for_s3_upload >> download_and_upload_task
\ No newline at end of file
+    pack_dataset_shards_task = PythonOperator(
+        task_id='pack_dataset_shards',
+        python_callable=_pack_dataset_shards,
+        provide_context=True,
+    )
+
+    [populate_dandelion_task, populate_grass_task] >> get_new_data_for_s3_upload >> download_and_upload_task >> pack_dataset_shards_task
\ No newline at end of file
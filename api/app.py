@@ -1,21 +1,39 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+from typing import List
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 import tensorflow as tf
 from tensorflow import keras
 import numpy as np
-from PIL import Image
-import io
 import logging
 from pathlib import Path
 import os
-import requests
 import boto3
 from datetime import datetime
 from botocore.exceptions import ClientError
-import tempfile
 import json
+import time
+import asyncio
+import uuid
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+
+from batching import MicroBatcher
+from inference import InferenceExecutor, configure_tensorflow_threads, default_num_workers
+from metrics import BATCHER_QUEUE_DEPTH
+from backends import (
+    KerasBackend, TFLiteBackend, TFLITE_QUANTIZATIONS, DEFAULT_BATCH_BUCKETS,
+    load_or_convert_tflite, sample_calibration_images
+)
+from preprocessing import decode_to_uint8, image_to_uint8, open_image
+from streaming import DuplexStreamingResponse, iter_ndjson_lines, parse_stream_item, strip_raw_data_prefix
+from prediction_cache import PredictionCache, bytes_cache_key, remote_cache_key
+from fetcher import ImageFetcher, ImageTooLargeError
+from object_store import RawDataReader
+from precision import resolve_precision, with_precision
+from model_artifacts import ModelFileCache, load_model_artifact
+from model_holder import ModelHolder, ModelLeaseMiddleware, ServedModel, leased_model
+from model_registry import ModelRegistry
 
 # Configuration TensorFlow
 tf.config.set_visible_devices([], 'GPU')
@@ -23,9 +41,26 @@ tf.config.set_visible_devices([], 'GPU')
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Exécuteur d'inférence dimensionné sur les cœurs, threads TensorFlow alignés
+INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS') or default_num_workers())
+configure_tensorflow_threads(
+    intra_op_threads=int(os.getenv('TF_INTRA_OP_THREADS', str(INFERENCE_WORKERS))),
+    inter_op_threads=int(os.getenv('TF_INTER_OP_THREADS', '2'))
+)
+
 class ImageUrlRequest(BaseModel):
     image_url: str
 
+class BatchUrlRequest(BaseModel):
+    image_urls: List[str] = []
+    s3_keys: List[str] = []
+
+class S3ImageRequest(BaseModel):
+    s3_key: str
+
+class S3BatchRequest(BaseModel):
+    s3_keys: List[str]
+
 app = FastAPI(
     title="Plant Classification API (TensorFlow + MinIO)",
     description="API pour la classification d'images de plantes avec TensorFlow et stockage MinIO",
@@ -41,14 +76,89 @@ app.add_middleware(
 )
 
 # Variables globales
-model = None
 class_names = {0: "grass", 1: "dandelion"}
 minio_client = None
+batcher = None
+raw_data_reader = None
+inference_executor = InferenceExecutor(INFERENCE_WORKERS)
+
+# Version servie, remplacée à chaud (voir model_holder.py); chaque requête de
+# prédiction garde la version présente à son arrivée
+model_holder = ModelHolder(drain_timeout=float(os.getenv('MODEL_DRAIN_TIMEOUT', '30')))
+app.add_middleware(ModelLeaseMiddleware, holder=model_holder)
+
+# Limites des images
+MAX_FILE_SIZE = 10 * 1024 * 1024  # 10 MB
+MIN_IMAGE_SIZE = 32
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+RAW_DATA_BUCKET = 'raw-data'
+
+# Pagination de /models
+MODELS_PAGE_SIZE = int(os.getenv('MODELS_PAGE_SIZE', '50'))
+MODELS_MAX_PAGE_SIZE = 500
+
+# Cache disque des modèles adressé par sha256 (désactivé si MODEL_CACHE_DIR est vide)
+MODEL_CACHE_DIR = os.getenv('MODEL_CACHE_DIR', 'models')
+MODEL_CACHE_VERSIONS = int(os.getenv('MODEL_CACHE_VERSIONS', '3'))
+
+# Nombre maximal d'images par requête /predict-batch
+MAX_BATCH_ITEMS = int(os.getenv('MAX_BATCH_ITEMS', '64'))
+
+# Nombre maximal d'images en cours de traitement par flux /predict-stream
+STREAM_MAX_IN_FLIGHT = int(os.getenv('STREAM_MAX_IN_FLIGHT', '32'))
+
+# Taille maximale d'une ligne du flux /predict-stream (au-delà: erreur, ligne ignorée)
+STREAM_MAX_LINE_BYTES = int(os.getenv('STREAM_MAX_LINE_BYTES', str(64 * 1024)))
+
+# Backend de serving: "keras" (TensorFlow complet) ou "tflite" (quantifié)
+INFERENCE_BACKEND = os.getenv('INFERENCE_BACKEND', 'keras').lower()
+TFLITE_QUANTIZATION = os.getenv('TFLITE_QUANTIZATION', 'dynamic').lower()
+TFLITE_CALIBRATION_SAMPLES = int(os.getenv('TFLITE_CALIBRATION_SAMPLES', '100'))
+# Précision du backend Keras: "float32" ou "mixed_bfloat16" (BN repliées, softmax en float32)
+MODEL_PRECISION = resolve_precision(os.getenv('MODEL_PRECISION'))
+
+# Tailles de batch préchauffées (signature Keras compilée, interpréteurs TFLite)
+SERVING_BATCH_BUCKETS = [
+    int(size) for size in os.getenv(
+        'SERVING_BATCH_BUCKETS', ','.join(str(size) for size in DEFAULT_BATCH_BUCKETS)
+    ).split(',') if size.strip()
+]
+
+# Configuration du micro-batching
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', '16'))
+BATCH_MAX_WAIT_US = int(os.getenv('BATCH_MAX_WAIT_US', '2000'))
+
+# Connexions du client S3 partagé pour la lecture du bucket raw-data
+S3_MAX_POOL_CONNECTIONS = int(os.getenv('S3_MAX_POOL_CONNECTIONS', '32'))
+
+# Téléchargement des images distantes (cache disque désactivé si URL_CACHE_DIR est vide)
+url_fetcher = ImageFetcher(
+    MAX_FILE_SIZE,
+    timeout=float(os.getenv('URL_FETCH_TIMEOUT', '10')),
+    max_connections=int(os.getenv('URL_FETCH_MAX_CONNECTIONS', '100')),
+    per_host_limit=int(os.getenv('URL_FETCH_PER_HOST', '8')),
+    cache_dir=os.getenv('URL_CACHE_DIR') or None,
+    cache_ttl=int(os.getenv('URL_CACHE_TTL', '300')),
+    cache_max_bytes=int(os.getenv('URL_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+)
+
+# Cache des prédictions: "memory" (LRU local), "redis" (partagé) ou "none"
+prediction_cache = PredictionCache.from_config(
+    os.getenv('PREDICTION_CACHE_BACKEND', 'memory').lower(),
+    max_entries=int(os.getenv('PREDICTION_CACHE_MAX_ENTRIES', '4096')),
+    ttl_seconds=int(os.getenv('PREDICTION_CACHE_TTL', '3600')),
+    redis_url=os.getenv('REDIS_URL')
+)
 
 class MinIOModelManager:
-    """Gestionnaire pour charger des modèles depuis MinIO"""
+    """Gestionnaire pour charger des modèles depuis MinIO
     
-    def __init__(self):
+    Les versions sont résolues par le registre du bucket (voir
+    model_registry.py, revalidé par ETag); les clés historiques et le
+    listage du bucket ne servent que pour les modèles antérieurs au registre.
+    """
+    
+    def __init__(self, cache_dir=None, cache_versions=3):
         self.s3_client = boto3.client(
             's3',
             endpoint_url=os.getenv('MLFLOW_S3_ENDPOINT_URL', 'http://minio:9000'),
@@ -57,141 +167,291 @@ class MinIOModelManager:
             region_name='us-east-1'
         )
         self.bucket_name = 'models'
+        self._registries = {}
+        self.last_load = None
+        self.cache = None
+        if cache_dir:
+            try:
+                self.cache = ModelFileCache(cache_dir, cache_versions)
+            except OSError as e:
+                logger.warning(f"Cache disque des modèles désactivé ({cache_dir}): {e}")
+    
+    def registry(self, model_name="plant_classifier"):
+        if model_name not in self._registries:
+            self._registries[model_name] = ModelRegistry(self.s3_client, self.bucket_name, model_name)
+        return self._registries[model_name]
     
     def load_model_from_minio(self, model_name="plant_classifier", version="latest"):
-        """Charger un modèle depuis MinIO"""
+        """Charger un modèle depuis MinIO: (modèle, clé S3) ou (None, None)
+        
+        Le modèle est lu en mémoire (voir model_artifacts.py), sans HEAD
+        préalable, ou repris du cache disque si son empreinte n'a pas changé;
+        clé, ETag, origine et durées de résolution, téléchargement et
+        désérialisation sont conservés dans `last_load`.
+        """
+        load_start = time.perf_counter()
+        candidates = self.model_candidates(model_name, version)
+        resolve_seconds = round(time.perf_counter() - load_start, 3)
+        
+        logger.info(f"Candidats: {', '.join(candidate['key'] for candidate in candidates)}")
+        model, loaded, timings = load_model_artifact(
+            self.s3_client, self.bucket_name, candidates, log=logger.warning, cache=self.cache
+        )
+        if model is None:
+            logger.error("Aucun modèle trouvé dans MinIO")
+            return None, None
         
-        # Essayer différents formats
-        possible_keys = [
+        self.last_load = {
+            **loaded,
+            'timings': {'resolve_seconds': resolve_seconds, **timings,
+                        'total_seconds': round(time.perf_counter() - load_start, 3)}
+        }
+        logger.info(f"Modèle chargé depuis MinIO: s3://{self.bucket_name}/{loaded['key']} ({self.last_load['timings']})")
+        return model, loaded['key']
+    
+    def model_candidates(self, model_name="plant_classifier", version="latest"):
+        """Objets à essayer, par ordre de préférence: entrée du registre (taille, ETag, sha256), puis clés historiques"""
+        candidates = []
+        try:
+            entry = self.registry(model_name).get(version)
+            if entry:
+                candidates.append({name: entry.get(name) for name in ('key', 'size', 'etag', 'sha256')})
+        except Exception as e:
+            entry = None
+            logger.error(f"Erreur lecture du registre: {e}")
+        
+        # Clés historiques (modèles antérieurs au registre)
+        keys = [
             f"tensorflow/{model_name}_{version}.keras",
             f"tensorflow/{model_name}_{version}.h5",
             f"tensorflow/{model_name}_latest.keras",
             f"tensorflow/{model_name}_latest.h5"
         ]
         
-        # Lister tous les modèles disponibles si version n'est pas "latest"
-        if version != "latest":
+        # Version inconnue du registre: les 3 modèles les plus récents du bucket
+        if version != "latest" and entry is None:
             try:
-                response = self.s3_client.list_objects_v2(
-                    Bucket=self.bucket_name,
-                    Prefix=f"tensorflow/{model_name}_"
-                )
-                
-                if 'Contents' in response:
-                    # Trier par date de modification (plus récent en premier)
-                    objects = sorted(response['Contents'], key=lambda x: x['LastModified'], reverse=True)
-                    
-                    # Ajouter les modèles les plus récents à la liste
-                    for obj in objects[:3]:  # Prendre les 3 plus récents
-                        key = obj['Key']
-                        if key.endswith(('.keras', '.h5')) and key not in possible_keys:
-                            possible_keys.append(key)
-                            
+                keys += [model_info['key'] for model_info in self.scan_models(model_name)[:3]]
             except Exception as e:
                 logger.error(f"Erreur listage modèles: {e}")
         
-        # Essayer de charger chaque modèle
-        for s3_key in possible_keys:
-            try:
-                logger.info(f"Tentative de chargement: s3://{self.bucket_name}/{s3_key}")
-                
-                # Vérifier si l'objet existe
-                self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)
-                
-                # Télécharger dans un fichier temporaire
-                with tempfile.NamedTemporaryFile(suffix='.keras' if s3_key.endswith('.keras') else '.h5', delete=False) as tmp_file:
-                    self.s3_client.download_file(self.bucket_name, s3_key, tmp_file.name)
-                    
-                    # Charger le modèle
-                    model = keras.models.load_model(tmp_file.name)
-                    
-                    # Nettoyer le fichier temporaire
-                    os.unlink(tmp_file.name)
-                    
-                    logger.info(f"Modèle chargé depuis MinIO: s3://{self.bucket_name}/{s3_key}")
-                    return model, s3_key
-                    
-            except ClientError as e:
-                if e.response['Error']['Code'] == '404':
-                    logger.warning(f"Modèle non trouvé: s3://{self.bucket_name}/{s3_key}")
-                else:
-                    logger.error(f"Erreur accès modèle {s3_key}: {e}")
-            except Exception as e:
-                logger.error(f"Erreur chargement modèle {s3_key}: {e}")
+        for s3_key in keys:
+            if all(candidate['key'] != s3_key for candidate in candidates):
+                candidates.append({'key': s3_key})
+        return candidates
+    
+    def scan_models(self, model_name="plant_classifier"):
+        """Modèles trouvés en listant le bucket (toutes les pages), du plus récent au plus ancien"""
+        models = []
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=f"tensorflow/{model_name}_"):
+            for obj in page.get('Contents', []):
+                key = obj['Key']
+                if key.endswith(('.keras', '.h5')):
+                    models.append({
+                        'key': key,
+                        'size': obj['Size'],
+                        'last_modified': obj['LastModified'].isoformat(),
+                        'format': 'keras' if key.endswith('.keras') else 'h5'
+                    })
         
-        logger.error("Aucun modèle trouvé dans MinIO")
-        return None, None
+        models.sort(key=lambda x: x['last_modified'], reverse=True)
+        return models
     
-    def list_models(self, model_name="plant_classifier"):
-        """Lister tous les modèles disponibles"""
-        try:
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.bucket_name,
-                Prefix=f"tensorflow/{model_name}_"
-            )
-            
-            if 'Contents' in response:
-                models = []
-                for obj in response['Contents']:
-                    key = obj['Key']
-                    if key.endswith(('.keras', '.h5')):
-                        models.append({
-                            'key': key,
-                            'size': obj['Size'],
-                            'last_modified': obj['LastModified'].isoformat(),
-                            'format': 'keras' if key.endswith('.keras') else 'h5'
-                        })
-                
-                # Trier par date de modification (plus récent en premier)
-                models.sort(key=lambda x: x['last_modified'], reverse=True)
-                return models
-            else:
-                return []
-                
-        except Exception as e:
-            logger.error(f"Erreur listage modèles: {e}")
-            return []
+    def list_models(self, model_name="plant_classifier", offset=0, limit=None):
+        """Page de modèles: (modèles, total, ETag du registre ou None si listage du bucket)"""
+        versions, total, etag = self.registry(model_name).page(offset, limit)
+        if total:
+            return [{**entry, 'last_modified': entry['created_at']} for entry in versions], total, etag
+        
+        models = self.scan_models(model_name)
+        return models[offset:None if limit is None else offset + limit], len(models), None
 
-def preprocess_image(image):
-    """Preprocessing d'une image PIL"""
+async def read_upload(file: UploadFile, max_bytes: int = MAX_FILE_SIZE):
+    """Lire un upload sans jamais dépasser `max_bytes` en mémoire.
+    
+    Taille connue (mesurée par Starlette à la réception): refus immédiat au-delà
+    de la limite, sinon une seule lecture à la taille exacte. Taille inconnue:
+    lecture par morceaux, abandonnée dès que la limite est dépassée.
+    """
+    if file.size is not None:
+        if file.size > max_bytes:
+            raise ImageTooLargeError(f"Fichier trop volumineux ({file.size} bytes). Maximum: {max_bytes} bytes")
+        return await file.read(file.size)
+    
+    content = bytearray()
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        content += chunk
+        if len(content) > max_bytes:
+            raise ImageTooLargeError(f"Fichier trop volumineux (plus de {max_bytes} bytes). Maximum: {max_bytes} bytes")
+    return content
+
+def decode_upload(image_bytes):
+    """Décoder une image une seule fois: (tableau uint8 (1, H, W, 3), métadonnées).
+    
+    Les métadonnées et les dimensions minimales sont lues sur l'objet PIL
+    avant le décodage des pixels (qui se fait en mode draft pour les JPEG);
+    l'image PIL est fermée avant de rendre la main. Lève ValueError si invalide.
+    """
     try:
-        # Redimensionner
-        image = image.resize((224, 224))
-        
-        # Convertir en array et normaliser
-        image_array = np.array(image) / 255.0
+        image = open_image(image_bytes)
+    except Exception as img_error:
+        raise ValueError(f"Impossible d'ouvrir l'image: {img_error}")
+    
+    with image:
+        image_info = {
+            "format": image.format,
+            "mode": image.mode,
+            "size": image.size,
+            "width": image.width,
+            "height": image.height
+        }
         
-        # Ajouter la dimension batch
-        image_array = np.expand_dims(image_array, axis=0)
+        if image.width < MIN_IMAGE_SIZE or image.height < MIN_IMAGE_SIZE:
+            raise ValueError(f"Image trop petite ({image.width}x{image.height}). Minimum: {MIN_IMAGE_SIZE}x{MIN_IMAGE_SIZE}")
         
-        return image_array
-    except Exception as e:
-        logger.error(f"Erreur preprocessing: {e}")
-        raise
+        try:
+            image_array = image_to_uint8(image)[np.newaxis]
+        except Exception as img_error:
+            raise ValueError(f"Impossible d'ouvrir l'image: {img_error}")
+    
+    return image_array, image_info
+
+def load_image_array(image_bytes: bytes):
+    """Décoder (en mode draft pour les JPEG) et prétraiter une image en un seul passage"""
+    return decode_to_uint8(image_bytes)[np.newaxis]
+
+def load_batch_item(image_bytes: bytes):
+    """Valider, décoder et prétraiter une image d'un batch (lève ValueError si invalide)"""
+    if len(image_bytes) == 0:
+        raise ValueError("Le fichier est vide")
+    if len(image_bytes) > MAX_FILE_SIZE:
+        raise ValueError(f"Fichier trop volumineux ({len(image_bytes)} bytes). Maximum: {MAX_FILE_SIZE} bytes")
+    
+    image_array, _ = decode_upload(image_bytes)
+    return image_array[0]
+
+def build_inference_backend(keras_model, source_key=None, source_etag=None):
+    """Construire le backend de serving sélectionné par INFERENCE_BACKEND"""
+    if INFERENCE_BACKEND == 'tflite':
+        try:
+            if TFLITE_QUANTIZATION not in TFLITE_QUANTIZATIONS:
+                raise ValueError(f"TFLITE_QUANTIZATION invalide: {TFLITE_QUANTIZATION}")
+            
+            tflite_model, _ = load_or_convert_tflite(
+                keras_model,
+                minio_client.s3_client,
+                minio_client.bucket_name,
+                source_key,
+                TFLITE_QUANTIZATION,
+                source_etag=source_etag,
+                representative_fn=lambda: sample_calibration_images(
+                    minio_client.s3_client,
+                    RAW_DATA_BUCKET,
+                    lambda image_bytes: load_image_array(image_bytes)[0],
+                    max_images=TFLITE_CALIBRATION_SAMPLES
+                )
+            )
+            backend = TFLiteBackend(
+                tflite_model,
+                TFLITE_QUANTIZATION,
+                pool_size=INFERENCE_WORKERS,
+                num_threads=max(1, default_num_workers() // INFERENCE_WORKERS),
+                batch_buckets=SERVING_BATCH_BUCKETS
+            )
+            backend.warmup()
+            return backend
+        except Exception as e:
+            logger.error(f"Erreur backend TFLite, utilisation de Keras: {e}")
+    
+    if MODEL_PRECISION != 'float32':
+        try:
+            keras_model = with_precision(keras_model, MODEL_PRECISION, fold_batch_norm=True)
+        except Exception as e:
+            logger.error(f"Erreur conversion {MODEL_PRECISION}, service en float32: {e}")
+    
+    backend = KerasBackend(keras_model, batch_buckets=SERVING_BATCH_BUCKETS)
+    backend.warmup()
+    return backend
+
+def describe_model_version(backend, source_key, source_etag=None):
+    """Identifiant de la version servie, utilisé comme espace de noms du cache.
+    
+    Clé et ETag du modèle source plus le backend: deux réplicas servant le même
+    modèle partagent leurs entrées, un modèle par défaut reste propre au processus.
+    """
+    serving = backend.info()
+    backend_id = serving["backend"]
+    if "quantization" in serving:
+        backend_id += f"-{serving['quantization']}"
+    if serving.get("precision", "float32") != "float32":
+        backend_id += f"-{serving['precision']}"
+    
+    if source_key:
+        try:
+            etag = source_etag or minio_client.s3_client.head_object(Bucket=minio_client.bucket_name, Key=source_key)['ETag'].strip('"')
+            return f"{source_key}@{etag}/{backend_id}"
+        except Exception as e:
+            logger.warning(f"ETag du modèle indisponible pour {source_key}: {e}")
+    
+    return f"default-{uuid.uuid4().hex}/{backend_id}"
 
-def load_model():
-    """Charge le modèle TensorFlow depuis MinIO"""
-    global model, minio_client
+def prepare_model(allow_default=False):
+    """Charger le modèle depuis MinIO et le préparer au service: ServedModel prêt à basculer.
+    
+    Exécuté hors de la boucle asyncio (voir ModelHolder.reload) pendant que la
+    version courante continue de servir. Au démarrage (`allow_default`), un
+    modèle par défaut remplace un modèle MinIO introuvable; lors d'un
+    rechargement, l'échec est levé et la version courante est conservée.
+    """
+    global minio_client
     
-    minio_client = MinIOModelManager()
+    # Client conservé entre rechargements: registre revalidé par ETag, cache disque partagé
+    if minio_client is None:
+        minio_client = MinIOModelManager(MODEL_CACHE_DIR, MODEL_CACHE_VERSIONS)
+    loaded_model, loaded_key = None, None
     
     # Essayer de charger le modèle depuis MinIO
     try:
-        loaded_model, model_key = minio_client.load_model_from_minio("plant_classifier", "latest")
+        loaded_model, loaded_key = minio_client.load_model_from_minio("plant_classifier", "latest")
         
         if loaded_model:
-            model = loaded_model
-            logger.info(f"✅ Modèle chargé depuis MinIO: {model_key}")
-            return True
+            logger.info(f"✅ Modèle chargé depuis MinIO: {loaded_key}")
             
     except Exception as e:
         logger.error(f"Erreur chargement modèle MinIO: {e}")
     
-    # Fallback: créer un modèle par défaut
-    logger.warning("Création d'un modèle par défaut")
-    model = create_default_model()
-    logger.info("Modèle par défaut créé")
-    return False
+    from_minio = loaded_model is not None
+    
+    if not from_minio:
+        if not allow_default:
+            raise RuntimeError("Aucun modèle chargeable depuis MinIO")
+        # Fallback au démarrage: créer un modèle par défaut
+        logger.warning("Création d'un modèle par défaut")
+        loaded_model = create_default_model()
+        logger.info("Modèle par défaut créé")
+    
+    load_info = minio_client.last_load if from_minio else None
+    loaded_etag = load_info['etag'] if load_info else None
+    backend = build_inference_backend(loaded_model, loaded_key, loaded_etag)
+    warmup_backend(backend)
+    
+    served = ServedModel(
+        backend,
+        describe_model_version(backend, loaded_key, loaded_etag),
+        key=loaded_key,
+        keras_model=loaded_model if backend.name == 'keras' else None,
+        from_minio=from_minio,
+        load_info=load_info
+    )
+    logger.info(f"Backend d'inférence prêt: {backend.info()} (version {served.version})")
+    return served
+
+def warmup_backend(backend):
+    """Batch de préchauffage: la version n'est basculée que si sa prédiction est valide"""
+    probabilities = backend.predict(np.zeros((1, 224, 224, 3), dtype=np.uint8))
+    if probabilities.shape != (1, len(class_names)) or not np.all(np.isfinite(probabilities)):
+        raise ValueError(f"Prédiction de préchauffage invalide: forme {probabilities.shape}")
 
 def create_default_model():
     """Crée un modèle par défaut pour les tests"""
@@ -219,6 +479,146 @@ def create_default_model():
     
     return model
 
+def run_model_inference(batch):
+    """Passe forward unique sur un batch d'images prétraitées (version courante)"""
+    return model_holder.current.backend.predict(batch)
+
+def serving_model():
+    """Version louée par la requête en cours (503 si aucun modèle n'est chargé)"""
+    served = leased_model(model_holder)
+    if served is None:
+        raise HTTPException(status_code=503, detail="Modèle non chargé")
+    return served
+
+def format_prediction(probabilities):
+    """Construire le résultat de prédiction à partir des probabilités d'une image"""
+    predicted_class_idx = int(np.argmax(probabilities))
+    confidence = float(probabilities[predicted_class_idx])
+    
+    return {
+        "predicted_class": class_names[predicted_class_idx],
+        "confidence": round(confidence, 4),
+        "probabilities": {
+            "grass": round(float(probabilities[0]), 4),
+            "dandelion": round(float(probabilities[1]), 4)
+        }
+    }
+
+async def fetch_url_bytes(image_url: str) -> bytes:
+    """Télécharger une image via le client HTTP partagé (limité à MAX_FILE_SIZE)"""
+    return await url_fetcher.fetch(image_url)
+
+async def fetch_s3_bytes(s3_key: str) -> bytes:
+    """Lire une image du bucket raw-data via le client S3 partagé"""
+    return await raw_data_reader.read(s3_key)
+
+async def lookup_prediction(version, cache_key):
+    """Prédiction en cache pour cette version du modèle, ou None"""
+    if prediction_cache is None:
+        return None
+    return await prediction_cache.get(version, cache_key)
+
+async def store_prediction(version, cache_key, prediction, **extra):
+    """Mettre une prédiction en cache pour la version du modèle qui l'a produite"""
+    if prediction_cache is not None:
+        await prediction_cache.set(version, cache_key, {"prediction": prediction, **extra})
+
+async def load_cached_item(version, cache_key, load_array):
+    """Renvoyer (clé, prédiction en cache) ou, en cas de miss, (clé, tableau prétraité)"""
+    cached = await lookup_prediction(version, cache_key)
+    if cached is not None:
+        return cache_key, cached
+    return cache_key, await load_array()
+
+async def load_remote_item(item: dict):
+    """Récupérer et prétraiter un élément {"image_url": ...} ou {"s3_key": ...}"""
+    if "image_url" in item:
+        image_bytes = await fetch_url_bytes(item["image_url"])
+    else:
+        image_bytes = await fetch_s3_bytes(item["s3_key"])
+    return await inference_executor.run(load_batch_item, image_bytes)
+
+async def predict_batch_items(items, loaders, version):
+    """Charger les images d'un batch en parallèle puis lancer une seule prédiction vectorisée.
+    
+    `items` contient la description de chaque élément (renvoyée telle quelle),
+    `loaders` les coroutines `load_cached_item` de chaque élément: seules les
+    images absentes du cache passent par le modèle.
+    Une erreur sur un élément n'échoue pas le batch entier.
+    """
+    outcomes = await asyncio.gather(*loaders, return_exceptions=True)
+    
+    results = []
+    to_predict = []
+    for index, (item, outcome) in enumerate(zip(items, outcomes)):
+        if isinstance(outcome, BaseException):
+            detail = outcome.detail if isinstance(outcome, HTTPException) else str(outcome)
+            results.append({"index": index, **item, "status": "error", "error": detail})
+            continue
+        
+        cache_key, payload = outcome
+        if isinstance(payload, dict):
+            results.append({"index": index, **item, "status": "success", **payload["prediction"], "cache": "hit"})
+        else:
+            results.append({"index": index, **item, "status": "success", "cache": "miss"})
+            to_predict.append((index, cache_key, payload))
+    
+    if to_predict:
+        batch = np.stack([array for _, _, array in to_predict])
+        predictions = await inference_executor.run(serving_model().backend.predict, batch)
+        for row, (index, cache_key, _) in enumerate(to_predict):
+            prediction = format_prediction(predictions[row])
+            results[index].update(prediction)
+            await store_prediction(version, cache_key, prediction)
+    
+    succeeded = sum(1 for result in results if result["status"] == "success")
+    return {
+        "results": results,
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "framework": "TensorFlow",
+        "storage": "MinIO",
+        "tf_version": tf.__version__,
+        "timestamp": datetime.now().isoformat()
+    }
+
+async def predict_image_array(image_array):
+    """Prédiction via le micro-batcher pour une image prétraitée (1, H, W, C), par la version louée"""
+    probabilities, batch_info = await batcher.submit(image_array[0], serving_model().backend.predict)
+    return format_prediction(probabilities), batch_info
+
+async def predict_url(version, image_url: str):
+    """Prédiction pour une URL: le cache évite le téléchargement des images déjà vues"""
+    cache_key = remote_cache_key({"image_url": image_url})
+    cached = await lookup_prediction(version, cache_key)
+    if cached is not None:
+        return cached["prediction"], None, "hit"
+    
+    # Télécharger l'image sans bloquer la boucle asyncio
+    image_bytes = await fetch_url_bytes(image_url)
+    
+    # Décodage et preprocessing dans l'exécuteur d'inférence
+    image_array = await inference_executor.run(load_image_array, image_bytes)
+    
+    # Prédiction (regroupée avec les requêtes concurrentes)
+    prediction, batch_info = await predict_image_array(image_array)
+    await store_prediction(version, cache_key, prediction)
+    return prediction, batch_info, "miss"
+
+async def predict_remote_item(version, item: dict):
+    """Prédiction d'un élément {"image_url": ...} ou {"s3_key": ...} via le cache puis le micro-batcher"""
+    cache_key, payload = await load_cached_item(
+        version, remote_cache_key(item), lambda: load_remote_item(item)
+    )
+    if isinstance(payload, dict):
+        return payload["prediction"], None, "hit"
+    
+    probabilities, batch_info = await batcher.submit(payload, serving_model().backend.predict)
+    prediction = format_prediction(probabilities)
+    await store_prediction(version, cache_key, prediction)
+    return prediction, batch_info, "miss"
+
 # Ajouter cette fonction avant les endpoints
 def validate_image_file(file: UploadFile) -> bool:
     """Valide qu'un fichier est bien une image"""
@@ -241,21 +641,6 @@ def validate_image_file(file: UploadFile) -> bool:
     
     return True
 
-def get_image_info(image_bytes: bytes) -> dict:
-    """Obtenir des informations sur l'image"""
-    try:
-        image = Image.open(io.BytesIO(image_bytes))
-        return {
-            "format": image.format,
-            "mode": image.mode,
-            "size": image.size,
-            "width": image.width,
-            "height": image.height
-        }
-    except Exception as e:
-        logger.error(f"Erreur analyse image: {e}")
-        return {}
-
 @app.on_event("startup")
 async def startup_event():
     logger.info("🚀 Démarrage de l'API Plant Classification (TensorFlow + MinIO)")
@@ -264,14 +649,41 @@ async def startup_event():
     Path("models").mkdir(exist_ok=True)
     Path("logs").mkdir(exist_ok=True)
     
-    # Charger le modèle
-    model_loaded = load_model()
+    # Charger le modèle (modèle par défaut si MinIO n'en fournit aucun)
+    await model_holder.reload(lambda: prepare_model(allow_default=True))
+    
+    # Clients partagés pour les images distantes (HTTP et bucket raw-data)
+    await url_fetcher.start()
+    global raw_data_reader
+    raw_data_reader = RawDataReader(RAW_DATA_BUCKET, MAX_FILE_SIZE, max_pool_connections=S3_MAX_POOL_CONNECTIONS)
+    
+    # Démarrer le micro-batcher
+    global batcher
+    batcher = MicroBatcher(
+        run_model_inference,
+        max_batch_size=BATCH_MAX_SIZE,
+        max_wait_us=BATCH_MAX_WAIT_US,
+        executor=inference_executor
+    )
+    await batcher.start()
+    BATCHER_QUEUE_DEPTH.set_function(lambda: batcher.queue_depth)
     
-    if model_loaded:
+    if model_holder.current is None:
+        logger.error("❌ API démarrée sans modèle (prédictions en 503)")
+    elif model_holder.current.from_minio:
         logger.info("✅ API prête avec modèle MinIO")
     else:
         logger.info("✅ API prête avec modèle par défaut")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    if batcher:
+        await batcher.stop()
+    await url_fetcher.stop()
+    if raw_data_reader:
+        raw_data_reader.shutdown()
+    inference_executor.shutdown(wait=False)
+
 @app.get("/")
 async def root():
     return {
@@ -281,7 +693,7 @@ async def root():
         "storage": "MinIO",
         "tf_version": tf.__version__,
         "status": "running",
-        "model_loaded": model is not None,
+        "model_loaded": model_holder.current is not None,
         "timestamp": datetime.now().isoformat()
     }
 
@@ -292,15 +704,20 @@ async def health_check():
         "framework": "TensorFlow",
         "storage": "MinIO",
         "tf_version": tf.__version__,
-        "model_loaded": model is not None,
+        "model_loaded": model_holder.current is not None,
+        "inference_queue_depth": inference_executor.queue_depth,
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/metrics")
+async def metrics():
+    """Métriques Prometheus"""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
 @app.post("/predict")
 async def predict(file: UploadFile = File(...)):
     """Prédiction sur une image uploadée"""
-    if model is None:
-        raise HTTPException(status_code=503, detail="Modèle non chargé")
+    served = serving_model()
     
     # Validation du fichier
     if not validate_image_file(file):
@@ -311,72 +728,64 @@ async def predict(file: UploadFile = File(...)):
         )
     
     try:
-        # Lire l'image
-        image_bytes = await file.read()
+        # Lire l'image par morceaux (max 10MB, arrêt dès le dépassement)
+        try:
+            image_bytes = await read_upload(file)
+        except ImageTooLargeError as e:
+            raise HTTPException(status_code=400, detail=str(e))
         
         # Vérifier que le fichier n'est pas vide
         if len(image_bytes) == 0:
             raise HTTPException(status_code=400, detail="Le fichier est vide")
         
-        # Vérifier la taille du fichier (max 10MB)
-        max_file_size = 10 * 1024 * 1024  # 10 MB
-        if len(image_bytes) > max_file_size:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Fichier trop volumineux ({len(image_bytes)} bytes). Maximum: {max_file_size} bytes"
-            )
+        file_info = {
+            "filename": file.filename,
+            "content_type": file.content_type,
+            "file_size": len(image_bytes)
+        }
         
-        # Obtenir les informations sur l'image
-        image_info = get_image_info(image_bytes)
+        # Image déjà vue avec ce modèle: ni décodage ni inférence
+        version = served.version
+        cache_key = bytes_cache_key(image_bytes)
+        cached = await lookup_prediction(version, cache_key)
+        if cached is not None:
+            logger.info(f"Prédiction en cache: {cached['prediction']['predicted_class']} - {file.filename}")
+            return JSONResponse(content={
+                **cached["prediction"],
+                "framework": "TensorFlow",
+                "storage": "MinIO",
+                "tf_version": tf.__version__,
+                "file_info": {**file_info, **cached.get("image_info", {})},
+                "batching": None,
+                "cache": "hit",
+                "timestamp": datetime.now().isoformat()
+            })
         
-        # Tenter d'ouvrir l'image pour vérifier qu'elle est valide
+        # Décodage unique: validation, métadonnées et preprocessing
         try:
-            image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+            image_array, image_info = await inference_executor.run(decode_upload, image_bytes)
             logger.info(f"Image chargée: {image_info}")
-        except Exception as img_error:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Impossible d'ouvrir l'image: {str(img_error)}"
-            )
-        
-        # Vérifier les dimensions minimales
-        min_size = 32
-        if image.width < min_size or image.height < min_size:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"Image trop petite ({image.width}x{image.height}). Minimum: {min_size}x{min_size}"
-            )
+        except ValueError as img_error:
+            raise HTTPException(status_code=400, detail=str(img_error))
         
-        # Preprocessing
-        image_array = preprocess_image(image)
+        # Les octets bruts ne servent plus: les libérer avant l'inférence
+        del image_bytes
         
-        # Prédiction
-        predictions = model.predict(image_array, verbose=0)
-        predicted_class_idx = np.argmax(predictions[0])
-        confidence = float(predictions[0][predicted_class_idx])
-        
-        predicted_label = class_names[predicted_class_idx]
-        
-        # Probabilités pour chaque classe
-        prob_grass = float(predictions[0][0])
-        prob_dandelion = float(predictions[0][1])
+        # Prédiction (regroupée avec les requêtes concurrentes)
+        prediction, batch_info = await predict_image_array(image_array)
+        del image_array
+        predicted_label = prediction["predicted_class"]
+        confidence = prediction["confidence"]
+        await store_prediction(version, cache_key, prediction, image_info=image_info)
         
         result = {
-            "predicted_class": predicted_label,
-            "confidence": round(confidence, 4),
-            "probabilities": {
-                "grass": round(prob_grass, 4),
-                "dandelion": round(prob_dandelion, 4)
-            },
+            **prediction,
             "framework": "TensorFlow",
             "storage": "MinIO",
             "tf_version": tf.__version__,
-            "file_info": {
-                "filename": file.filename,
-                "content_type": file.content_type,
-                "file_size": len(image_bytes),
-                **image_info
-            },
+            "file_info": {**file_info, **image_info},
+            "batching": batch_info,
+            "cache": "miss",
             "timestamp": datetime.now().isoformat()
         }
         
@@ -395,48 +804,30 @@ async def predict(file: UploadFile = File(...)):
 @app.post("/predict-url")
 async def predict_from_url(request: ImageUrlRequest):
     """Prédiction depuis une URL d'image (POST avec body JSON)"""
-    if model is None:
-        raise HTTPException(status_code=503, detail="Modèle non chargé")
+    served = serving_model()
     
     try:
-        # Télécharger l'image
-        response = requests.get(request.image_url, timeout=10)
-        response.raise_for_status()
-        
-        image = Image.open(io.BytesIO(response.content)).convert('RGB')
-        
-        # Preprocessing
-        image_array = preprocess_image(image)
-        
-        # Prédiction
-        predictions = model.predict(image_array, verbose=0)
-        predicted_class_idx = np.argmax(predictions[0])
-        confidence = float(predictions[0][predicted_class_idx])
-        
-        predicted_label = class_names[predicted_class_idx]
-        
-        # Probabilités pour chaque classe
-        prob_grass = float(predictions[0][0])
-        prob_dandelion = float(predictions[0][1])
+        prediction, batch_info, cache_status = await predict_url(served.version, request.image_url)
+        predicted_label = prediction["predicted_class"]
+        confidence = prediction["confidence"]
         
         result = {
-            "predicted_class": predicted_label,
-            "confidence": round(confidence, 4),
-            "probabilities": {
-                "grass": round(prob_grass, 4),
-                "dandelion": round(prob_dandelion, 4)
-            },
+            **prediction,
             "image_url": request.image_url,
             "framework": "TensorFlow",
             "storage": "MinIO",
             "tf_version": tf.__version__,
+            "batching": batch_info,
+            "cache": cache_status,
             "timestamp": datetime.now().isoformat()
         }
         
-        logger.info(f"Prédiction URL: {predicted_label} ({confidence:.2%})")
+        logger.info(f"Prédiction URL: {predicted_label} ({confidence:.2%}, cache {cache_status})")
         
         return JSONResponse(content=result)
         
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Erreur lors de la prédiction depuis URL: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur: {str(e)}")
@@ -445,92 +836,338 @@ async def predict_from_url(request: ImageUrlRequest):
 @app.get("/predict-url-get")
 async def predict_from_url_get(image_url: str):
     """Prédiction depuis une URL d'image (GET avec query parameter)"""
-    if model is None:
-        raise HTTPException(status_code=503, detail="Modèle non chargé")
+    served = serving_model()
     
     try:
-        # Télécharger l'image
-        response = requests.get(image_url, timeout=10)
-        response.raise_for_status()
-        
-        image = Image.open(io.BytesIO(response.content)).convert('RGB')
-        
-        # Preprocessing
-        image_array = preprocess_image(image)
-        
-        # Prédiction
-        predictions = model.predict(image_array, verbose=0)
-        predicted_class_idx = np.argmax(predictions[0])
-        confidence = float(predictions[0][predicted_class_idx])
-        
-        predicted_label = class_names[predicted_class_idx]
-        
-        # Probabilités pour chaque classe
-        prob_grass = float(predictions[0][0])
-        prob_dandelion = float(predictions[0][1])
+        prediction, batch_info, cache_status = await predict_url(served.version, image_url)
+        predicted_label = prediction["predicted_class"]
+        confidence = prediction["confidence"]
         
         result = {
-            "predicted_class": predicted_label,
-            "confidence": round(confidence, 4),
-            "probabilities": {
-                "grass": round(prob_grass, 4),
-                "dandelion": round(prob_dandelion, 4)
-            },
+            **prediction,
             "image_url": image_url,
             "framework": "TensorFlow",
             "storage": "MinIO",
             "tf_version": tf.__version__,
+            "batching": batch_info,
+            "cache": cache_status,
             "timestamp": datetime.now().isoformat()
         }
         
-        logger.info(f"Prédiction URL GET: {predicted_label} ({confidence:.2%})")
+        logger.info(f"Prédiction URL GET: {predicted_label} ({confidence:.2%}, cache {cache_status})")
         
         return JSONResponse(content=result)
         
+    except ImageTooLargeError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Erreur lors de la prédiction depuis URL: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur: {str(e)}")
 
 
-@app.post("/reload-model")
-async def reload_model():
+@app.post("/predict-batch")
+async def predict_batch(files: List[UploadFile] = File(...)):
+    """Prédiction sur plusieurs images uploadées en une seule passe du modèle"""
+    served = serving_model()
+    
+    if len(files) > MAX_BATCH_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Trop d'images ({len(files)}). Maximum: {MAX_BATCH_ITEMS}"
+        )
+    
+    version = served.version
+    
+    async def load_upload(file: UploadFile):
+        if not validate_image_file(file):
+            raise ValueError(f"Fichier non valide: {file.content_type} - {file.filename}")
+        image_bytes = await read_upload(file)
+        return await load_cached_item(
+            version, bytes_cache_key(image_bytes),
+            lambda: inference_executor.run(load_batch_item, image_bytes)
+        )
+    
     try:
-        model_loaded = load_model()
+        items = [{"filename": file.filename} for file in files]
+        result = await predict_batch_items(items, [load_upload(file) for file in files], version)
         
-        if model_loaded:
-            message = "Modèle rechargé depuis MinIO avec succès"
-            logger.info(message)
-        else:
-            message = "Modèle par défaut rechargé (MinIO non accessible)"
-            logger.warning(message)
+        logger.info(f"Prédiction batch: {result['succeeded']}/{result['total']} images")
+        
+        return JSONResponse(content=result)
+        
+    except Exception as e:
+        logger.error(f"Erreur lors de la prédiction batch: {e}")
+        raise HTTPException(status_code=500, detail=f"Erreur lors de la prédiction: {str(e)}")
+
+
+@app.post("/predict-batch-url")
+async def predict_batch_from_urls(request: BatchUrlRequest):
+    """Prédiction sur une liste d'URLs et/ou de clés MinIO (bucket raw-data)"""
+    served = serving_model()
+    
+    total_items = len(request.image_urls) + len(request.s3_keys)
+    if total_items == 0:
+        raise HTTPException(status_code=400, detail="Aucune image fournie (image_urls ou s3_keys)")
+    if total_items > MAX_BATCH_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Trop d'images ({total_items}). Maximum: {MAX_BATCH_ITEMS}"
+        )
+    
+    try:
+        items = [{"image_url": url} for url in request.image_urls]
+        items += [{"s3_key": key} for key in request.s3_keys]
+        
+        version = served.version
+        loaders = [
+            load_cached_item(version, remote_cache_key(item), lambda item=item: load_remote_item(item))
+            for item in items
+        ]
+        result = await predict_batch_items(items, loaders, version)
+        
+        logger.info(f"Prédiction batch URL: {result['succeeded']}/{result['total']} images")
+        
+        return JSONResponse(content=result)
+        
+    except Exception as e:
+        logger.error(f"Erreur lors de la prédiction batch depuis URLs: {e}")
+        raise HTTPException(status_code=500, detail=f"Erreur: {str(e)}")
+
+
+@app.post("/predict-s3")
+async def predict_from_s3(request: S3ImageRequest):
+    """Prédiction sur une image du bucket raw-data (clé ou URL s3://raw-data/...)"""
+    served = serving_model()
+    
+    s3_key = strip_raw_data_prefix(request.s3_key)
+    
+    try:
+        prediction, batch_info, cache_status = await predict_remote_item(served.version, {"s3_key": s3_key})
         
-        return {
-            "message": message,
+        result = {
+            **prediction,
+            "s3_key": s3_key,
+            "bucket": RAW_DATA_BUCKET,
             "framework": "TensorFlow",
             "storage": "MinIO",
             "tf_version": tf.__version__,
+            "batching": batch_info,
+            "cache": cache_status,
             "timestamp": datetime.now().isoformat()
         }
+        
+        logger.info(f"Prédiction S3: {prediction['predicted_class']} ({prediction['confidence']:.2%}) - {s3_key}")
+        
+        return JSONResponse(content=result)
+        
+    except ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+            raise HTTPException(status_code=404, detail=f"Image non trouvée: s3://{RAW_DATA_BUCKET}/{s3_key}")
+        logger.error(f"Erreur accès MinIO {s3_key}: {e}")
+        raise HTTPException(status_code=502, detail=f"Erreur MinIO: {str(e)}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        logger.error(f"Erreur lors du rechargement du modèle: {e}")
+        logger.error(f"Erreur lors de la prédiction depuis MinIO: {e}")
         raise HTTPException(status_code=500, detail=f"Erreur: {str(e)}")
 
+
+@app.post("/predict-s3-batch")
+async def predict_batch_from_s3(request: S3BatchRequest):
+    """Prédiction sur une liste de clés du bucket raw-data.
+    
+    Les objets sont lus en parallèle et chaque image rejoint le micro-batcher
+    dès qu'elle est prête, avec les autres requêtes en cours.
+    """
+    served = serving_model()
+    
+    if not request.s3_keys:
+        raise HTTPException(status_code=400, detail="Aucune clé fournie (s3_keys)")
+    if len(request.s3_keys) > MAX_BATCH_ITEMS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Trop d'images ({len(request.s3_keys)}). Maximum: {MAX_BATCH_ITEMS}"
+        )
+    
+    version = served.version
+    items = [{"s3_key": strip_raw_data_prefix(key)} for key in request.s3_keys]
+    outcomes = await asyncio.gather(
+        *(predict_remote_item(version, item) for item in items),
+        return_exceptions=True
+    )
+    
+    results = []
+    for index, (item, outcome) in enumerate(zip(items, outcomes)):
+        if isinstance(outcome, BaseException):
+            results.append({"index": index, **item, "status": "error", "error": str(outcome)})
+        else:
+            prediction, _, cache_status = outcome
+            results.append({"index": index, **item, "status": "success", **prediction, "cache": cache_status})
+    
+    succeeded = sum(1 for result in results if result["status"] == "success")
+    logger.info(f"Prédiction batch S3: {succeeded}/{len(results)} images")
+    
+    return JSONResponse(content={
+        "results": results,
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "bucket": RAW_DATA_BUCKET,
+        "framework": "TensorFlow",
+        "storage": "MinIO",
+        "tf_version": tf.__version__,
+        "timestamp": datetime.now().isoformat()
+    })
+
+
+@app.post("/predict-stream")
+async def predict_stream(request: Request):
+    """Classification en flux: une clé MinIO ou URL par ligne, un résultat JSON par ligne.
+    
+    Les résultats sont renvoyés dès qu'ils sont prêts (pas forcément dans l'ordre,
+    voir le champ `index`). Le nombre d'images en cours est borné par
+    STREAM_MAX_IN_FLIGHT et les prédictions passent par le micro-batcher. Une
+    ligne invalide, non UTF-8 ou de plus de STREAM_MAX_LINE_BYTES octets donne
+    un résultat en erreur sans interrompre le flux.
+    """
+    served = serving_model()
+    
+    results = asyncio.Queue()
+    in_flight = asyncio.Semaphore(STREAM_MAX_IN_FLIGHT)
+    version = served.version
+    
+    async def classify(index, item):
+        try:
+            prediction, _, cache_status = await predict_remote_item(version, item)
+            line = {"index": index, **item, "status": "success", **prediction, "cache": cache_status}
+        except Exception as e:
+            line = {"index": index, **item, "status": "error", "error": str(e)}
+        finally:
+            in_flight.release()
+        await results.put(line)
+    
+    async def produce():
+        tasks = set()
+        index = 0
+        try:
+            async for raw_line in iter_ndjson_lines(request.stream(), STREAM_MAX_LINE_BYTES):
+                try:
+                    item = parse_stream_item(raw_line)
+                except ValueError as e:
+                    await results.put({"index": index, "status": "error", "error": str(e)})
+                    index += 1
+                    continue
+                
+                # Contre-pression: ne pas lire plus loin tant que la limite est atteinte
+                await in_flight.acquire()
+                task = asyncio.create_task(classify(index, item))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+                index += 1
+            
+            if tasks:
+                await asyncio.gather(*tasks)
+        except asyncio.CancelledError:
+            for task in tasks:
+                task.cancel()
+            raise
+        except Exception as e:
+            logger.error(f"Erreur lecture du flux: {e}")
+            await results.put({"index": index, "status": "error", "error": f"Flux interrompu: {e}"})
+        finally:
+            await results.put(None)
+        
+        logger.info(f"Flux de prédiction terminé: {index} éléments")
+    
+    async def generate():
+        producer = asyncio.create_task(produce())
+        try:
+            while True:
+                line = await results.get()
+                if line is None:
+                    break
+                yield json.dumps(line) + "\n"
+        finally:
+            producer.cancel()
+    
+    return DuplexStreamingResponse(generate(), media_type="application/x-ndjson")
+
+
+async def invalidate_prediction_cache():
+    """Les prédictions de l'ancien modèle ne doivent plus être servies"""
+    if prediction_cache is not None:
+        await prediction_cache.invalidate()
+
+@app.post("/reload-model")
+async def reload_model(wait: bool = True):
+    """Recharger le modèle sans interruption du service.
+    
+    La nouvelle version est chargée et préchauffée en tâche de fond, puis
+    basculée; les requêtes en cours terminent sur l'ancienne. En cas
+    d'échec, la version courante reste servie. Avec `wait=false`, la réponse
+    (202) n'attend pas la fin du rechargement (état dans /model-info).
+    """
+    if not wait:
+        model_holder.start_reload(prepare_model, after_swap=invalidate_prediction_cache)
+        return JSONResponse(status_code=202, content={
+            "message": "Rechargement du modèle lancé",
+            "status": "reloading",
+            "serving": model_holder.current.version if model_holder.current else None,
+            "timestamp": datetime.now().isoformat()
+        })
+    
+    reload = await model_holder.reload(prepare_model, after_swap=invalidate_prediction_cache)
+    if reload["status"] == "success":
+        message = "Modèle rechargé depuis MinIO avec succès"
+        logger.info(message)
+    else:
+        message = "Rechargement échoué, version précédente conservée"
+        logger.warning(f"{message}: {reload['error']}")
+    
+    return {
+        "message": message,
+        **reload,
+        "framework": "TensorFlow",
+        "storage": "MinIO",
+        "tf_version": tf.__version__
+    }
+
 @app.get("/models")
-async def list_models():
-    """Lister tous les modèles disponibles dans MinIO"""
+async def list_models(request: Request, page: int = 1, page_size: int = MODELS_PAGE_SIZE):
+    """Lister les modèles disponibles dans MinIO (du plus récent au plus ancien, paginé)
+    
+    Lue depuis le registre, la réponse porte un ETag (version du manifest et
+    page): une requête avec If-None-Match identique reçoit 304.
+    """
+    page = max(page, 1)
+    page_size = min(max(page_size, 1), MODELS_MAX_PAGE_SIZE)
     try:
         if minio_client:
-            models = minio_client.list_models("plant_classifier")
-            return {
+            models, total, registry_etag = await asyncio.to_thread(
+                minio_client.list_models, "plant_classifier", (page - 1) * page_size, page_size
+            )
+            headers = {}
+            if registry_etag:
+                headers['ETag'] = f'W/"{registry_etag.strip(chr(34))}-{page}-{page_size}"'
+                if request.headers.get('if-none-match') == headers['ETag']:
+                    return Response(status_code=304, headers=headers)
+            return JSONResponse({
                 "available_models": models,
-                "total_models": len(models),
+                "total_models": total,
+                "page": page,
+                "page_size": page_size,
+                "total_pages": (total + page_size - 1) // page_size,
+                "source": "registry" if registry_etag else "bucket_listing",
                 "storage": "MinIO",
                 "timestamp": datetime.now().isoformat()
-            }
+            }, headers=headers)
         else:
             return {
                 "available_models": [],
                 "total_models": 0,
+                "page": page,
+                "page_size": page_size,
+                "total_pages": 0,
                 "storage": "MinIO",
                 "error": "Client MinIO non initialisé",
                 "timestamp": datetime.now().isoformat()
@@ -541,8 +1178,9 @@ async def list_models():
 
 @app.get("/model-info")
 async def model_info():
+    served = model_holder.current
     return {
-        "model_loaded": model is not None,
+        "model_loaded": model_holder.current is not None,
         "framework": "TensorFlow",
         "storage": "MinIO",
         "tf_version": tf.__version__,
@@ -550,6 +1188,22 @@ async def model_info():
         "classes": list(class_names.values()),
         "input_size": [224, 224, 3],
         "supported_formats": [".keras", ".h5"],
+        "model_key": served.key if served else None,
+        "model_version": served.version if served else None,
+        "model_load": served.load_info if served else None,
+        "model_holder": model_holder.info(),
+        "model_cache": minio_client.cache.info() if minio_client and minio_client.cache else None,
+        "serving": served.backend.info() if served else None,
+        "batching": batcher.config() if batcher else None,
+        "prediction_cache": prediction_cache.stats() if prediction_cache else None,
+        "url_fetcher": url_fetcher.info(),
+        "raw_data_reader": raw_data_reader.info() if raw_data_reader else None,
+        "inference": {
+            "workers": inference_executor.max_workers,
+            "queue_depth": inference_executor.queue_depth,
+            "intra_op_threads": tf.config.threading.get_intra_op_parallelism_threads(),
+            "inter_op_threads": tf.config.threading.get_inter_op_parallelism_threads()
+        },
         "timestamp": datetime.now().isoformat()
     }
 
@@ -0,0 +1,237 @@
+import logging
+import os
+import queue
+
+import numpy as np
+import tensorflow as tf
+from botocore.exceptions import ClientError
+
+from precision import model_precision
+from preprocessing import normalize
+from tflite_export import TFLITE_QUANTIZATIONS, convert_to_tflite
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_BUCKETS = (1, 2, 4, 8, 16, 32)
+
+
+class KerasBackend:
+    """Inférence avec le runtime TensorFlow complet via une signature compilée.
+
+    `model.predict` construit un data adapter et un itérateur à chaque appel,
+    ce qui domine la latence des petits batchs. Le modèle est ici appelé à
+    travers un `tf.function` à signature fixe (batch dynamique), en float32
+    ([0, 1]) ou en uint8 ([0, 255], normalisé dans le graphe). Les batchs sont
+    complétés jusqu'au bucket supérieur pour ne rencontrer qu'un petit nombre
+    de formes, toutes préchauffées par `warmup()`. Un modèle mixed_bfloat16
+    (voir precision.py) reçoit les mêmes entrées et renvoie du float32.
+    """
+
+    name = 'keras'
+
+    def __init__(self, model, batch_buckets=DEFAULT_BATCH_BUCKETS):
+        self.model = model
+        self.batch_buckets = sorted(set(int(size) for size in batch_buckets if int(size) > 0))
+        self.input_shape = tuple(model.input_shape[1:])
+        self.precision = model_precision(model)
+
+        self._serve_float32 = tf.function(
+            lambda images: model(images, training=False),
+            input_signature=[tf.TensorSpec([None, *self.input_shape], tf.float32)]
+        )
+        self._serve_uint8 = tf.function(
+            lambda images: model(tf.cast(images, tf.float32) / 255.0, training=False),
+            input_signature=[tf.TensorSpec([None, *self.input_shape], tf.uint8)]
+        )
+
+    def warmup(self):
+        """Tracer les signatures et exécuter chaque bucket une fois"""
+        for size in self.batch_buckets:
+            self.predict(np.zeros((size, *self.input_shape), dtype=np.float32))
+            self.predict(np.zeros((size, *self.input_shape), dtype=np.uint8))
+        logger.info(f"Signatures de serving préchauffées pour les batchs {self.batch_buckets}")
+
+    def _bucket_size(self, batch_size):
+        for size in self.batch_buckets:
+            if size >= batch_size:
+                return size
+        return batch_size
+
+    def predict(self, batch):
+        if batch.dtype == np.uint8:
+            serve = self._serve_uint8
+        else:
+            serve = self._serve_float32
+            batch = batch.astype(np.float32, copy=False)
+
+        batch_size = len(batch)
+        padded_size = self._bucket_size(batch_size)
+        if padded_size > batch_size:
+            padding = np.zeros((padded_size - batch_size, *batch.shape[1:]), dtype=batch.dtype)
+            batch = np.concatenate([batch, padding])
+
+        return serve(batch).numpy()[:batch_size]
+
+    def info(self):
+        return {"backend": self.name, "precision": self.precision, "batch_buckets": self.batch_buckets}
+
+
+class TFLiteBackend:
+    """Inférence via un pool d'interpréteurs TFLite.
+
+    Un interpréteur n'est pas utilisable par plusieurs threads à la fois:
+    chaque appel emprunte au pool un jeu d'interpréteurs et le rend à la fin.
+    Redimensionner un interpréteur réalloue tous ses tenseurs: un jeu garde
+    donc un interpréteur alloué par bucket de batch (créé au premier usage
+    ou par `warmup()`), et les batchs sont complétés jusqu'au bucket
+    supérieur comme pour KerasBackend (découpés au-delà du plus grand). Les
+    batchs uint8 sont normalisés en float32 juste avant l'appel.
+    """
+
+    name = 'tflite'
+
+    def __init__(self, tflite_model, quantization, pool_size=1, num_threads=1,
+                 batch_buckets=DEFAULT_BATCH_BUCKETS):
+        self.quantization = quantization
+        self.pool_size = max(1, int(pool_size))
+        self.model_size = len(tflite_model)
+        self.batch_buckets = sorted(set(int(size) for size in batch_buckets if int(size) > 0))
+        self._tflite_model = tflite_model
+        self._num_threads = num_threads
+
+        self._pool = queue.Queue()
+        for _ in range(self.pool_size):
+            self._pool.put({})
+        probe = tf.lite.Interpreter(model_content=tflite_model)
+        self.input_shape = tuple(probe.get_input_details()[0]['shape'][1:])
+
+    def _interpreter(self, interpreters, batch_size):
+        """Interpréteur du jeu alloué pour `batch_size` (créé au premier usage)"""
+        interpreter = interpreters.get(batch_size)
+        if interpreter is None:
+            interpreter = tf.lite.Interpreter(model_content=self._tflite_model, num_threads=self._num_threads)
+            interpreter.resize_tensor_input(interpreter.get_input_details()[0]['index'], [batch_size, *self.input_shape])
+            interpreter.allocate_tensors()
+            interpreters[batch_size] = interpreter
+        return interpreter
+
+    def _bucket_size(self, batch_size):
+        for size in self.batch_buckets:
+            if size >= batch_size:
+                return size
+        return self.batch_buckets[-1]
+
+    def warmup(self):
+        """Allouer et exécuter chaque bucket une fois pour chaque jeu du pool"""
+        sets = [self._pool.get() for _ in range(self.pool_size)]
+        try:
+            for interpreters in sets:
+                for size in self.batch_buckets:
+                    self._invoke(interpreters, np.zeros((size, *self.input_shape), dtype=np.float32))
+        finally:
+            for interpreters in sets:
+                self._pool.put(interpreters)
+        logger.info(f"Interpréteurs TFLite alloués pour les batchs {self.batch_buckets}")
+
+    def _invoke(self, interpreters, batch):
+        batch_size = len(batch)
+        padded_size = self._bucket_size(batch_size)
+        if padded_size > batch_size:
+            padding = np.zeros((padded_size - batch_size, *batch.shape[1:]), dtype=batch.dtype)
+            batch = np.concatenate([batch, padding])
+
+        interpreter = self._interpreter(interpreters, padded_size)
+        interpreter.set_tensor(interpreter.get_input_details()[0]['index'], batch)
+        interpreter.invoke()
+        return interpreter.get_tensor(interpreter.get_output_details()[0]['index'])[:batch_size].copy()
+
+    def predict(self, batch):
+        batch = normalize(batch)
+        largest = self.batch_buckets[-1]
+        interpreters = self._pool.get()
+        try:
+            outputs = [
+                self._invoke(interpreters, batch[start:start + largest])
+                for start in range(0, max(len(batch), 1), largest)
+            ]
+        finally:
+            self._pool.put(interpreters)
+        return np.concatenate(outputs)
+
+    def info(self):
+        return {
+            "backend": self.name,
+            "quantization": self.quantization,
+            "interpreters": self.pool_size,
+            "batch_buckets": self.batch_buckets,
+            "model_size_bytes": self.model_size
+        }
+
+
+def tflite_key_for(source_key, quantization):
+    """Clé du flatbuffer TFLite rangé à côté du modèle source"""
+    base, _ = os.path.splitext(source_key)
+    return f"{base}_{quantization}.tflite"
+
+
+def load_or_convert_tflite(model, s3_client, bucket_name, source_key, quantization, representative_fn=None,
+                           source_etag=None):
+    """Récupérer le flatbuffer en cache dans MinIO ou le convertir et l'y déposer.
+
+    Le cache est valide tant que l'ETag du modèle source correspond à celui
+    enregistré dans les métadonnées de l'objet TFLite (lu par HEAD s'il n'est
+    pas fourni).
+    """
+    tflite_key = None
+
+    if source_key:
+        tflite_key = tflite_key_for(source_key, quantization)
+        try:
+            source_etag = source_etag or s3_client.head_object(Bucket=bucket_name, Key=source_key)['ETag'].strip('"')
+            cached = s3_client.get_object(Bucket=bucket_name, Key=tflite_key)
+            if cached.get('Metadata', {}).get('source-etag') == source_etag:
+                logger.info(f"Modèle TFLite en cache: s3://{bucket_name}/{tflite_key}")
+                return cached['Body'].read(), tflite_key
+            logger.info(f"Modèle TFLite obsolète: s3://{bucket_name}/{tflite_key}")
+        except ClientError as e:
+            if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+                logger.warning(f"Erreur accès cache TFLite {tflite_key}: {e}")
+        except Exception as e:
+            logger.warning(f"Erreur accès cache TFLite {tflite_key}: {e}")
+
+    representative_images = representative_fn() if quantization == 'int8' and representative_fn else None
+    tflite_model = convert_to_tflite(model, quantization, representative_images)
+    logger.info(f"Modèle converti en TFLite ({quantization}): {len(tflite_model)} bytes")
+
+    if tflite_key and source_etag:
+        try:
+            s3_client.put_object(
+                Bucket=bucket_name,
+                Key=tflite_key,
+                Body=tflite_model,
+                Metadata={'source-etag': source_etag, 'quantization': quantization}
+            )
+            logger.info(f"Modèle TFLite mis en cache: s3://{bucket_name}/{tflite_key}")
+        except Exception as e:
+            logger.warning(f"Erreur mise en cache TFLite {tflite_key}: {e}")
+
+    return tflite_model, tflite_key
+
+
+def sample_calibration_images(s3_client, bucket_name, decode_fn, max_images=100, prefix='raw/'):
+    """Échantillon d'images prétraitées (H, W, C) du bucket de données pour la calibration int8"""
+    images = []
+    try:
+        paginator = s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                if len(images) >= max_images:
+                    return images
+                try:
+                    body = s3_client.get_object(Bucket=bucket_name, Key=obj['Key'])['Body'].read()
+                    images.append(decode_fn(body))
+                except Exception as e:
+                    logger.warning(f"Image de calibration ignorée {obj['Key']}: {e}")
+    except Exception as e:
+        logger.warning(f"Erreur échantillonnage calibration: {e}")
+    return images
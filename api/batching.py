@@ -0,0 +1,165 @@
+import asyncio
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """Regroupe les prédictions concurrentes en un seul appel au modèle.
+
+    Les images prétraitées sont mises en file d'attente; un worker asyncio
+    déclenche une passe forward dès que `max_batch_size` images sont en
+    attente ou que `max_wait_us` microsecondes se sont écoulées depuis la
+    première, puis redistribue les résultats aux handlers en attente.
+
+    Un seul batch est en cours à la fois: les images sont copiées dans un
+    buffer préalloué de `max_batch_size` lignes, réutilisé d'un batch à
+    l'autre (`predict_fn` ne doit pas conserver de référence à son entrée).
+
+    Une image peut être soumise avec sa propre fonction de prédiction (celle
+    de la version du modèle louée par la requête): un batch mêlant deux
+    versions, autour d'une bascule, est découpé en une passe par version.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=16, max_wait_us=2000, executor=None):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait_us = max(0, int(max_wait_us))
+        self.executor = executor
+
+        self._queue = None
+        self._worker = None
+        self._buffer = None
+
+        # Statistiques cumulées
+        self.total_batches = 0
+        self.total_items = 0
+
+    async def start(self):
+        """Démarrer le worker de batching sur la boucle courante"""
+        if self._worker is not None:
+            return
+        self._queue = asyncio.Queue()
+        self._worker = asyncio.create_task(self._run())
+        logger.info(
+            f"Micro-batching actif: max_batch_size={self.max_batch_size}, "
+            f"max_wait_us={self.max_wait_us}"
+        )
+
+    async def stop(self):
+        """Arrêter le worker et rejeter les requêtes encore en attente"""
+        if self._worker is None:
+            return
+        self._worker.cancel()
+        try:
+            await self._worker
+        except asyncio.CancelledError:
+            pass
+        self._worker = None
+
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError("Batcher arrêté"))
+
+    async def submit(self, image_array, predict_fn=None):
+        """Soumettre une image prétraitée (H, W, C) et attendre sa prédiction.
+
+        `predict_fn` remplace pour cette image la fonction du batcher.
+        Retourne un tuple (probabilités, infos du batch).
+        """
+        if self._worker is None:
+            raise RuntimeError("Batcher non démarré")
+
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((image_array, future, predict_fn or self.predict_fn))
+        return await future
+
+    @property
+    def queue_depth(self):
+        """Nombre d'images en attente de batch"""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def config(self):
+        """Configuration et statistiques du batcher"""
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_us": self.max_wait_us,
+            "queue_depth": self.queue_depth,
+            "total_batches": self.total_batches,
+            "total_items": self.total_items,
+            "avg_batch_size": round(self.total_items / self.total_batches, 2) if self.total_batches else 0.0,
+        }
+
+    async def _collect(self):
+        """Attendre la première requête puis remplir le batch jusqu'à la limite"""
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        deadline = loop.time() + self.max_wait_us / 1_000_000
+
+        while len(batch) < self.max_batch_size:
+            # Vider d'abord ce qui est déjà en file sans attendre
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    def _fill_buffer(self, arrays):
+        """Copier les images du batch dans le buffer préalloué et en renvoyer la vue"""
+        first = arrays[0]
+        shape = (self.max_batch_size, *first.shape)
+        if self._buffer is None or self._buffer.shape != shape or self._buffer.dtype != first.dtype:
+            self._buffer = np.empty(shape, dtype=first.dtype)
+
+        for i, array in enumerate(arrays):
+            self._buffer[i] = array
+        return self._buffer[:len(arrays)]
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+
+            # Ignorer les handlers qui ont abandonné (client déconnecté)
+            groups = {}
+            for array, future, predict_fn in batch:
+                if not future.done():
+                    groups.setdefault(predict_fn, []).append((array, future))
+
+            for predict_fn, items in groups.items():
+                await self._predict(predict_fn, items)
+
+    async def _predict(self, predict_fn, items):
+        """Une passe forward pour les images d'un même modèle, résultats redistribués"""
+        loop = asyncio.get_running_loop()
+        try:
+            inputs = self._fill_buffer([array for array, _ in items])
+            predictions = await loop.run_in_executor(self.executor, predict_fn, inputs)
+        except Exception as e:
+            logger.error(f"Erreur prédiction batch ({len(items)} images): {e}")
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self.total_batches += 1
+        self.total_items += len(items)
+
+        batch_info = {
+            "batch_size": len(items),
+            "max_batch_size": self.max_batch_size,
+            "max_wait_us": self.max_wait_us,
+        }
+        for i, (_, future) in enumerate(items):
+            if not future.done():
+                future.set_result((predictions[i], batch_info))
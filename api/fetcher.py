@@ -0,0 +1,217 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import httpx
+
+from prediction_cache import normalize_url
+
+logger = logging.getLogger(__name__)
+
+# Une éviction ramène le cache disque à cette fraction de cache_max_bytes
+CACHE_EVICT_TARGET = 0.9
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+class ImageTooLargeError(ValueError):
+    """Image distante au-delà de la taille maximale acceptée"""
+
+
+class ImageFetcher:
+    """Téléchargement asynchrone des images distantes.
+
+    - un seul client httpx partagé (keep-alive, HTTP/2 si `h2` est installé)
+    - nombre de téléchargements simultanés borné par hôte
+    - lecture en flux, abandonnée dès que `max_bytes` est dépassé
+    - cache disque optionnel indexé par URL + ETag: pendant `cache_ttl`
+      secondes l'image est servie sans requête, ensuite elle est revalidée
+      avec If-None-Match (un 304 évite de retélécharger le contenu).
+      La taille du cache est suivie en mémoire: le répertoire n'est parcouru
+      qu'à la première écriture et quand la limite est dépassée, l'éviction
+      redescendant alors sous CACHE_EVICT_TARGET * cache_max_bytes
+    """
+
+    def __init__(self, max_bytes, timeout=10.0, max_connections=100, per_host_limit=8,
+                 cache_dir=None, cache_ttl=300, cache_max_bytes=512 * 1024 * 1024, transport=None):
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.per_host_limit = per_host_limit
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.cache_ttl = cache_ttl
+        self.cache_max_bytes = cache_max_bytes
+        self.transport = transport
+        self._cache_bytes = None
+        self._cache_lock = threading.Lock()
+
+        self.client = None
+        self._host_limits = {}
+        self.stats = {"downloads": 0, "cache_hits": 0, "revalidated": 0, "too_large": 0}
+
+    async def start(self):
+        self.client = httpx.AsyncClient(
+            http2=HTTP2_AVAILABLE and self.transport is None,
+            timeout=self.timeout,
+            follow_redirects=True,
+            limits=httpx.Limits(
+                max_connections=self.max_connections,
+                max_keepalive_connections=self.max_connections
+            ),
+            transport=self.transport
+        )
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    async def stop(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    def _host_limit(self, url):
+        host = urlsplit(url).netloc.lower()
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+        return self._host_limits[host]
+
+    async def fetch(self, url):
+        """Octets de l'image à `url` (lève ImageTooLargeError au-delà de max_bytes)"""
+        cached = await asyncio.to_thread(self._read_cache, url) if self.cache_dir else None
+        if cached and time.time() - cached["meta"]["validated_at"] < self.cache_ttl:
+            self.stats["cache_hits"] += 1
+            return cached["content"]
+
+        headers = {"If-None-Match": cached["meta"]["etag"]} if cached else {}
+
+        async with self._host_limit(url):
+            async with self.client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304 and cached:
+                    self.stats["revalidated"] += 1
+                    await asyncio.to_thread(self._touch_cache, url, cached["meta"])
+                    return cached["content"]
+
+                response.raise_for_status()
+
+                declared = response.headers.get("content-length")
+                if declared and declared.isdigit() and int(declared) > self.max_bytes:
+                    self._reject(int(declared))
+
+                chunks = []
+                received = 0
+                async for chunk in response.aiter_bytes():
+                    received += len(chunk)
+                    if received > self.max_bytes:
+                        self._reject(received)
+                    chunks.append(chunk)
+                etag = response.headers.get("etag")
+
+        self.stats["downloads"] += 1
+        content = b"".join(chunks)
+        if self.cache_dir and etag:
+            await asyncio.to_thread(self._write_cache, url, etag, content)
+        return content
+
+    def _reject(self, size):
+        self.stats["too_large"] += 1
+        raise ImageTooLargeError(f"Image trop volumineuse (plus de {size} bytes). Maximum: {self.max_bytes} bytes")
+
+    def _cache_paths(self, url):
+        digest = hashlib.sha256(normalize_url(url).encode("utf-8")).hexdigest()
+        return self.cache_dir / f"{digest}.bin", self.cache_dir / f"{digest}.json"
+
+    def _read_cache(self, url):
+        content_path, meta_path = self._cache_paths(url)
+        try:
+            meta = json.loads(meta_path.read_text())
+            content = content_path.read_bytes()
+        except (OSError, ValueError):
+            return None
+        if meta.get("url") != normalize_url(url) or len(content) != meta.get("size"):
+            return None
+        return {"meta": meta, "content": content}
+
+    def _touch_cache(self, url, meta):
+        _, meta_path = self._cache_paths(url)
+        try:
+            meta_path.write_text(json.dumps({**meta, "validated_at": time.time()}))
+        except OSError as e:
+            logger.warning(f"Erreur mise à jour cache URL {url}: {e}")
+
+    def _write_cache(self, url, etag, content):
+        content_path, meta_path = self._cache_paths(url)
+        meta = {"url": normalize_url(url), "etag": etag, "size": len(content), "validated_at": time.time()}
+        tmp_path = None
+        try:
+            try:
+                previous_size = content_path.stat().st_size
+            except FileNotFoundError:
+                previous_size = 0
+            # Écriture atomique dans un fichier temporaire propre à l'appel:
+            # un lecteur concurrent ne voit jamais un fichier partiel
+            with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix=".tmp", delete=False) as tmp:
+                tmp_path = tmp.name
+                tmp.write(content)
+            os.replace(tmp_path, content_path)
+            meta_path.write_text(json.dumps(meta))
+        except OSError as e:
+            logger.warning(f"Erreur écriture cache URL {url}: {e}")
+            if tmp_path:
+                Path(tmp_path).unlink(missing_ok=True)
+            return
+
+        with self._cache_lock:
+            if self._cache_bytes is not None:
+                self._cache_bytes += len(content) - previous_size
+            if self._cache_bytes is None or self._cache_bytes > self.cache_max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Recalculer la taille du cache et, au-delà de cache_max_bytes, supprimer les images
+        les moins récemment validées. Appelé sous `_cache_lock`.
+        """
+        entries = []
+        total = 0
+        for content_path in self.cache_dir.glob("*.bin"):
+            meta_path = content_path.with_suffix(".json")
+            try:
+                size = content_path.stat().st_size
+                mtime = meta_path.stat().st_mtime
+            except OSError:
+                continue
+            entries.append((mtime, size, content_path, meta_path))
+            total += size
+
+        if total > self.cache_max_bytes:
+            target = self.cache_max_bytes * CACHE_EVICT_TARGET
+            for _, size, content_path, meta_path in sorted(entries):
+                if total <= target:
+                    break
+                for path in (meta_path, content_path):
+                    try:
+                        path.unlink()
+                    except OSError:
+                        pass
+                total -= size
+        self._cache_bytes = total
+
+    def info(self):
+        return {
+            "http2": HTTP2_AVAILABLE,
+            "max_connections": self.max_connections,
+            "per_host_limit": self.per_host_limit,
+            "disk_cache": str(self.cache_dir) if self.cache_dir else None,
+            "disk_cache_ttl": self.cache_ttl,
+            "disk_cache_bytes": self._cache_bytes,
+            **self.stats
+        }
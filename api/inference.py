@@ -0,0 +1,73 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import tensorflow as tf
+
+from metrics import INFERENCE_QUEUE_DEPTH, INFERENCE_WORKERS
+
+logger = logging.getLogger(__name__)
+
+
+def default_num_workers():
+    """Nombre de workers par défaut: un par cœur disponible"""
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except AttributeError:
+        return max(1, os.cpu_count() or 1)
+
+
+def configure_tensorflow_threads(intra_op_threads, inter_op_threads):
+    """Configurer les pools de threads TensorFlow.
+
+    Doit être appelé avant la première opération TensorFlow, sinon le
+    runtime est déjà initialisé et la configuration est ignorée.
+    """
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+        logger.info(f"Threads TensorFlow: intra_op={intra_op_threads}, inter_op={inter_op_threads}")
+    except RuntimeError as e:
+        logger.warning(f"Configuration des threads TensorFlow ignorée: {e}")
+
+
+class InferenceExecutor(ThreadPoolExecutor):
+    """Pool de threads borné dédié au décodage et à l'inférence.
+
+    Le travail bloquant (PIL, model.predict) y est déporté pour ne jamais
+    geler la boucle asyncio d'uvicorn. La profondeur de file (tâches en
+    attente + en cours) est suivie dans une gauge Prometheus.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or default_num_workers()
+        super().__init__(max_workers=self.max_workers, thread_name_prefix='inference')
+
+        self._depth = 0
+        self._depth_lock = threading.Lock()
+        INFERENCE_WORKERS.set(self.max_workers)
+
+    @property
+    def queue_depth(self):
+        return self._depth
+
+    def _track(self, delta):
+        with self._depth_lock:
+            self._depth += delta
+            INFERENCE_QUEUE_DEPTH.set(self._depth)
+
+    def submit(self, fn, /, *args, **kwargs):
+        self._track(1)
+        try:
+            future = super().submit(fn, *args, **kwargs)
+        except Exception:
+            self._track(-1)
+            raise
+        future.add_done_callback(lambda _: self._track(-1))
+        return future
+
+    async def run(self, fn, *args):
+        """Exécuter une fonction bloquante dans le pool et attendre son résultat"""
+        return await asyncio.get_running_loop().run_in_executor(self, fn, *args)
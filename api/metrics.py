@@ -0,0 +1,51 @@
+from prometheus_client import Counter, Gauge, Histogram
+
+# Métriques Prometheus exposées sur /metrics
+
+INFERENCE_QUEUE_DEPTH = Gauge(
+    'plant_api_inference_queue_depth',
+    "Nombre de tâches en attente ou en cours dans l'exécuteur d'inférence"
+)
+
+INFERENCE_WORKERS = Gauge(
+    'plant_api_inference_workers',
+    "Nombre de threads de l'exécuteur d'inférence"
+)
+
+BATCHER_QUEUE_DEPTH = Gauge(
+    'plant_api_batcher_queue_depth',
+    "Nombre d'images en attente dans le micro-batcher"
+)
+
+
+PREDICTION_CACHE_HITS = Counter(
+    'plant_api_prediction_cache_hits_total',
+    "Nombre de prédictions servies depuis le cache"
+)
+
+PREDICTION_CACHE_MISSES = Counter(
+    'plant_api_prediction_cache_misses_total',
+    "Nombre de recherches absentes du cache de prédictions"
+)
+
+MODEL_RELOAD_SECONDS = Histogram(
+    'plant_api_model_reload_seconds',
+    "Durée d'un rechargement réussi du modèle (chargement, préchauffage, bascule et drain)",
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120)
+)
+
+MODEL_RELOADS = Counter(
+    'plant_api_model_reloads_total',
+    "Rechargements du modèle par issue (success: version basculée, failure: version précédente conservée)",
+    ['status']
+)
+
+MODEL_SWAPS = Counter(
+    'plant_api_model_swaps_total',
+    "Nombre de bascules de la version servie"
+)
+
+MODEL_IN_FLIGHT = Gauge(
+    'plant_api_model_in_flight_requests',
+    "Requêtes de prédiction en cours sur la version servie"
+)
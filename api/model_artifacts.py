@@ -0,0 +1,249 @@
+"""Téléchargement et chargement des modèles du bucket `models`, sans fichier temporaire persistant.
+
+L'objet est lu en mémoire, par plages parallèles (GET Range) quand sa
+taille est connue (entrée du registre), sinon en un seul GET: pas de HEAD
+préalable, une clé absente est simplement passée. Chaque plage est
+conditionnée à l'ETag attendu (un objet réécrit pendant la lecture est
+détecté) et le contenu est vérifié par son sha256 quand il est connu.
+
+Keras ne désérialise publiquement que depuis un chemin: le contenu est
+écrit dans un répertoire temporaire en mémoire (/dev/shm s'il a la place),
+supprimé dès le modèle chargé, y compris en cas d'erreur.
+
+Avec un `ModelFileCache`, les modèles sont conservés sur disque, adressés
+par leur sha256: une version dont l'empreinte (registre) correspond à un
+fichier en cache intact est chargée sans téléchargement; une clé
+historique est revalidée par un GET conditionnel sur l'ETag connu.
+
+Module partagé à l'identique entre ml/models et api.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from botocore.exceptions import ClientError
+from tensorflow import keras
+
+from model_registry import file_sha256
+
+DOWNLOAD_PART_SIZE = 8 * 1024 * 1024
+DOWNLOAD_WORKERS = 8
+MEMORY_TMP_DIR = '/dev/shm'
+
+
+class ArtifactIntegrityError(ValueError):
+    """Contenu téléchargé différent de celui enregistré (sha256)"""
+
+
+def model_format(key):
+    return 'h5' if key.endswith('.h5') else 'keras'
+
+
+def download_object(s3_client, bucket_name, key, size=None, etag=None, part_size=None, max_workers=None,
+                    if_none_match=None):
+    """(contenu, ETag) d'un objet: plages parallèles si sa taille dépasse `part_size`.
+
+    Avec `if_none_match`, un objet inchangé lève une ClientError 304.
+    """
+    part_size = part_size or DOWNLOAD_PART_SIZE
+    max_workers = max_workers or DOWNLOAD_WORKERS
+    conditions = {'IfMatch': f'"{etag}"'} if etag else {}
+    if if_none_match:
+        response = s3_client.get_object(Bucket=bucket_name, Key=key, IfNoneMatch=f'"{if_none_match}"')
+        return response['Body'].read(), response['ETag'].strip('"')
+    if size is None or size <= part_size:
+        response = s3_client.get_object(Bucket=bucket_name, Key=key, **conditions)
+        return response['Body'].read(), response['ETag'].strip('"')
+
+    buffer = bytearray(size)
+
+    def fetch(start):
+        end = min(start + part_size, size) - 1
+        response = s3_client.get_object(Bucket=bucket_name, Key=key, Range=f"bytes={start}-{end}", **conditions)
+        part = response['Body'].read()
+        if len(part) != end - start + 1:
+            raise ArtifactIntegrityError(f"Plage incomplète pour {key}: {len(part)} octets au lieu de {end - start + 1}")
+        buffer[start:end + 1] = part
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, -(-size // part_size))) as executor:
+        list(executor.map(fetch, range(0, size, part_size)))
+    return bytes(buffer), etag
+
+
+def verify_sha256(data, expected, key):
+    """sha256 du contenu, qui doit correspondre à `expected` s'il est connu"""
+    digest = hashlib.sha256(data).hexdigest()
+    if expected and digest != expected:
+        raise ArtifactIntegrityError(f"Empreinte sha256 invalide pour {key}")
+    return digest
+
+
+def deserialize_model(data, fmt):
+    """Modèle Keras à partir du contenu d'un fichier .keras / .h5"""
+    tmp_root = None
+    if os.path.isdir(MEMORY_TMP_DIR) and shutil.disk_usage(MEMORY_TMP_DIR).free > 2 * len(data):
+        tmp_root = MEMORY_TMP_DIR
+    with tempfile.TemporaryDirectory(dir=tmp_root) as tmp_dir:
+        path = os.path.join(tmp_dir, f"model.{fmt}")
+        with open(path, 'wb') as f:
+            f.write(data)
+        return keras.models.load_model(path)
+
+
+class ModelFileCache:
+    """Cache disque des modèles adressé par contenu: <sha256>.<format>.
+
+    Un fichier n'est réutilisé qu'après vérification de son sha256 (un
+    fichier corrompu est supprimé). Chaque clé S3 téléchargée a une
+    référence (<sha256 de la clé>.ref.json: ETag et sha256 du contenu) pour
+    revalider les clés dont le registre ne donne pas l'empreinte. Au-delà
+    de `max_versions` fichiers, les moins récemment utilisés sont supprimés.
+    """
+
+    def __init__(self, cache_dir, max_versions=3):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_versions = max(1, int(max_versions))
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "write_errors": 0}
+
+    def _ref_path(self, key):
+        return self.cache_dir / f"{hashlib.sha256(key.encode('utf-8')).hexdigest()}.ref.json"
+
+    def reference(self, key):
+        """(ETag, sha256) du dernier téléchargement de `key`, (None, None) si inconnu"""
+        try:
+            ref = json.loads(self._ref_path(key).read_text())
+        except (OSError, ValueError):
+            return None, None
+        return (ref.get('etag'), ref.get('sha256')) if ref.get('key') == key else (None, None)
+
+    def get(self, sha256, fmt):
+        """Chemin du fichier en cache s'il est intact, sinon None"""
+        path = self.cache_dir / f"{sha256}.{fmt}"
+        try:
+            if file_sha256(path) != sha256:
+                path.unlink()
+                return None
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def put(self, data, sha256, fmt, key, etag):
+        """Enregistrer un contenu vérifié et la référence de sa clé; retourne son chemin (None si échec)"""
+        path = self.cache_dir / f"{sha256}.{fmt}"
+        # Écriture atomique dans un fichier temporaire propre à l'appel:
+        # un autre processus ou thread ne voit jamais un fichier partiel
+        tmp_path = None
+        try:
+            with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix='.tmp', delete=False) as tmp:
+                tmp_path = tmp.name
+                tmp.write(data)
+            os.replace(tmp_path, path)
+            self._ref_path(key).write_text(json.dumps({'key': key, 'etag': etag, 'sha256': sha256}))
+        except OSError:
+            self.stats["write_errors"] += 1
+            if tmp_path:
+                Path(tmp_path).unlink(missing_ok=True)
+            return None
+        self._evict(keep=path)
+        return path
+
+    def _evict(self, keep):
+        """Supprimer les fichiers les moins récemment utilisés au-delà de max_versions"""
+        entries = []
+        for path in self.cache_dir.iterdir():
+            if path.suffix in ('.keras', '.h5') and path != keep:
+                try:
+                    entries.append((path.stat().st_mtime, path))
+                except OSError:
+                    continue
+        for _, path in sorted(entries, reverse=True)[self.max_versions - 1:]:
+            try:
+                path.unlink()
+                self.stats["evictions"] += 1
+            except OSError:
+                pass
+
+    def info(self):
+        return {"cache_dir": str(self.cache_dir), "max_versions": self.max_versions, **self.stats}
+
+
+def fetch_model_file(s3_client, bucket_name, candidate, cache=None):
+    """(chemin en cache ou None, contenu ou None, ETag, sha256) d'un candidat.
+
+    Sans cache, le contenu est téléchargé et vérifié. Avec cache, un fichier
+    intact dont l'empreinte est celle du registre est réutilisé tel quel;
+    une clé historique déjà téléchargée est revalidée par GET conditionnel.
+    """
+    key, fmt = candidate['key'], model_format(candidate['key'])
+    etag, sha256 = candidate.get('etag'), candidate.get('sha256')
+
+    if cache is not None:
+        if sha256:
+            path = cache.get(sha256, fmt)
+            if path:
+                cache.stats["hits"] += 1
+                return path, None, etag, sha256
+        else:
+            known_etag, known_sha256 = cache.reference(key)
+            path = cache.get(known_sha256, fmt) if known_sha256 else None
+            if path:
+                try:
+                    data, etag = download_object(s3_client, bucket_name, key, if_none_match=known_etag)
+                except ClientError as e:
+                    if e.response['Error']['Code'] not in ('304', 'NotModified'):
+                        raise
+                    cache.stats["hits"] += 1
+                    return path, None, known_etag, known_sha256
+                sha256 = verify_sha256(data, None, key)
+                cache.stats["misses"] += 1
+                return cache.put(data, sha256, fmt, key, etag), data, etag, sha256
+
+    data, etag = download_object(s3_client, bucket_name, key, candidate.get('size'), etag)
+    sha256 = verify_sha256(data, sha256, key)
+    if cache is None:
+        return None, data, etag, sha256
+    cache.stats["misses"] += 1
+    return cache.put(data, sha256, fmt, key, etag), data, etag, sha256
+
+
+def load_model_artifact(s3_client, bucket_name, candidates, log=print, cache=None):
+    """Charger le premier candidat disponible: (modèle, candidat, durées) ou (None, None, durées).
+
+    `candidates`: dicts {"key", et si connus "size", "etag", "sha256"} par
+    ordre de préférence. Le candidat retourné est complété par l'ETag, le
+    sha256, la taille et l'origine du fichier ("cache" ou "download"); les
+    durées détaillent obtention (téléchargement ou cache) et désérialisation.
+    """
+    timings = {}
+    for candidate in candidates:
+        key = candidate['key']
+        try:
+            start = time.perf_counter()
+            path, data, etag, sha256 = fetch_model_file(s3_client, bucket_name, candidate, cache)
+            timings['download_seconds'] = round(time.perf_counter() - start, 3)
+
+            start = time.perf_counter()
+            model = keras.models.load_model(path) if path else deserialize_model(data, model_format(key))
+            timings['deserialize_seconds'] = round(time.perf_counter() - start, 3)
+            return model, {
+                **candidate,
+                'etag': etag,
+                'sha256': sha256,
+                'size': len(data) if data is not None else os.path.getsize(path),
+                'source': 'download' if data is not None else 'cache'
+            }, timings
+        except ClientError as e:
+            if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+                log(f"⚠️ Modèle non trouvé: s3://{bucket_name}/{key}")
+            else:
+                log(f"⚠️ Erreur accès modèle {key}: {e}")
+        except Exception as e:
+            log(f"⚠️ Erreur chargement modèle {key}: {e}")
+    return None, None, timings
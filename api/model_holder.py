@@ -0,0 +1,180 @@
+import asyncio
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from metrics import MODEL_IN_FLIGHT, MODEL_RELOAD_SECONDS, MODEL_RELOADS, MODEL_SWAPS
+
+logger = logging.getLogger(__name__)
+
+# Version louée par la requête en cours (voir ModelLeaseMiddleware)
+_leased_model = contextvars.ContextVar('leased_model', default=None)
+
+
+class ServedModel:
+    """Version de modèle prête à servir: backend préchauffé, identifiant, requêtes en cours"""
+
+    def __init__(self, backend, version, key=None, keras_model=None, from_minio=False, load_info=None):
+        self.backend = backend
+        self.version = version
+        self.key = key
+        # Le modèle Keras n'est conservé que s'il sert lui-même les prédictions
+        self.keras_model = keras_model
+        self.from_minio = from_minio
+        self.load_info = load_info
+        self.loaded_at = datetime.now().isoformat()
+        self.in_flight = 0
+
+    def info(self):
+        return {
+            "version": self.version,
+            "key": self.key,
+            "from_minio": self.from_minio,
+            "loaded_at": self.loaded_at,
+            "in_flight": self.in_flight
+        }
+
+
+class ModelHolder:
+    """Référence vers la version servie, remplacée atomiquement.
+
+    Une nouvelle version est chargée et préchauffée hors de la boucle
+    asyncio pendant que l'ancienne continue de servir; la référence n'est
+    basculée qu'une fois la préparation réussie. Les requêtes déjà en cours
+    terminent sur la version qu'elles ont louée, attendues (au plus
+    `drain_timeout` secondes) avant que l'ancienne version soit libérée.
+    En cas d'échec, la version courante reste en service.
+    """
+
+    def __init__(self, drain_timeout=30.0):
+        self.current = None
+        self.drain_timeout = drain_timeout
+        self.last_reload = None
+        self._reload_task = None
+        MODEL_IN_FLIGHT.set_function(lambda: self.current.in_flight if self.current else 0)
+
+    @contextmanager
+    def lease(self):
+        """Version courante, comptée en cours jusqu'à la sortie du bloc (None si aucune)"""
+        served = self.current
+        if served is None:
+            yield None
+            return
+        served.in_flight += 1
+        try:
+            yield served
+        finally:
+            served.in_flight -= 1
+
+    def swap(self, served):
+        """Basculer vers `served`; retourne la version remplacée"""
+        previous, self.current = self.current, served
+        MODEL_SWAPS.inc()
+        logger.info(f"Version servie: {served.version} (remplace {previous.version if previous else 'aucune'})")
+        return previous
+
+    async def drain(self, served, poll_interval=0.01):
+        """Attendre la fin des requêtes en cours sur `served`; False si le délai est dépassé"""
+        deadline = time.monotonic() + self.drain_timeout
+        while served.in_flight > 0:
+            if time.monotonic() >= deadline:
+                logger.warning(f"{served.in_flight} requête(s) encore en cours sur {served.version} après {self.drain_timeout}s")
+                return False
+            await asyncio.sleep(poll_interval)
+        return True
+
+    def start_reload(self, prepare_fn, after_swap=None):
+        """Lancer en tâche de fond la préparation d'une version (`prepare_fn` -> ServedModel, dans un thread)
+        puis sa bascule; un rechargement déjà en cours est partagé plutôt que relancé.
+
+        `after_swap` (coroutine, sans argument) est attendue une fois l'ancienne version drainée.
+        """
+        if self._reload_task is None or self._reload_task.done():
+            self._reload_task = asyncio.create_task(self._reload(prepare_fn, after_swap))
+        return self._reload_task
+
+    async def reload(self, prepare_fn, after_swap=None):
+        """Recharger et attendre la fin: état du rechargement (voir `last_reload`).
+
+        L'annulation de l'appelant (client déconnecté) n'interrompt pas le rechargement.
+        """
+        return await asyncio.shield(self.start_reload(prepare_fn, after_swap))
+
+    async def _reload(self, prepare_fn, after_swap):
+        start = time.perf_counter()
+        previous = self.current
+        try:
+            served = await asyncio.to_thread(prepare_fn)
+        except Exception as e:
+            MODEL_RELOADS.labels(status='failure').inc()
+            logger.error(f"Rechargement échoué, version {previous.version if previous else 'aucune'} conservée: {e}")
+            self.last_reload = {
+                "status": "failure",
+                "error": str(e),
+                "serving": previous.version if previous else None,
+                "reload_seconds": round(time.perf_counter() - start, 3),
+                "timestamp": datetime.now().isoformat()
+            }
+            return self.last_reload
+
+        self.swap(served)
+        drained = True
+        if previous is not None:
+            drained = await self.drain(previous)
+        if after_swap is not None:
+            try:
+                await after_swap()
+            except Exception as e:
+                logger.error(f"Erreur après bascule vers {served.version}: {e}")
+        reload_seconds = time.perf_counter() - start
+        MODEL_RELOAD_SECONDS.observe(reload_seconds)
+        MODEL_RELOADS.labels(status='success').inc()
+        self.last_reload = {
+            "status": "success",
+            "serving": served.version,
+            "previous": previous.version if previous else None,
+            "drained": drained,
+            "reload_seconds": round(reload_seconds, 3),
+            "timestamp": datetime.now().isoformat()
+        }
+        return self.last_reload
+
+    def info(self):
+        return {
+            "current": self.current.info() if self.current else None,
+            "reloading": self._reload_task is not None and not self._reload_task.done(),
+            "last_reload": self.last_reload,
+            "drain_timeout": self.drain_timeout
+        }
+
+
+def leased_model(holder):
+    """Version louée par la requête en cours, sinon la version courante"""
+    return _leased_model.get() or holder.current
+
+
+class ModelLeaseMiddleware:
+    """Middleware ASGI: une requête de prédiction utilise la version servie à son arrivée.
+
+    La location couvre toute la réponse, y compris un corps envoyé en flux:
+    une bascule pendant la requête n'en change pas le modèle.
+    """
+
+    def __init__(self, app, holder, path_prefixes=('/predict',)):
+        self.app = app
+        self.holder = holder
+        self.path_prefixes = tuple(path_prefixes)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not scope['path'].startswith(self.path_prefixes):
+            await self.app(scope, receive, send)
+            return
+
+        with self.holder.lease() as served:
+            token = _leased_model.set(served)
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                _leased_model.reset(token)
@@ -0,0 +1,133 @@
+"""Registre des versions de modèles: manifest JSON en ajout seul dans le bucket `models`.
+
+    registry/<model_name>.json
+    {"model_name": ..., "versions": [{"version", "key", "format", "size", "sha256",
+                                      "accuracy", "created_at", "status", ...}, ...]}
+
+Chaque sauvegarde ajoute une entrée, jamais modifiée ni supprimée; la
+dernière entrée "ready" est la version latest. Une lecture du manifest
+suffit pour lister les versions ou résoudre latest / une version donnée,
+sans lister le bucket.
+
+Les écritures sont conditionnelles (If-None-Match à la création, If-Match
+sur l'ETag lu ensuite): deux sauvegardes concurrentes ne s'écrasent pas, la
+perdante relit le manifest et réessaie. Les lecteurs gardent le manifest en
+mémoire et le revalident par un GET conditionnel (304 sans corps).
+
+Module partagé à l'identique entre ml/models et api.
+"""
+import hashlib
+import json
+import random
+import threading
+import time
+from datetime import datetime
+
+from botocore.exceptions import ClientError
+
+REGISTRY_PREFIX = 'registry'
+MODEL_STATUS_READY = 'ready'
+# Codes d'échec d'une écriture conditionnelle (S3 / MinIO)
+CONFLICT_CODES = ('PreconditionFailed', 'ConditionalRequestConflict', '412', '409')
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    """Manifest des versions d'un modèle, revalidé par ETag"""
+
+    def __init__(self, s3_client, bucket_name='models', model_name='plant_classifier'):
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.model_name = model_name
+        self.key = f"{REGISTRY_PREFIX}/{model_name}.json"
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._etag = None
+        self._index = {}
+        self._latest = None
+
+    def _set(self, manifest, etag):
+        self._manifest, self._etag = manifest, etag
+        versions = manifest["versions"] if manifest else []
+        self._index = {entry["version"]: entry for entry in versions}
+        self._latest = next((entry for entry in reversed(versions) if entry["status"] == MODEL_STATUS_READY), None)
+
+    def load(self):
+        """Manifest courant (None si aucune version n'a encore été enregistrée)"""
+        with self._lock:
+            conditions = {'IfNoneMatch': self._etag} if self._etag else {}
+            try:
+                response = self.s3_client.get_object(Bucket=self.bucket_name, Key=self.key, **conditions)
+            except ClientError as e:
+                code = e.response['Error']['Code']
+                if code in ('304', 'NotModified'):
+                    return self._manifest
+                if code not in ('404', 'NoSuchKey'):
+                    raise
+                self._set(None, None)
+                return None
+            self._set(json.loads(response['Body'].read()), response['ETag'])
+            return self._manifest
+
+    @property
+    def etag(self):
+        return self._etag
+
+    def latest(self):
+        self.load()
+        return self._latest
+
+    def get(self, version):
+        """Entrée d'une version ("latest" accepté), None si inconnue"""
+        if version == "latest":
+            return self.latest()
+        self.load()
+        return self._index.get(version)
+
+    def page(self, offset=0, limit=None):
+        """(versions de la plus récente à la plus ancienne, nombre total, ETag du manifest), en une lecture"""
+        manifest = self.load()
+        versions = manifest["versions"] if manifest else []
+        newest_first = versions[::-1]
+        return newest_first[offset:None if limit is None else offset + limit], len(versions), self._etag
+
+    def versions(self, offset=0, limit=None):
+        return self.page(offset, limit)[0]
+
+    def append(self, entry, max_attempts=5):
+        """Ajouter une version au manifest; relit et réessaie si une autre écriture est passée entre-temps"""
+        entry = {"status": MODEL_STATUS_READY, "created_at": datetime.now().isoformat(), **entry}
+        for attempt in range(max_attempts):
+            manifest = self.load()
+            if manifest is None:
+                manifest, conditions = {"model_name": self.model_name, "versions": []}, {'IfNoneMatch': '*'}
+            else:
+                conditions = {'IfMatch': self._etag}
+            if entry["version"] in self._index:
+                raise ValueError(f"Version déjà enregistrée: {entry['version']}")
+
+            updated = {**manifest, "versions": [*manifest["versions"], entry], "updated_at": datetime.now().isoformat()}
+            try:
+                response = self.s3_client.put_object(
+                    Bucket=self.bucket_name,
+                    Key=self.key,
+                    Body=json.dumps(updated).encode('utf-8'),
+                    ContentType='application/json',
+                    **conditions
+                )
+            except ClientError as e:
+                if e.response['Error']['Code'] not in CONFLICT_CODES:
+                    raise
+                time.sleep(random.uniform(0.05, 0.2) * 2 ** attempt)
+                continue
+            with self._lock:
+                self._set(updated, response['ETag'])
+            return entry
+        raise RuntimeError(f"Registre {self.key}: écriture concurrente, {max_attempts} tentatives échouées")
@@ -0,0 +1,61 @@
+import asyncio
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from botocore.config import Config
+
+from fetcher import ImageTooLargeError
+
+logger = logging.getLogger(__name__)
+
+
+class RawDataReader:
+    """Lecture concurrente des images d'un bucket MinIO via un client S3 unique.
+
+    Le client boto3 est thread-safe et réutilise ses connexions: il est créé
+    une seule fois, avec un pool dimensionné sur le nombre de threads de
+    lecture pour que chaque lecture simultanée dispose d'une connexion.
+    """
+
+    def __init__(self, bucket_name, max_bytes, max_pool_connections=32):
+        self.bucket_name = bucket_name
+        self.max_bytes = max_bytes
+        self.max_pool_connections = max_pool_connections
+        self.s3_client = boto3.client(
+            's3',
+            endpoint_url=os.getenv('MLFLOW_S3_ENDPOINT_URL', 'http://minio:9000'),
+            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID', 'minioadmin'),
+            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY', 'minioadmin123'),
+            region_name='us-east-1',
+            config=Config(
+                max_pool_connections=max_pool_connections,
+                tcp_keepalive=True,
+                retries={'max_attempts': 3, 'mode': 'standard'}
+            )
+        )
+        self._executor = ThreadPoolExecutor(max_pool_connections, thread_name_prefix='s3-read')
+
+    def _read(self, s3_key):
+        response = self.s3_client.get_object(Bucket=self.bucket_name, Key=s3_key)
+        body = response['Body']
+        try:
+            if response.get('ContentLength', 0) > self.max_bytes:
+                raise ImageTooLargeError(
+                    f"Objet trop volumineux ({response['ContentLength']} bytes). Maximum: {self.max_bytes} bytes"
+                )
+            return body.read()
+        finally:
+            body.close()
+
+    async def read(self, s3_key):
+        """Octets de l'objet `s3_key` sans bloquer la boucle asyncio"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._read, s3_key)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+    def info(self):
+        return {"bucket": self.bucket_name, "max_pool_connections": self.max_pool_connections}
@@ -0,0 +1,176 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from metrics import PREDICTION_CACHE_HITS, PREDICTION_CACHE_MISSES
+
+logger = logging.getLogger(__name__)
+
+try:
+    import redis.asyncio as redis_asyncio
+except ImportError:
+    redis_asyncio = None
+
+KEY_PREFIX = 'plant_api:pred:'
+
+
+def bytes_cache_key(image_bytes):
+    """Clé de cache d'une image à partir de ses octets bruts"""
+    return f"sha256:{hashlib.sha256(image_bytes).hexdigest()}"
+
+
+def normalize_url(url):
+    """Normaliser une URL (schéma/hôte en minuscules, paramètres triés, sans fragment)"""
+    parts = urlsplit(url.strip())
+    query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', query, ''))
+
+
+def remote_cache_key(item):
+    """Clé de cache d'un élément {"image_url": ...} ou {"s3_key": ...}"""
+    if "image_url" in item:
+        return f"url:{normalize_url(item['image_url'])}"
+    return f"s3:{item['s3_key']}"
+
+
+class MemoryCacheBackend:
+    """Cache LRU borné avec expiration (TTL) en mémoire du processus"""
+
+    name = 'memory'
+
+    def __init__(self, max_entries, ttl_seconds):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    async def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self):
+        return len(self._entries)
+
+
+class RedisCacheBackend:
+    """Cache partagé entre réplicas de l'API via Redis.
+
+    Le TTL est porté par chaque clé; la taille et l'éviction LRU sont
+    déléguées à Redis (maxmemory + allkeys-lru, voir docker-compose.yml).
+    """
+
+    name = 'redis'
+
+    def __init__(self, redis_url, ttl_seconds):
+        self.ttl_seconds = ttl_seconds
+        self._client = redis_asyncio.Redis.from_url(redis_url)
+
+    async def get(self, key):
+        value = await self._client.get(key)
+        return json.loads(value) if value is not None else None
+
+    async def set(self, key, value):
+        await self._client.set(key, json.dumps(value), ex=self.ttl_seconds)
+
+    async def clear(self):
+        async for key in self._client.scan_iter(match=f"{KEY_PREFIX}*", count=500):
+            await self._client.delete(key)
+
+    def size(self):
+        return None
+
+
+class PredictionCache:
+    """Cache des prédictions indexé par (version du modèle, empreinte de l'image).
+
+    Une erreur du backend (Redis indisponible...) est traitée comme un miss:
+    le cache ne doit jamais faire échouer une prédiction.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def from_config(cls, backend_name, max_entries=4096, ttl_seconds=3600, redis_url=None):
+        """Construire le cache configuré, ou None s'il est désactivé"""
+        if backend_name in ('none', 'off', 'disabled', ''):
+            return None
+
+        if backend_name == 'redis':
+            if redis_asyncio is None:
+                logger.warning("Module redis non installé, cache de prédictions en mémoire")
+            elif not redis_url:
+                logger.warning("REDIS_URL non défini, cache de prédictions en mémoire")
+            else:
+                return cls(RedisCacheBackend(redis_url, ttl_seconds))
+
+        return cls(MemoryCacheBackend(max_entries, ttl_seconds))
+
+    @staticmethod
+    def _full_key(model_version, cache_key):
+        digest = hashlib.sha256(f"{model_version}|{cache_key}".encode('utf-8')).hexdigest()
+        return f"{KEY_PREFIX}{digest}"
+
+    async def get(self, model_version, cache_key):
+        try:
+            value = await self.backend.get(self._full_key(model_version, cache_key))
+        except Exception as e:
+            logger.warning(f"Erreur lecture cache de prédictions: {e}")
+            value = None
+
+        if value is None:
+            self.misses += 1
+            PREDICTION_CACHE_MISSES.inc()
+        else:
+            self.hits += 1
+            PREDICTION_CACHE_HITS.inc()
+        return value
+
+    async def set(self, model_version, cache_key, value):
+        try:
+            await self.backend.set(self._full_key(model_version, cache_key), value)
+        except Exception as e:
+            logger.warning(f"Erreur écriture cache de prédictions: {e}")
+
+    async def invalidate(self):
+        """Vider le cache (appelé à chaque rechargement du modèle)"""
+        try:
+            await self.backend.clear()
+            logger.info("Cache de prédictions invalidé")
+        except Exception as e:
+            logger.warning(f"Erreur invalidation cache de prédictions: {e}")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": self.backend.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": self.backend.size()
+        }
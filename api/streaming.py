@@ -0,0 +1,108 @@
+import json
+
+from starlette.responses import StreamingResponse
+
+RAW_DATA_PREFIX = 's3://raw-data/'
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """StreamingResponse qui laisse le corps de la requête au handler.
+
+    Starlette surveille normalement la déconnexion du client en appelant
+    `receive()` pendant l'envoi de la réponse, ce qui consommerait les
+    chunks du corps que le handler est encore en train de lire. Ici la
+    lecture du corps reste au handler, qui voit la déconnexion via
+    `request.stream()`.
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+
+class LineTooLong:
+    """Marqueur d'une ligne du flux dépassant la limite (son contenu est ignoré)"""
+
+    def __init__(self, max_line_bytes):
+        self.max_line_bytes = max_line_bytes
+
+
+async def iter_ndjson_lines(chunks, max_line_bytes=None):
+    """Découper un flux d'octets en lignes non vides (NDJSON / texte), non décodées.
+
+    Une ligne de plus de `max_line_bytes` octets n'est pas accumulée: elle
+    produit un marqueur LineTooLong et ses octets sont ignorés jusqu'au
+    prochain saut de ligne.
+    """
+    buffer = bytearray()
+    skipping = False
+    async for chunk in chunks:
+        view = memoryview(chunk)
+        start = 0
+        while start < len(chunk):
+            end = chunk.find(b'\n', start)
+            if not skipping:
+                buffer += view[start:end if end >= 0 else len(chunk)]
+                if max_line_bytes and len(buffer) > max_line_bytes:
+                    buffer.clear()
+                    skipping = True
+                    yield LineTooLong(max_line_bytes)
+            if end < 0:
+                break
+            if skipping:
+                skipping = False
+            else:
+                line = bytes(buffer).strip()
+                buffer.clear()
+                if line:
+                    yield line
+            start = end + 1
+
+    line = bytes(buffer).strip()
+    if line and not skipping:
+        yield line
+
+
+def strip_raw_data_prefix(s3_key):
+    """Clé du bucket raw-data à partir d'une clé ou d'une URL s3://raw-data/..."""
+    if s3_key.startswith(RAW_DATA_PREFIX):
+        return s3_key[len(RAW_DATA_PREFIX):]
+    return s3_key
+
+
+def parse_stream_item(line):
+    """Convertir une ligne du flux en élément {"image_url": ...} ou {"s3_key": ...}.
+
+    Accepte un objet JSON avec `image_url` ou `s3_key`, une chaîne JSON ou une
+    ligne brute: URL http(s), URL s3://raw-data/... ou clé du bucket raw-data.
+    Une ligne trop longue ou non UTF-8 lève ValueError comme une ligne invalide.
+    """
+    if isinstance(line, LineTooLong):
+        raise ValueError(f"Ligne trop longue (plus de {line.max_line_bytes} octets), ignorée")
+    if isinstance(line, bytes):
+        try:
+            line = line.decode('utf-8')
+        except UnicodeDecodeError as e:
+            raise ValueError(f"Ligne non UTF-8: {e}")
+    if line.startswith('{') or line.startswith('"'):
+        try:
+            value = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Ligne JSON invalide: {e}")
+    else:
+        value = line
+
+    if isinstance(value, dict):
+        if value.get('image_url'):
+            return {"image_url": str(value['image_url'])}
+        if value.get('s3_key'):
+            return {"s3_key": strip_raw_data_prefix(str(value['s3_key']))}
+        raise ValueError("Objet sans champ image_url ni s3_key")
+
+    if not isinstance(value, str) or not value:
+        raise ValueError("Élément vide ou non supporté")
+
+    if value.startswith(('http://', 'https://')):
+        return {"image_url": value}
+    return {"s3_key": strip_raw_data_prefix(value)}
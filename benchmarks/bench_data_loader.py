@@ -0,0 +1,131 @@
+"""Benchmark: images/seconde du Sequence (téléchargements concurrents) vs pipeline tf.data.
+
+Usage:
+    python benchmarks/bench_data_loader.py [--images 256] [--batch-size 8] [--epochs 2] [--latency-ms 20]
+    python benchmarks/bench_data_loader.py --minio     # MinIO réel (MLFLOW_S3_ENDPOINT_URL)
+
+Par défaut S3 est simulé en mémoire (moto) et une latence réseau fixe est
+ajoutée à chaque GetObject (`--latency-ms`), ce qui reproduit le caractère
+I/O-bound de l'entraînement face à MinIO. Avec `--minio`, les images sont
+uploadées sous `benchmark/loader/` dans raw-data puis supprimées.
+Chaque époque est parcourue sans modèle: seul le débit de chargement est mesuré.
+Avec `--image-cache`, les deux loaders sont remesurés avec le cache local
+d'images décodées: le Sequence le remplit à sa première époque, tf.data
+démarre ensuite avec un cache chaud (nouveau run sur le même worker).
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from contextlib import nullcontext
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ml', 'models'))
+
+from bench_preprocessing import make_image
+
+BUCKET = 'raw-data'
+PREFIX = 'benchmark/loader'
+
+
+def add_latency(s3_client, latency_ms):
+    if latency_ms > 0:
+        s3_client.meta.events.register(
+            'before-call.s3.GetObject', lambda **kwargs: time.sleep(latency_ms / 1000)
+        )
+
+
+def iterate(data, steps):
+    count = 0
+    for step in range(steps):
+        _, labels = data[step]
+        count += len(labels)
+    return count
+
+
+def measure(name, make_data, epochs):
+    data = make_data()
+    rates = []
+    for _ in range(epochs):
+        start = time.perf_counter()
+        if hasattr(data, '__getitem__'):
+            count = iterate(data, len(data))
+            data.on_epoch_end()
+        else:
+            count = sum(len(labels) for _, labels in data)
+        rates.append(count / (time.perf_counter() - start))
+    print(f"{name:<14} | " + " | ".join(f"{rate:>10.1f}" for rate in rates))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', type=int, default=256)
+    parser.add_argument('--batch-size', type=int, default=8)
+    parser.add_argument('--epochs', type=int, default=2)
+    parser.add_argument('--latency-ms', type=float, default=20.0)
+    parser.add_argument('--width', type=int, default=1024)
+    parser.add_argument('--height', type=int, default=768)
+    parser.add_argument('--minio', action='store_true')
+    parser.add_argument('--image-cache', action='store_true', help="mesurer aussi avec le cache d'images décodées")
+    args = parser.parse_args()
+
+    if not args.minio:
+        os.environ.setdefault('AWS_ACCESS_KEY_ID', 'test')
+        os.environ.setdefault('AWS_SECRET_ACCESS_KEY', 'test')
+        os.environ['MLFLOW_S3_ENDPOINT_URL'] = 'https://s3.amazonaws.com'
+        from moto import mock_s3
+        context = mock_s3()
+    else:
+        context = nullcontext()
+
+    with context:
+        import simple_model
+        from data_pipeline import make_image_dataset
+        from image_cache import DecodedImageCache
+
+        s3_client = simple_model.get_s3_client()
+        if not args.minio:
+            s3_client.create_bucket(Bucket=BUCKET)
+            add_latency(s3_client, args.latency_ms)
+
+        image_bytes = make_image((args.width, args.height), 'JPEG')
+        keys = [f"{PREFIX}/{i:05d}.jpg" for i in range(args.images)]
+        labels = ['dandelion' if i % 2 else 'grass' for i in range(args.images)]
+        for key in keys:
+            s3_client.put_object(Bucket=BUCKET, Key=key, Body=image_bytes)
+
+        def make_sequence(image_cache=None):
+            # Le générateur utilise le client partagé du processus (latence déjà ajoutée)
+            return simple_model.MinIOImageDataGenerator(
+                keys, labels, batch_size=args.batch_size,
+                image_cache=image_cache, cache_keys=simple_model.image_cache_keys(keys) if image_cache is not None else None
+            )
+
+        def make_tf_data(image_cache=None):
+            return make_image_dataset(
+                keys, labels, simple_model.fetch_minio_image, batch_size=args.batch_size,
+                image_cache=image_cache, cache_keys=simple_model.image_cache_keys(keys) if image_cache is not None else None
+            )
+
+        source = 'MinIO' if args.minio else f"moto + {args.latency_ms:.0f} ms/GetObject"
+        print(f"{args.images} images JPEG {args.width}x{args.height} ({len(image_bytes) / 1024:.0f} Ko), "
+              f"batch {args.batch_size}, {source}")
+        print(f"{'loader':<14} | " + " | ".join(f"{'époque ' + str(e + 1):>10}" for e in range(args.epochs))
+              + "   (images/s)")
+        try:
+            measure('sequence', make_sequence, args.epochs)
+            measure('tf_data', make_tf_data, args.epochs)
+            if args.image_cache:
+                with tempfile.TemporaryDirectory() as cache_dir:
+                    image_cache = DecodedImageCache(cache_dir, max_bytes=(args.images + 1) * 224 * 224 * 3)
+                    measure('sequence+cache', lambda: make_sequence(image_cache), args.epochs)
+                    measure('tf_data+cache', lambda: make_tf_data(image_cache), args.epochs)
+                    print(f"cache: {image_cache.stats()['image_cache_hit_rate']:.0%} de succès")
+        finally:
+            if args.minio:
+                for key in keys:
+                    s3_client.delete_object(Bucket=BUCKET, Key=key)
+
+
+if __name__ == '__main__':
+    main()
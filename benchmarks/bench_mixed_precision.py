@@ -0,0 +1,156 @@
+"""Benchmark: entraînement et inférence CPU en float32 vs mixed_bfloat16.
+
+Usage:
+    python benchmarks/bench_mixed_precision.py [--images 320] [--batch-size 32] [--epochs 3]
+    python benchmarks/bench_mixed_precision.py --weights backbone.weights.h5   # poids MobileNetV2 locaux
+    python benchmarks/bench_mixed_precision.py --minio          # images de raw-data (MLFLOW_S3_ENDPOINT_URL)
+
+Les deux précisions partent des mêmes poids initiaux et du même découpage
+train / validation (train_test_split, random_state=42 comme l'entraînement),
+et s'entraînent comme train_model_from_minio (mode "full").
+Par défaut les images sont synthétiques: herbe (texture verte) et pissenlit
+(même texture avec une fleur jaune). Pour l'inférence, le modèle entraîné en
+float32 est servi par KerasBackend tel que l'API le construit, avec et sans
+BN repliées, puis en mixed_bfloat16.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.append(os.path.join(ROOT, 'ml', 'models'))
+sys.path.append(os.path.join(ROOT, 'api'))
+
+from sklearn.model_selection import train_test_split
+from tensorflow import keras
+
+from backends import KerasBackend
+from precision import PRECISIONS, with_precision
+
+
+def make_synthetic_dataset(num_images, seed=0):
+    rng = np.random.default_rng(seed)
+    rows, cols = np.mgrid[0:224, 0:224]
+    images = np.empty((num_images, 224, 224, 3), dtype=np.uint8)
+    labels = []
+    for i in range(num_images):
+        image = np.stack([
+            rng.integers(20, 90, (224, 224)),
+            rng.integers(100, 200, (224, 224)),
+            rng.integers(10, 70, (224, 224))
+        ], axis=-1)
+        label = 'dandelion' if i % 2 else 'grass'
+        if label == 'dandelion':
+            y, x, radius = rng.integers(50, 174), rng.integers(50, 174), rng.integers(20, 45)
+            flower = (rows - y) ** 2 + (cols - x) ** 2 < radius ** 2
+            image[flower] = (235, 205, 30)
+        images[i] = image
+        labels.append(label)
+    return images.astype(np.float32) / 255.0, labels
+
+
+def load_minio_dataset(num_images):
+    import simple_model
+
+    s3_client = simple_model.get_s3_client()
+    keys = []
+    for page in s3_client.get_paginator('list_objects_v2').paginate(Bucket='raw-data', Prefix='raw/'):
+        keys.extend(obj['Key'] for obj in page.get('Contents', []) if obj['Key'].split('/')[1] in ('grass', 'dandelion'))
+    keys = list(np.random.default_rng(0).permutation(keys)[:num_images])
+    images, loaded = simple_model.load_images_from_minio(keys)
+    return images, [keys[i].split('/')[1] for i in loaded]
+
+
+class EpochTimer(keras.callbacks.Callback):
+    def __init__(self):
+        super().__init__()
+        self.durations = []
+
+    def on_epoch_begin(self, epoch, logs=None):
+        self._start = time.perf_counter()
+
+    def on_epoch_end(self, epoch, logs=None):
+        self.durations.append(time.perf_counter() - self._start)
+
+
+def train(precision, weights, x_train, y_train, x_val, y_val, batch_size, epochs):
+    from simple_model import create_simple_model, fold_frozen_backbone
+
+    # Même chemin que train_model_from_minio (backbone gelé aux BN repliées en bfloat16)
+    keras.utils.set_random_seed(42)
+    model = create_simple_model(precision=precision, weights=weights)
+    training_model = fold_frozen_backbone(model)
+    training_model.compile(optimizer=keras.optimizers.Adam(learning_rate=0.001),
+                           loss='sparse_categorical_crossentropy', metrics=['accuracy'])
+    timer = EpochTimer()
+    training_model.fit(x_train, y_train, batch_size=batch_size, epochs=epochs, callbacks=[timer], verbose=0)
+    _, accuracy = training_model.evaluate(x_val, y_val, batch_size=batch_size, verbose=0)
+
+    # La première époque inclut le traçage du graphe
+    steady = timer.durations[1:] or timer.durations
+    return with_precision(model, 'float32'), len(x_train) / np.median(steady), accuracy
+
+
+def serving_throughput(backend, images, batch_size, runs):
+    batch = images[:batch_size]
+    for _ in range(2):
+        backend.predict(batch)
+    start = time.perf_counter()
+    for _ in range(runs):
+        backend.predict(batch)
+    return runs * len(batch) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--images', type=int, default=320)
+    parser.add_argument('--batch-size', type=int, default=32)
+    parser.add_argument('--epochs', type=int, default=3)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--weights', default='imagenet', help="imagenet, none ou chemin d'un fichier de poids")
+    parser.add_argument('--minio', action='store_true')
+    args = parser.parse_args()
+    weights = None if args.weights == 'none' else args.weights
+
+    images, labels = load_minio_dataset(args.images) if args.minio else make_synthetic_dataset(args.images)
+    x_train, x_val, train_labels, val_labels = train_test_split(
+        images, labels, test_size=0.2, random_state=42, stratify=labels
+    )
+    y_train = np.array([1 if label == 'dandelion' else 0 for label in train_labels])
+    y_val = np.array([1 if label == 'dandelion' else 0 for label in val_labels])
+    print(f"{len(x_train)} images d'entraînement, {len(x_val)} de validation, batch {args.batch_size}, "
+          f"poids {args.weights}, {'MinIO' if args.minio else 'images synthétiques'}")
+
+    print(f"\n{'entraînement':<24} | {'images/s':>9} | {'précision val':>13}")
+    trained = {}
+    for precision in PRECISIONS:
+        model, rate, accuracy = train(precision, weights, x_train, y_train, x_val, y_val, args.batch_size, args.epochs)
+        trained[precision] = model
+        print(f"{precision:<24} | {rate:>9.1f} | {accuracy:>13.4f}")
+
+    reference_model = trained['float32']
+    variants = [
+        ('float32', reference_model),
+        ('float32 + BN repliées', with_precision(reference_model, 'float32', fold_batch_norm=True)),
+        ('mixed_bfloat16', with_precision(reference_model, 'mixed_bfloat16')),
+        ('mixed_bfloat16 + BN repl.', with_precision(reference_model, 'mixed_bfloat16', fold_batch_norm=True)),
+    ]
+    reference = None
+    print(f"\n{'inférence (modèle float32)':<26} | {'images/s':>9} | {'précision val':>13} | {'max |Δp|':>9}")
+    for name, serving_model in variants:
+        backend = KerasBackend(serving_model, batch_buckets=(args.batch_size,))
+        probabilities = np.concatenate([
+            backend.predict(x_val[start:start + args.batch_size]) for start in range(0, len(x_val), args.batch_size)
+        ])
+        if reference is None:
+            reference = probabilities
+        accuracy = np.mean(np.argmax(probabilities, axis=1) == y_val)
+        rate = serving_throughput(backend, x_val, args.batch_size, args.runs)
+        print(f"{name:<26} | {rate:>9.1f} | {accuracy:>13.4f} | {np.abs(probabilities - reference).max():>9.5f}")
+
+
+if __name__ == '__main__':
+    main()
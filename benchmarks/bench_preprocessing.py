@@ -0,0 +1,132 @@
+"""Benchmark: prétraitement actuel (décodage complet + float64) vs uint8 en mode draft.
+
+Usage:
+    python benchmarks/bench_preprocessing.py [--runs 20] [--batch-size 16]
+
+Chaque chemin est mesuré dans un sous-processus séparé pour que le pic de
+RSS de l'un ne masque pas celui de l'autre. Sous Linux le pic (VmHWM) est
+remis à zéro au démarrage du worker via /proc/self/clear_refs, car
+ru_maxrss hérite de celui du processus parent. Les images sont synthétiques
+(JPEG 12 Mpx, 2 Mpx et 640x480, PNG 2 Mpx).
+"""
+import argparse
+import io
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'ml', 'models'))
+
+from preprocessing import decode_to_uint8, new_batch_buffer, normalize
+
+IMAGES = {
+    'jpeg_4000x3000': ((4000, 3000), 'JPEG'),
+    'jpeg_1600x1200': ((1600, 1200), 'JPEG'),
+    'jpeg_640x480': ((640, 480), 'JPEG'),
+    'png_1600x1200': ((1600, 1200), 'PNG'),
+}
+
+
+def make_image(size, image_format):
+    width, height = size
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[np.newaxis, :, np.newaxis]
+    noise = np.random.default_rng(0).integers(0, 64, (height, width, 3), dtype=np.uint8)
+    pixels = np.minimum(gradient + noise, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, image_format, quality=90)
+    return buffer.getvalue()
+
+
+def current_path(image_bytes_list):
+    """Chemin historique: décodage complet, resize, float64 puis stack"""
+    arrays = []
+    for image_bytes in image_bytes_list:
+        image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
+        image = image.resize((224, 224))
+        arrays.append(np.array(image) / 255.0)
+    return np.array(arrays).astype(np.float32)
+
+
+def draft_path(image_bytes_list):
+    """Nouveau chemin: décodage réduit, uint8 dans un buffer préalloué, normalisation unique"""
+    batch = new_batch_buffer(len(image_bytes_list))
+    for row, image_bytes in enumerate(image_bytes_list):
+        decode_to_uint8(image_bytes, out=batch[row])
+    return normalize(batch)
+
+
+PATHS = {'actuel': current_path, 'draft_uint8': draft_path}
+
+
+def reset_peak_rss():
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_rss_kb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def run_worker(path_name, image_file, runs, batch_size):
+    with open(image_file, 'rb') as f:
+        image_bytes = f.read()
+    batch = [image_bytes] * batch_size
+    fn = PATHS[path_name]
+
+    reset_peak_rss()
+    baseline_kb = peak_rss_kb()
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(batch)
+        timings.append((time.perf_counter() - start) * 1000 / batch_size)
+    peak_kb = peak_rss_kb()
+
+    print(f"{np.median(timings):.3f} {(peak_kb - baseline_kb) / 1024:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=16)
+    parser.add_argument('--worker', nargs=2, metavar=('PATH', 'IMAGE_FILE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.worker[0], args.worker[1], args.runs, args.batch_size)
+        return
+
+    print(f"{'image':<16} | {'chemin':<11} | {'ms/image':>8} | {'pic RSS (Mo)':>12}")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for image_name, (size, image_format) in IMAGES.items():
+            image_file = os.path.join(tmp_dir, image_name)
+            with open(image_file, 'wb') as f:
+                f.write(make_image(size, image_format))
+
+            for path_name in PATHS:
+                output = subprocess.run(
+                    [sys.executable, __file__, '--runs', str(args.runs), '--batch-size', str(args.batch_size),
+                     '--worker', path_name, image_file],
+                    capture_output=True, text=True, check=True
+                ).stdout.split()
+                print(f"{image_name:<16} | {path_name:<11} | {float(output[0]):>8.2f} | {float(output[1]):>12.1f}")
+
+
+if __name__ == '__main__':
+    main()
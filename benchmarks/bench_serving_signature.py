@@ -0,0 +1,75 @@
+"""Benchmark: surcoût par appel de model.predict vs signature de serving compilée.
+
+Usage:
+    python benchmarks/bench_serving_signature.py [--runs 50] [--batch-sizes 1,4,16]
+
+Le modèle a la même architecture que celui de l'API (MobileNetV2 + tête
+dense) avec des poids aléatoires, pour ne dépendre ni de MinIO ni du
+téléchargement des poids ImageNet.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+import tensorflow as tf
+from tensorflow import keras
+
+from backends import KerasBackend
+
+tf.config.set_visible_devices([], 'GPU')
+
+
+def build_model():
+    base_model = keras.applications.MobileNetV2(input_shape=(224, 224, 3), include_top=False, weights=None)
+    return keras.Sequential([
+        keras.Input((224, 224, 3)),
+        base_model,
+        keras.layers.GlobalAveragePooling2D(),
+        keras.layers.Dropout(0.2),
+        keras.layers.Dense(128, activation='relu'),
+        keras.layers.Dropout(0.2),
+        keras.layers.Dense(2, activation='softmax')
+    ])
+
+
+def time_calls(fn, batch, runs):
+    for _ in range(3):
+        fn(batch)
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(batch)
+        timings.append((time.perf_counter() - start) * 1000)
+    return np.median(timings), np.percentile(timings, 99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=50)
+    parser.add_argument('--batch-sizes', default='1,4,16')
+    args = parser.parse_args()
+
+    model = build_model()
+    backend = KerasBackend(model)
+    backend.warmup()
+
+    print(f"{'batch':>5} | {'predict p50':>11} | {'compilé p50':>11} | {'uint8 p50':>9} | {'gain p50':>8} | {'predict p99':>11} | {'compilé p99':>11}")
+    for batch_size in [int(size) for size in args.batch_sizes.split(',')]:
+        images = np.random.randint(0, 255, (batch_size, 224, 224, 3), dtype=np.uint8)
+        floats = images.astype(np.float32) / 255.0
+
+        predict_p50, predict_p99 = time_calls(lambda batch: model.predict(batch, verbose=0), floats, args.runs)
+        compiled_p50, compiled_p99 = time_calls(backend.predict, floats, args.runs)
+        uint8_p50, _ = time_calls(backend.predict, images, args.runs)
+
+        print(f"{batch_size:>5} | {predict_p50:>8.2f} ms | {compiled_p50:>8.2f} ms | {uint8_p50:>6.2f} ms | "
+              f"{predict_p50 - compiled_p50:>5.2f} ms | {predict_p99:>8.2f} ms | {compiled_p99:>8.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,140 @@
+"""Benchmark: pic mémoire par requête /predict à 1, 8 et 32 uploads concurrents.
+
+Usage:
+    python benchmarks/bench_upload_memory.py [--concurrency 1,8,32] [--width 4000 --height 3000]
+
+Compare le handler actuel (`app.predict`: lecture par morceaux, décodage
+unique en mode draft, libération des intermédiaires) à l'ancien chemin
+(lecture complète, ouverture pour les métadonnées, décodage RGB complet puis
+tableau float64). Chaque mesure tourne dans un sous-processus et rapporte:
+- le pic tracemalloc (allocations Python/NumPy),
+- le pic de RSS (VmHWM remis à zéro via /proc/self/clear_refs), qui inclut
+  les buffers de décodage alloués par Pillow hors de tracemalloc.
+Un petit modèle est utilisé pour que l'inférence ne masque pas le coût du
+prétraitement; le cache de prédictions est désactivé.
+"""
+import argparse
+import asyncio
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+
+from bench_preprocessing import make_image, peak_rss_kb, reset_peak_rss
+
+
+def make_upload(image_bytes, index):
+    from starlette.datastructures import Headers, UploadFile
+
+    spooled = tempfile.SpooledTemporaryFile(max_size=1024 * 1024)
+    spooled.write(image_bytes)
+    spooled.seek(0)
+    return UploadFile(
+        file=spooled,
+        size=len(image_bytes),
+        filename=f"upload_{index}.jpg",
+        headers=Headers({"content-type": "image/jpeg"})
+    )
+
+
+async def legacy_predict(api, file):
+    """Ancien handler: lecture complète, métadonnées, décodage complet, float64"""
+    image_bytes = await file.read()
+
+    def info(data):
+        image = Image.open(io.BytesIO(data))
+        return {"format": image.format, "mode": image.mode, "size": image.size}
+
+    def decode(data):
+        return Image.open(io.BytesIO(data)).convert('RGB')
+
+    def preprocess(image):
+        return np.expand_dims(np.array(image.resize((224, 224))) / 255.0, axis=0)
+
+    image_info = await api.inference_executor.run(info, image_bytes)
+    image = await api.inference_executor.run(decode, image_bytes)
+    image_array = await api.inference_executor.run(preprocess, image)
+    prediction, _ = await api.predict_image_array(image_array)
+    return {**prediction, "file_info": {"file_size": len(image_bytes), **image_info}}
+
+
+async def run_scenario(path_name, image_bytes, concurrency):
+    import app as api
+    from tensorflow import keras
+    from backends import KerasBackend
+    from batching import MicroBatcher
+    from model_holder import ServedModel
+
+    model = keras.Sequential([
+        keras.Input((224, 224, 3)),
+        keras.layers.GlobalAveragePooling2D(),
+        keras.layers.Dense(2, activation='softmax')
+    ])
+    backend = KerasBackend(model, batch_buckets=[1, 8, 32])
+    backend.warmup()
+    api.prediction_cache = None
+    api.model_holder.swap(ServedModel(backend, 'benchmark', keras_model=model))
+    api.batcher = MicroBatcher(api.run_model_inference, max_batch_size=32, executor=api.inference_executor)
+    await api.batcher.start()
+
+    handler = api.predict if path_name == 'actuel' else (lambda file: legacy_predict(api, file))
+
+    # Tour de chauffe (pools de threads, allocations paresseuses)
+    await handler(make_upload(image_bytes, -1))
+
+    uploads = [make_upload(image_bytes, i) for i in range(concurrency)]
+    reset_peak_rss()
+    rss_baseline = peak_rss_kb()
+    tracemalloc.start()
+    await asyncio.gather(*(handler(upload) for upload in uploads))
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_peak = peak_rss_kb()
+
+    await api.batcher.stop()
+    return traced_peak / 1024 / 1024, (rss_peak - rss_baseline) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--concurrency', default='1,8,32')
+    parser.add_argument('--width', type=int, default=4000)
+    parser.add_argument('--height', type=int, default=3000)
+    parser.add_argument('--worker', nargs=3, metavar=('PATH', 'IMAGE_FILE', 'N'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        path_name, image_file, concurrency = args.worker
+        with open(image_file, 'rb') as f:
+            image_bytes = f.read()
+        traced, rss = asyncio.run(run_scenario(path_name, image_bytes, int(concurrency)))
+        print(f"{traced:.2f} {rss:.2f}")
+        return
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        image_file = os.path.join(tmp_dir, 'upload.jpg')
+        image_bytes = make_image((args.width, args.height), 'JPEG')
+        with open(image_file, 'wb') as f:
+            f.write(image_bytes)
+
+        print(f"Image: JPEG {args.width}x{args.height}, {len(image_bytes) / 1024 / 1024:.1f} Mo")
+        print(f"{'concurrence':>11} | {'chemin':<7} | {'tracemalloc/req (Mo)':>20} | {'RSS/req (Mo)':>12}")
+        for concurrency in [int(n) for n in args.concurrency.split(',')]:
+            for path_name in ('ancien', 'actuel'):
+                output = subprocess.run(
+                    [sys.executable, __file__, '--worker', path_name, image_file, str(concurrency)],
+                    capture_output=True, text=True, check=True
+                ).stdout.split()
+                traced, rss = float(output[-2]), float(output[-1])
+                print(f"{concurrency:>11} | {path_name:<7} | {traced / concurrency:>20.2f} | {rss / concurrency:>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
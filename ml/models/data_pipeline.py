@@ -0,0 +1,211 @@
+"""Chargement des images d'entraînement avec tf.data.
+
+Remplace les `keras.utils.Sequence` (MinIOImageDataGenerator,
+SimpleImageDataGenerator) qui téléchargent et décodent chaque image en
+série dans `__getitem__`:
+
+    sources -> interleave parallèle (téléchargement) -> décodage/redimension
+    (num_parallel_calls=AUTOTUNE) -> cache des tenseurs uint8 décodés ->
+    shuffle -> batch -> normalisation -> prefetch
+
+Le décodage réutilise `preprocessing.decode_to_uint8` (le même que l'API)
+pour ne pas introduire d'écart entraînement / serving. Les images
+illisibles sont ignorées au lieu d'être remplacées par du bruit.
+
+`make_packed_dataset` lit à la place les shards TFRecord produits à
+l'ingestion (loader "shards", voir dataset_shards.py).
+"""
+import os
+
+import numpy as np
+import tensorflow as tf
+
+from preprocessing import TARGET_SIZE, decode_to_uint8
+from dataset_shards import load_manifest, make_shard_dataset, shards_for_keys
+
+AUTOTUNE = tf.data.AUTOTUNE
+
+# Loaders disponibles pour train_model_from_minio / train_quick_model
+LOADERS = ('tf_data', 'sequence', 'shards')
+
+
+def encode_labels(labels):
+    """Label: 0 = grass, 1 = dandelion"""
+    return np.array([1 if label == 'dandelion' else 0 for label in labels], dtype=np.int64)
+
+
+def make_image_dataset(sources, labels, fetch_fn, batch_size=8, img_size=TARGET_SIZE, shuffle=True,
+                       fetch_parallelism=16, shuffle_buffer=1024, cache=True, cache_path='', seed=None,
+                       image_cache=None, cache_keys=None):
+    """Dataset (images float32 [0, 1], labels int64) à partir de clés ou d'URLs.
+
+    `fetch_fn(source)` renvoie les octets de l'image (str -> bytes) et lève
+    une exception en cas d'échec. `cache_path=''` garde les images décodées
+    en mémoire (224x224x3 uint8 = 150 Ko par image); un chemin de fichier
+    les met en cache sur disque. Le cache est rempli lors de la première
+    époque, les suivantes ne refont ni téléchargement ni décodage.
+
+    `image_cache` (DecodedImageCache) et `cache_keys` (une clé par source)
+    ajoutent le cache local persistant: les images présentes sont lues
+    directement décodées, les autres y sont ajoutées après décodage.
+
+    Avec `seed`, l'ordre des images est reproductible: les téléchargements
+    parallèles sont remis dans l'ordre avant le mélange.
+    """
+    dataset = make_decoded_dataset(
+        sources, labels, fetch_fn, img_size=img_size, deterministic=not shuffle or seed is not None,
+        fetch_parallelism=fetch_parallelism, image_cache=image_cache, cache_keys=cache_keys
+    )
+    return finalize_dataset(
+        dataset, len(sources), batch_size=batch_size, shuffle=shuffle, shuffle_buffer=shuffle_buffer,
+        cache=cache, cache_path=cache_path, seed=seed, threads=fetch_parallelism
+    )
+
+
+def make_decoded_dataset(sources, labels, fetch_fn, img_size=TARGET_SIZE, deterministic=True,
+                         fetch_parallelism=16, image_cache=None, cache_keys=None):
+    """Dataset (image uint8 (H, W, 3), label int64) non batché: téléchargement + décodage"""
+    width, height = img_size
+    if image_cache is None:
+        cache_keys = None
+
+    def fetch(source):
+        source = source.decode('utf-8')
+        try:
+            return fetch_fn(source)
+        except Exception as e:
+            print(f"Erreur chargement image {source}: {e}")
+            return b''
+
+    def decode(data, key):
+        try:
+            image = decode_to_uint8(data, img_size)
+        except Exception as e:
+            print(f"Erreur décodage image: {e}")
+            return np.zeros((height, width, 3), dtype=np.uint8), False
+        if key:
+            try:
+                image_cache.put(key.decode('utf-8'), image)
+            except Exception as e:
+                print(f"⚠️ Erreur écriture cache d'images: {e}")
+        return image, True
+
+    def read_cached(key):
+        image = image_cache.get(key.decode('utf-8'))
+        if image is None:
+            return np.zeros((height, width, 3), dtype=np.uint8), False
+        return image, True
+
+    def fetch_one(source, key, label):
+        data = tf.numpy_function(fetch, [source], tf.string, stateful=False)
+        data.set_shape(())
+        return data, key, label
+
+    def decode_one(data, key, label):
+        image, ok = tf.numpy_function(decode, [data, key], (tf.uint8, tf.bool), stateful=False)
+        image.set_shape((height, width, 3))
+        ok.set_shape(())
+        return image, label, ok
+
+    def read_one(key, label):
+        image, ok = tf.numpy_function(read_cached, [key], (tf.uint8, tf.bool), stateful=False)
+        image.set_shape((height, width, 3))
+        ok.set_shape(())
+        return image, label, ok
+
+    sources = list(sources)
+    encoded_labels = encode_labels(labels)
+    cached_rows = []
+    missing_rows = list(range(len(sources)))
+    if cache_keys is not None:
+        cached_rows, missing_rows = image_cache.split_cached(cache_keys)
+        print(f"🗂️ Cache d'images: {len(cached_rows)}/{len(sources)} images déjà décodées")
+
+    dataset = tf.data.Dataset.from_tensor_slices((
+        tf.constant([sources[i] for i in missing_rows], dtype=tf.string),
+        tf.constant([cache_keys[i] if cache_keys is not None else '' for i in missing_rows], dtype=tf.string),
+        encoded_labels[missing_rows]
+    ))
+
+    # Téléchargements concurrents: boto3/requests relâchent le GIL pendant les I/O
+    dataset = dataset.interleave(
+        lambda source, key, label: tf.data.Dataset.from_tensors((source, key, label)).map(fetch_one),
+        cycle_length=fetch_parallelism,
+        block_length=1,
+        num_parallel_calls=fetch_parallelism,
+        deterministic=deterministic
+    )
+    dataset = dataset.filter(lambda data, key, label: tf.strings.length(data) > 0)
+    dataset = dataset.map(decode_one, num_parallel_calls=AUTOTUNE, deterministic=deterministic)
+
+    if cached_rows:
+        cached = tf.data.Dataset.from_tensor_slices((
+            tf.constant([cache_keys[i] for i in cached_rows], dtype=tf.string), encoded_labels[cached_rows]
+        ))
+        dataset = dataset.concatenate(
+            cached.map(read_one, num_parallel_calls=AUTOTUNE, deterministic=deterministic)
+        )
+
+    dataset = dataset.filter(lambda image, label, ok: ok)
+    dataset = dataset.map(lambda image, label, ok: (image, label))
+    return dataset
+
+
+def finalize_dataset(dataset, num_images, batch_size=8, shuffle=True, shuffle_buffer=1024, cache=True,
+                     cache_path='', seed=None, threads=16):
+    """Cache, shuffle, batch, normalisation et prefetch d'un dataset (image uint8, label)"""
+    if cache:
+        dataset = dataset.cache(cache_path)
+    if shuffle:
+        dataset = dataset.shuffle(min(shuffle_buffer, max(num_images, 1)), seed=seed, reshuffle_each_iteration=True)
+
+    # Normalisation unique par batch, en float32 comme les générateurs
+    dataset = dataset.batch(batch_size)
+    dataset = dataset.map(
+        lambda images, batch_labels: (tf.cast(images, tf.float32) * (1.0 / 255.0), batch_labels),
+        num_parallel_calls=AUTOTUNE
+    )
+    dataset = dataset.prefetch(AUTOTUNE)
+
+    # Le pool de threads par défaut est dimensionné sur le nombre de CPU: trop
+    # petit pour des téléchargements qui attendent le réseau
+    options = tf.data.Options()
+    options.threading.private_threadpool_size = max(threads, os.cpu_count() or 1)
+    return dataset.with_options(options)
+
+
+def make_packed_dataset(sources, labels, fetch_fn, s3_client_fn, batch_size=8, img_size=TARGET_SIZE, shuffle=True,
+                        bucket_name='raw-data', shuffle_buffer=1024, seed=None, fetch_parallelism=16):
+    """Dataset lu en flux depuis les shards TFRecord (voir dataset_shards).
+
+    Seules les images de `sources` sont conservées; celles pas encore
+    empaquetées sont téléchargées une à une comme avec `make_image_dataset`.
+    Pas de cache en mémoire: chaque époque relit les shards séquentiellement.
+    """
+    manifest = load_manifest(s3_client_fn(), bucket_name, img_size)
+    shard_keys, unpacked = shards_for_keys(manifest, sources)
+    packed_count = len(sources) - len(unpacked)
+    print(f"📦 Shards: {packed_count}/{len(sources)} images dans {len(shard_keys)} shards, "
+          f"{len(unpacked)} à télécharger individuellement")
+
+    label_by_source = dict(zip(sources, labels))
+    unpacked_set = set(unpacked)
+    parts = []
+    if shard_keys:
+        parts.append(make_shard_dataset(
+            shard_keys, s3_client_fn, bucket_name, img_size,
+            keep_keys=[source for source in sources if source not in unpacked_set]
+        ))
+    if unpacked or not parts:
+        parts.append(make_decoded_dataset(
+            unpacked, [label_by_source[source] for source in unpacked], fetch_fn,
+            img_size=img_size, deterministic=not shuffle, fetch_parallelism=fetch_parallelism
+        ))
+
+    dataset = parts[0]
+    for part in parts[1:]:
+        dataset = dataset.concatenate(part)
+    return finalize_dataset(
+        dataset, len(sources), batch_size=batch_size, shuffle=shuffle, shuffle_buffer=shuffle_buffer,
+        cache=False, seed=seed, threads=fetch_parallelism
+    )
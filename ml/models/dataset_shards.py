@@ -0,0 +1,246 @@
+"""Shards TFRecord du dataset, écrits à l'ingestion et lus en flux à l'entraînement.
+
+Au lieu de milliers de petits GET (`raw/{label}/{file}`), les images sont
+regroupées, déjà redimensionnées (224x224x3 uint8, pixels identiques à
+`preprocessing.decode_to_uint8`) et étiquetées, dans des shards d'environ
+100 Mo:
+
+    raw-data/packed/224x224/manifest.json
+    raw-data/packed/224x224/shard-<horodatage>-<n>.tfrecord
+
+Le manifest liste les shards et, pour chaque clé S3 empaquetée, son shard:
+un nouvel empaquetage n'écrit que les images absentes du manifest. Les
+objets `raw/` sont considérés immuables (une clé n'est uploadée qu'une
+fois par le DAG d'ingestion).
+
+La lecture ouvre un seul GET par shard et découpe les enregistrements
+TFRecord au fil du flux (les CRC ne sont pas vérifiés: l'intégrité du
+transfert est assurée par TCP/S3).
+"""
+import json
+import os
+import struct
+import tempfile
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import tensorflow as tf
+from botocore.exceptions import ClientError
+
+from preprocessing import TARGET_SIZE, decode_to_uint8
+
+PACKED_PREFIX = 'packed'
+DEFAULT_SHARD_BYTES = 100 * 1024 * 1024
+LABELS = {'grass': 0, 'dandelion': 1}
+
+
+def packed_prefix(img_size=TARGET_SIZE):
+    width, height = img_size
+    return f"{PACKED_PREFIX}/{height}x{width}"
+
+
+def load_manifest(s3_client, bucket_name='raw-data', img_size=TARGET_SIZE):
+    """Manifest des shards (vide si aucun empaquetage n'a encore eu lieu)"""
+    try:
+        response = s3_client.get_object(Bucket=bucket_name, Key=f"{packed_prefix(img_size)}/manifest.json")
+        return json.loads(response['Body'].read())
+    except ClientError as e:
+        if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+            raise
+    width, height = img_size
+    return {"format": "tfrecord", "encoding": "raw_uint8", "image_shape": [height, width, 3],
+            "shards": [], "packed": {}}
+
+
+def save_manifest(s3_client, manifest, bucket_name='raw-data', img_size=TARGET_SIZE):
+    manifest["updated_at"] = datetime.now().isoformat()
+    s3_client.put_object(
+        Bucket=bucket_name,
+        Key=f"{packed_prefix(img_size)}/manifest.json",
+        Body=json.dumps(manifest).encode('utf-8'),
+        ContentType='application/json'
+    )
+
+
+def serialize_example(s3_key, label, image):
+    features = {
+        'image': tf.train.Feature(bytes_list=tf.train.BytesList(value=[image.tobytes()])),
+        'label': tf.train.Feature(int64_list=tf.train.Int64List(value=[LABELS[label]])),
+        's3_key': tf.train.Feature(bytes_list=tf.train.BytesList(value=[s3_key.encode('utf-8')])),
+    }
+    return tf.train.Example(features=tf.train.Features(feature=features)).SerializeToString()
+
+
+def pack_new_images(s3_keys, labels, s3_client, bucket_name='raw-data', img_size=TARGET_SIZE,
+                    shard_bytes=DEFAULT_SHARD_BYTES, fetch_workers=16):
+    """Empaqueter en nouveaux shards les images absentes du manifest.
+
+    Le manifest est réécrit après chaque shard: un empaquetage interrompu
+    conserve les shards déjà publiés. Retourne un résumé de l'opération.
+    """
+    start = time.perf_counter()
+    manifest = load_manifest(s3_client, bucket_name, img_size)
+    pending = [(key, label) for key, label in dict(zip(s3_keys, labels)).items()
+               if key not in manifest["packed"] and label in LABELS]
+
+    print(f"📦 Empaquetage: {len(pending)} nouvelles images "
+          f"({len(manifest['packed'])} déjà dans {len(manifest['shards'])} shards)")
+    if not pending:
+        return {"new_images": 0, "new_shards": [], "total_images": len(manifest["packed"]),
+                "total_shards": len(manifest["shards"])}
+
+    def load(item):
+        s3_key, label = item
+        try:
+            response = s3_client.get_object(Bucket=bucket_name, Key=s3_key)
+            return s3_key, label, decode_to_uint8(response['Body'].read(), img_size)
+        except Exception as e:
+            print(f"⚠️ Image ignorée {s3_key}: {e}")
+            return s3_key, label, None
+
+    # Identifiant unique par empaquetage: deux runs ne réécrivent jamais le même shard
+    batch_id = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    new_shards = []
+    skipped = 0
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        writer, shard_path, shard_size, shard_keys, shard_labels = None, None, 0, [], {}
+
+        def publish():
+            shard_key = f"{packed_prefix(img_size)}/shard-{batch_id}-{len(new_shards):05d}.tfrecord"
+            size = os.path.getsize(shard_path)
+            s3_client.upload_file(shard_path, bucket_name, shard_key)
+            manifest["shards"].append({
+                "key": shard_key,
+                "count": len(shard_keys),
+                "bytes": size,
+                "labels": shard_labels,
+                "created_at": datetime.now().isoformat()
+            })
+            for s3_key in shard_keys:
+                manifest["packed"][s3_key] = shard_key
+            save_manifest(s3_client, manifest, bucket_name, img_size)
+            new_shards.append(shard_key)
+            print(f"✅ Shard publié: s3://{bucket_name}/{shard_key} ({len(shard_keys)} images, {size / 1024 / 1024:.1f} Mo)")
+
+        def loaded_images(executor):
+            # Par paquets: borne le nombre d'images décodées en attente d'écriture
+            chunk = fetch_workers * 8
+            for start_index in range(0, len(pending), chunk):
+                yield from executor.map(load, pending[start_index:start_index + chunk])
+
+        with ThreadPoolExecutor(max_workers=fetch_workers) as executor:
+            for s3_key, label, image in loaded_images(executor):
+                if image is None:
+                    skipped += 1
+                    continue
+                if writer is None:
+                    shard_path = os.path.join(tmp_dir, f"shard-{len(new_shards):05d}.tfrecord")
+                    writer, shard_size, shard_keys, shard_labels = tf.io.TFRecordWriter(shard_path), 0, [], {}
+                record = serialize_example(s3_key, label, image)
+                writer.write(record)
+                # Taille d'un enregistrement: longueur (8) + 2 CRC (4 + 4) + données
+                shard_size += len(record) + 16
+                shard_keys.append(s3_key)
+                shard_labels[label] = shard_labels.get(label, 0) + 1
+
+                if shard_size >= shard_bytes:
+                    writer.close()
+                    publish()
+                    os.unlink(shard_path)
+                    writer = None
+
+        if writer is not None:
+            writer.close()
+            publish()
+
+    summary = {
+        "new_images": len(pending) - skipped,
+        "skipped_images": skipped,
+        "new_shards": new_shards,
+        "total_images": len(manifest["packed"]),
+        "total_shards": len(manifest["shards"]),
+        "duration_seconds": round(time.perf_counter() - start, 1)
+    }
+    print(f"📦 Empaquetage terminé: {summary['new_images']} images dans {len(new_shards)} nouveaux shards "
+          f"({summary['duration_seconds']}s)")
+    return summary
+
+
+def iter_tfrecords(stream, chunk_size=1024 * 1024):
+    """Enregistrements TFRecord d'un flux binaire (format: longueur u64, crc u32, données, crc u32)"""
+    buffer = bytearray()
+    offset = 0
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        buffer += chunk
+        while len(buffer) - offset >= 12:
+            (length,) = struct.unpack_from('<Q', buffer, offset)
+            end = offset + 12 + length + 4
+            if len(buffer) < end:
+                break
+            yield bytes(buffer[offset + 12:offset + 12 + length])
+            offset = end
+        del buffer[:offset]
+        offset = 0
+    if buffer:
+        raise ValueError(f"Shard TFRecord tronqué ({len(buffer)} octets en trop)")
+
+
+def make_shard_dataset(shard_keys, s3_client_fn, bucket_name='raw-data', img_size=TARGET_SIZE,
+                       keep_keys=None, parallel_shards=4):
+    """Dataset (image uint8, label int64) lu en flux depuis les shards.
+
+    `s3_client_fn()` fournit le client S3 du processus courant. Chaque shard
+    est lu séquentiellement (un seul GET); `parallel_shards` shards sont
+    lus en même temps. `keep_keys` restreint aux clés S3 données (découpage
+    train / validation).
+    """
+    width, height = img_size
+
+    def read_shard(shard_key):
+        response = s3_client_fn().get_object(Bucket=bucket_name, Key=shard_key.decode('utf-8'))
+        yield from iter_tfrecords(response['Body'])
+
+    feature_spec = {
+        'image': tf.io.FixedLenFeature([], tf.string),
+        'label': tf.io.FixedLenFeature([], tf.int64),
+        's3_key': tf.io.FixedLenFeature([], tf.string),
+    }
+
+    def parse(record):
+        example = tf.io.parse_single_example(record, feature_spec)
+        image = tf.reshape(tf.io.decode_raw(example['image'], tf.uint8), (height, width, 3))
+        return image, example['label'], example['s3_key']
+
+    dataset = tf.data.Dataset.from_tensor_slices(tf.constant(list(shard_keys), dtype=tf.string))
+    dataset = dataset.interleave(
+        lambda shard_key: tf.data.Dataset.from_generator(
+            read_shard, args=(shard_key,), output_signature=tf.TensorSpec((), tf.string)
+        ),
+        cycle_length=max(1, min(parallel_shards, len(shard_keys))),
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=False
+    )
+    dataset = dataset.map(parse, num_parallel_calls=tf.data.AUTOTUNE)
+
+    if keep_keys is not None:
+        table = tf.lookup.StaticHashTable(
+            tf.lookup.KeyValueTensorInitializer(
+                tf.constant(list(keep_keys), dtype=tf.string),
+                tf.ones(len(keep_keys), dtype=tf.int64)
+            ),
+            default_value=0
+        )
+        dataset = dataset.filter(lambda image, label, s3_key: table.lookup(s3_key) > 0)
+
+    return dataset.map(lambda image, label, s3_key: (image, label))
+
+
+def shards_for_keys(manifest, s3_keys):
+    """(shards contenant au moins une des clés, clés non encore empaquetées)"""
+    packed = manifest["packed"]
+    shard_keys = sorted({packed[key] for key in s3_keys if key in packed})
+    unpacked = [key for key in s3_keys if key not in packed]
+    return shard_keys, unpacked
@@ -0,0 +1,362 @@
+"""Entraînement data-parallèle sur plusieurs workers CPU (MultiWorkerMirroredStrategy).
+
+Chaque worker est un processus configuré par TF_CONFIG (liste des workers
+et index du processus courant):
+
+    TF_CONFIG='{"cluster": {"worker": ["hote-a:12345", "hote-b:12345"]},
+                "task": {"type": "worker", "index": 0}}' \\
+        python distributed.py --spec spec.json
+
+`spec.json` contient les clés S3, les labels et les paramètres
+d'entraînement. `launch_local_workers` lance les N workers sur la machine
+courante (ports locaux libres), ce qui permet de tester sans cluster.
+
+- Le découpage train / validation est celui de `train_model_from_minio`;
+  chaque worker ne télécharge que sa part (une image sur N).
+- Tous les workers partent des mêmes poids (même graine); le mélange et le
+  dropout utilisent une graine propre à chaque worker.
+- Les gradients sont sommés entre workers à chaque pas (anneau
+  collectif); tous les workers font le même nombre de pas par époque.
+- Chaque évaluation parcourt toute la validation depuis le début: les
+  parts sont complétées par des batchs de bourrage masqués pour que tous
+  les workers fassent le même nombre de pas.
+- Seul le worker 0 (chief) écrit dans MLflow et sauvegarde le modèle sur
+  MinIO, avec le même chemin qu'un entraînement mono-processus.
+
+Keras 3 `fit` ne sait pas réduire les batchs et métriques entre workers
+(`strategy.reduce` sur des structures imbriquées): la boucle d'entraînement
+est écrite avec `strategy.run`, avec les mêmes règles d'arrêt anticipé et
+de réduction du learning rate que `train_model_from_minio`.
+"""
+import argparse
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import mlflow
+import numpy as np
+import tensorflow as tf
+from sklearn.model_selection import train_test_split
+from tensorflow import keras
+
+from image_cache import DecodedImageCache
+from precision import resolve_precision
+from simple_model import create_simple_model, fold_frozen_backbone, make_data_loaders, publish_trained_model
+
+# Loaders utilisables en multi-worker (datasets tf.data)
+DISTRIBUTED_LOADERS = ('tf_data', 'shards')
+
+
+def worker_task():
+    """(index du worker, nombre de workers) d'après TF_CONFIG"""
+    config = json.loads(os.getenv('TF_CONFIG') or '{}')
+    workers = config.get('cluster', {}).get('worker', [])
+    return int(config.get('task', {}).get('index', 0)), max(len(workers), 1)
+
+
+def worker_seed(seed, index):
+    return seed + 1000 * index
+
+
+def shard_for_worker(items, labels, index, num_workers):
+    """Part du worker `index`: un élément sur `num_workers`"""
+    return list(items)[index::num_workers], list(labels)[index::num_workers]
+
+
+def steps_per_epoch(num_items, num_workers, batch_size):
+    """Pas par époque, identique pour tous les workers (la plus petite part fixe le rythme)"""
+    return max(1, (num_items // num_workers) // batch_size)
+
+
+def eval_steps(num_items, num_workers, batch_size):
+    """Pas d'évaluation couvrant la plus grande part de validation (les autres sont complétées)"""
+    return max(1, math.ceil(math.ceil(num_items / num_workers) / batch_size))
+
+
+def padded_eval_dataset(dataset, steps, batch_size):
+    """Exactement `steps` batchs (images, labels, masque); les batchs de bourrage ont un masque nul"""
+    images_spec, labels_spec = dataset.element_spec
+    masked = dataset.map(lambda images, batch_labels: (images, batch_labels, tf.ones_like(batch_labels, tf.float32)))
+    padding = tf.data.Dataset.from_tensors((
+        tf.zeros([batch_size, *images_spec.shape[1:]], images_spec.dtype),
+        tf.zeros([batch_size], labels_spec.dtype),
+        tf.zeros([batch_size], tf.float32)
+    )).repeat()
+    return masked.concatenate(padding).take(steps)
+
+
+def unmirrored_copy(model):
+    """Copie aux variables ordinaires, utilisable hors de la stratégie (sauvegarde, export)"""
+    copy = keras.models.clone_model(model)
+    copy.set_weights(model.get_weights())
+    return copy
+
+
+def train_model_distributed(s3_keys, labels, num_epochs=3, loader="tf_data", precision=None, batch_size=8,
+                            seed=42, export_optimized=True):
+    """Entraîne le modèle (mode "full") sur les workers décrits par TF_CONFIG.
+
+    `batch_size` est la taille de batch par worker. Retourne (modèle,
+    précision de validation); seul le chief sauvegarde le modèle.
+    """
+    if loader not in DISTRIBUTED_LOADERS:
+        raise ValueError(f"Loader non distribuable: {loader} (valeurs: {', '.join(DISTRIBUTED_LOADERS)})")
+    precision = resolve_precision(precision, env_var='TRAINING_PRECISION')
+
+    # La stratégie doit être créée avant toute opération TensorFlow du processus
+    strategy = tf.distribute.MultiWorkerMirroredStrategy(
+        communication_options=tf.distribute.experimental.CommunicationOptions(
+            implementation=tf.distribute.experimental.CommunicationImplementation.RING
+        )
+    )
+    index, num_workers = worker_task()
+    is_chief = index == 0
+    global_batch_size = batch_size * strategy.num_replicas_in_sync
+
+    train_keys, val_keys, train_labels, val_labels = train_test_split(
+        s3_keys, labels, test_size=0.2, random_state=42, stratify=labels
+    )
+    worker_train_keys, worker_train_labels = shard_for_worker(train_keys, train_labels, index, num_workers)
+    worker_val_keys, worker_val_labels = shard_for_worker(val_keys, val_labels, index, num_workers)
+    train_steps = steps_per_epoch(len(train_keys), num_workers, batch_size)
+    val_steps = eval_steps(len(val_keys), num_workers, batch_size)
+    print(f"👷 Worker {index}/{num_workers}: {len(worker_train_keys)} images d'entraînement, "
+          f"{len(worker_val_keys)} de validation ({train_steps} pas/époque, batch global {global_batch_size})")
+
+    # Mêmes poids initiaux partout, puis aléas (mélange, dropout) propres au worker
+    keras.utils.set_random_seed(seed)
+    with strategy.scope():
+        model = create_simple_model(precision=precision)
+        training_model = fold_frozen_backbone(model)
+        optimizer = keras.optimizers.Adam(learning_rate=0.001)
+    keras.utils.set_random_seed(worker_seed(seed, index))
+
+    image_cache = DecodedImageCache.from_env() if loader == "tf_data" else None
+    train_data, val_data = make_data_loaders(
+        loader, worker_train_keys, worker_train_labels, worker_val_keys, worker_val_labels,
+        source="minio", batch_size=batch_size, image_cache=image_cache, seed=worker_seed(seed, index)
+    )
+
+    # Chaque worker lit sa propre part: pas de re-découpage automatique par tf.distribute
+    options = tf.data.Options()
+    options.experimental_distribute.auto_shard_policy = tf.data.experimental.AutoShardPolicy.OFF
+
+    def distribute(dataset):
+        dataset = dataset.with_options(options)
+        return iter(strategy.distribute_datasets_from_function(lambda input_context: dataset))
+
+    # Entraînement en flux continu; validation finie, relue en entier à chaque évaluation
+    train_dataset = train_data.repeat()
+    val_dataset = padded_eval_dataset(val_data, val_steps, batch_size)
+
+    def batch_totals(images, batch_labels, training, mask=None):
+        probabilities = training_model(images, training=training)
+        per_example_loss = keras.losses.sparse_categorical_crossentropy(batch_labels, probabilities)
+        correct = tf.cast(tf.equal(tf.argmax(probabilities, axis=1), batch_labels), tf.float32)
+        if mask is None:
+            mask = tf.ones_like(correct)
+        return per_example_loss, tf.stack([
+            tf.reduce_sum(per_example_loss * mask), tf.reduce_sum(correct * mask), tf.reduce_sum(mask)
+        ])
+
+    @tf.function
+    def train_step(iterator):
+        def step(images, batch_labels):
+            with tf.GradientTape() as tape:
+                per_example_loss, totals = batch_totals(images, batch_labels, training=True)
+                loss = tf.nn.compute_average_loss(per_example_loss)
+            gradients = tape.gradient(loss, training_model.trainable_variables)
+            optimizer.apply_gradients(zip(gradients, training_model.trainable_variables))
+            return totals
+        return strategy.reduce("SUM", strategy.run(step, args=next(iterator)), axis=None)
+
+    @tf.function
+    def eval_step(iterator):
+        def step(images, batch_labels, mask):
+            return batch_totals(images, batch_labels, training=False, mask=mask)[1]
+        return strategy.reduce("SUM", strategy.run(step, args=next(iterator)), axis=None)
+
+    @tf.function
+    def barrier():
+        return strategy.reduce("SUM", strategy.run(lambda: tf.constant(1.0)), axis=None)
+
+    def run_epoch(step_fn, iterator, steps):
+        totals = np.zeros(3)
+        for _ in range(steps):
+            totals += step_fn(iterator).numpy()
+        return totals[0] / max(totals[2], 1), totals[1] / max(totals[2], 1)
+
+    def evaluate():
+        return run_epoch(eval_step, distribute(val_dataset), val_steps)
+
+    train_iterator = distribute(train_dataset)
+    history = {'loss': [], 'accuracy': [], 'val_loss': [], 'val_accuracy': []}
+    best_accuracy, best_weights, epochs_without_improvement = -1.0, None, 0
+    best_val_loss, epochs_on_plateau = math.inf, 0
+    learning_rate = 0.001
+    start = time.perf_counter()
+
+    for epoch in range(num_epochs):
+        epoch_start = time.perf_counter()
+        loss, accuracy = run_epoch(train_step, train_iterator, train_steps)
+        val_loss, val_accuracy = evaluate()
+        for name, value in zip(history, (loss, accuracy, val_loss, val_accuracy)):
+            history[name].append(float(value))
+        if is_chief:
+            print(f"Époque {epoch + 1}/{num_epochs}: loss {loss:.4f}, accuracy {accuracy:.4f}, "
+                  f"val_loss {val_loss:.4f}, val_accuracy {val_accuracy:.4f} "
+                  f"({time.perf_counter() - epoch_start:.1f}s)")
+
+        # Métriques réduites entre workers: tous prennent les mêmes décisions
+        if val_loss < best_val_loss:
+            best_val_loss, epochs_on_plateau = val_loss, 0
+        else:
+            epochs_on_plateau += 1
+            if epochs_on_plateau >= 1:
+                learning_rate = max(learning_rate * 0.5, 1e-7)
+                optimizer.learning_rate.assign(learning_rate)
+                epochs_on_plateau = 0
+
+        if val_accuracy > best_accuracy:
+            best_accuracy, best_weights, epochs_without_improvement = val_accuracy, training_model.get_weights(), 0
+        else:
+            epochs_without_improvement += 1
+            if epochs_without_improvement >= 2:
+                break
+
+    if best_weights is not None:
+        training_model.set_weights(best_weights)
+    training_seconds = time.perf_counter() - start
+    val_loss, val_accuracy = evaluate()
+
+    if is_chief:
+        print(f"\nRésultats finaux ({num_workers} workers, {training_seconds:.1f}s):")
+        print(f"Validation Loss: {val_loss:.4f}")
+        print(f"Validation Accuracy: {val_accuracy:.4f}")
+
+        mlflow.set_experiment("plant-classification-minio")
+        with mlflow.start_run():
+            mlflow.log_params({
+                "model_type": "MobileNetV2_TensorFlow",
+                "data_source": "MinIO",
+                "training_mode": "full",
+                "loader": loader,
+                "precision": precision,
+                "distribution": "MultiWorkerMirroredStrategy",
+                "num_workers": num_workers,
+                "num_epochs": num_epochs,
+                "batch_size": batch_size,
+                "global_batch_size": global_batch_size,
+                "learning_rate": 0.001,
+                "train_samples": len(train_keys),
+                "val_samples": len(val_keys),
+                "optimizer": "Adam",
+                "base_model": "MobileNetV2",
+                "seed": seed,
+                "tf_version": tf.__version__
+            })
+            for epoch in range(len(history['loss'])):
+                mlflow.log_metrics({name: values[epoch] for name, values in history.items()}, step=epoch)
+            mlflow.log_metrics({
+                "final_val_loss": val_loss,
+                "final_val_accuracy": val_accuracy,
+                "best_val_accuracy": max(history['val_accuracy']),
+                "training_seconds": round(training_seconds, 1)
+            })
+
+            model, _ = publish_trained_model(
+                unmirrored_copy(model), train_keys, val_keys, val_labels, export_optimized, accuracy=val_accuracy
+            )
+
+    # Les autres workers attendent la fin de la sauvegarde: le service de
+    # coordination signalerait sinon leur sortie comme un crash
+    barrier()
+    return model, val_accuracy
+
+
+def free_ports(count):
+    """Ports TCP libres sur la machine locale"""
+    sockets = []
+    try:
+        for _ in range(count):
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.bind(('localhost', 0))
+            sockets.append(sock)
+        return [sock.getsockname()[1] for sock in sockets]
+    finally:
+        for sock in sockets:
+            sock.close()
+
+
+def launch_local_workers(s3_keys, labels, num_workers=2, timeout=None, **train_kwargs):
+    """Entraîner avec `num_workers` processus sur cette machine; retourne le résultat du chief.
+
+    Les threads TensorFlow de chaque worker sont limités à sa part des cœurs
+    (TF_NUM_INTRAOP_THREADS, sauf s'il est déjà défini).
+    """
+    if train_kwargs.get('loader', 'tf_data') not in DISTRIBUTED_LOADERS:
+        raise ValueError(f"Loader non distribuable: {train_kwargs['loader']} (valeurs: {', '.join(DISTRIBUTED_LOADERS)})")
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        spec_path = os.path.join(tmp_dir, 'spec.json')
+        result_path = os.path.join(tmp_dir, 'result.json')
+        with open(spec_path, 'w') as f:
+            json.dump({"s3_keys": list(s3_keys), "labels": list(labels), **train_kwargs}, f)
+
+        cluster = {"worker": [f"localhost:{port}" for port in free_ports(num_workers)]}
+        threads = max(1, (os.cpu_count() or 1) // num_workers)
+        print(f"🚀 Lancement de {num_workers} workers locaux: {cluster['worker']}")
+
+        processes = []
+        for index in range(num_workers):
+            env = dict(os.environ, TF_CONFIG=json.dumps({"cluster": cluster, "task": {"type": "worker", "index": index}}))
+            env.setdefault('TF_NUM_INTRAOP_THREADS', str(threads))
+            env.setdefault('MLFLOW_TRACKING_URI', mlflow.get_tracking_uri())
+            command = [sys.executable, os.path.abspath(__file__), '--spec', spec_path]
+            if index == 0:
+                command += ['--result', result_path]
+            processes.append(subprocess.Popen(command, env=env))
+
+        # Un worker en échec bloquerait les autres dans les collectives: tout arrêter
+        deadline = time.monotonic() + timeout if timeout else None
+        while any(process.poll() is None for process in processes):
+            failed = [i for i, process in enumerate(processes) if process.poll() not in (None, 0)]
+            if failed or (deadline and time.monotonic() > deadline):
+                for process in processes:
+                    if process.poll() is None:
+                        process.kill()
+                for process in processes:
+                    process.wait()
+                raise RuntimeError(f"Entraînement distribué interrompu (workers en échec: {failed or 'délai dépassé'})")
+            time.sleep(1)
+
+        failed = [i for i, process in enumerate(processes) if process.returncode != 0]
+        if failed:
+            raise RuntimeError(f"Entraînement distribué interrompu (workers en échec: {failed})")
+
+        with open(result_path) as f:
+            return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Worker d'entraînement distribué (TF_CONFIG)")
+    parser.add_argument('--spec', required=True, help="JSON: s3_keys, labels et paramètres d'entraînement")
+    parser.add_argument('--result', help="JSON écrit par le chief: précision de validation")
+    args = parser.parse_args()
+
+    with open(args.spec) as f:
+        spec = json.load(f)
+    _, val_accuracy = train_model_distributed(spec.pop('s3_keys'), spec.pop('labels'), **spec)
+
+    if args.result:
+        with open(args.result, 'w') as f:
+            json.dump({"val_accuracy": float(val_accuracy), "num_workers": worker_task()[1]}, f)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Cache MinIO des embeddings du backbone gelé.
+
+Le backbone MobileNetV2 étant gelé, sa sortie poolée (1280 valeurs par
+image) ne dépend que de l'image et des poids du backbone: elle est calculée
+une seule fois puis réutilisée pour entraîner la tête dense.
+
+Organisation dans le bucket (par défaut `models`):
+
+    embeddings/<backbone_id>/manifest.json         index clé image -> chunk
+    embeddings/<backbone_id>/chunks/<id>.npz       clés + embeddings float16
+
+`backbone_id` est une empreinte de l'architecture et des poids: changer de
+backbone (ou de poids) démarre automatiquement un nouveau cache.
+"""
+import hashlib
+import io
+import json
+from datetime import datetime
+
+import numpy as np
+from botocore.exceptions import ClientError
+
+EMBEDDINGS_PREFIX = 'embeddings'
+
+
+def backbone_fingerprint(backbone):
+    """Identifiant stable d'un backbone Keras: nom + empreinte de la config et des poids"""
+    digest = hashlib.sha256()
+    digest.update(json.dumps(backbone.get_config(), sort_keys=True, default=str).encode('utf-8'))
+    for weight in backbone.weights:
+        digest.update(np.ascontiguousarray(weight.numpy()).tobytes())
+    return f"{backbone.name}-{digest.hexdigest()[:16]}"
+
+
+class EmbeddingStore:
+    """Embeddings versionnés par backbone, stockés par chunks dans MinIO.
+
+    Un seul écrivain à la fois est supposé (l'entraînement Airflow): le
+    manifest est réécrit en entier après chaque ajout de chunk.
+    """
+
+    def __init__(self, backbone_id, s3_client, bucket_name='models'):
+        self.backbone_id = backbone_id
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.base_key = f"{EMBEDDINGS_PREFIX}/{backbone_id}"
+        self._manifest = None
+
+    @property
+    def manifest_key(self):
+        return f"{self.base_key}/manifest.json"
+
+    def load_manifest(self):
+        if self._manifest is None:
+            try:
+                response = self.s3_client.get_object(Bucket=self.bucket_name, Key=self.manifest_key)
+                self._manifest = json.loads(response['Body'].read())
+            except ClientError as e:
+                if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+                    raise
+                self._manifest = {"backbone_id": self.backbone_id, "dim": None, "index": {}, "chunks": []}
+        return self._manifest
+
+    def load(self, image_keys):
+        """Embeddings déjà calculés pour `image_keys`: dict clé -> vecteur float32"""
+        index = self.load_manifest()["index"]
+
+        by_chunk = {}
+        for key in set(image_keys):
+            if key in index:
+                by_chunk.setdefault(index[key], set()).add(key)
+
+        found = {}
+        for chunk_key, wanted in by_chunk.items():
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=chunk_key)
+            with np.load(io.BytesIO(response['Body'].read())) as chunk:
+                for key, embedding in zip(chunk['keys'], chunk['embeddings']):
+                    if key in wanted:
+                        found[str(key)] = embedding.astype(np.float32)
+        return found
+
+    def add(self, image_keys, embeddings):
+        """Ajouter un chunk d'embeddings (stocké en float16) et mettre à jour le manifest"""
+        if len(image_keys) == 0:
+            return None
+
+        manifest = self.load_manifest()
+        chunk_key = f"{self.base_key}/chunks/{datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.npz"
+
+        buffer = io.BytesIO()
+        np.savez_compressed(
+            buffer,
+            keys=np.array(image_keys, dtype=str),
+            embeddings=np.asarray(embeddings, dtype=np.float16)
+        )
+        self.s3_client.put_object(Bucket=self.bucket_name, Key=chunk_key, Body=buffer.getvalue())
+
+        manifest["dim"] = int(np.asarray(embeddings).shape[1])
+        manifest["chunks"].append({"key": chunk_key, "count": len(image_keys), "created_at": datetime.now().isoformat()})
+        for key in image_keys:
+            manifest["index"][key] = chunk_key
+        self.s3_client.put_object(
+            Bucket=self.bucket_name,
+            Key=self.manifest_key,
+            Body=json.dumps(manifest).encode('utf-8'),
+            ContentType='application/json'
+        )
+        return chunk_key
+
+    def get_or_compute(self, image_keys, compute_fn):
+        """Embeddings de `image_keys`, en ne calculant que ceux absents du cache.
+
+        `compute_fn(keys)` renvoie (embeddings, indices chargés) pour les clés
+        manquantes; les images illisibles sont ignorées. Retourne
+        (embeddings float32 dans l'ordre des clés retenues, indices retenus, nb calculés).
+        """
+        found = self.load(image_keys)
+        missing = [key for key in dict.fromkeys(image_keys) if key not in found]
+
+        computed = 0
+        if missing:
+            embeddings, loaded_indices = compute_fn(missing)
+            computed_keys = [missing[i] for i in loaded_indices]
+            self.add(computed_keys, embeddings)
+            for key, embedding in zip(computed_keys, embeddings):
+                found[key] = np.asarray(embedding, dtype=np.float16).astype(np.float32)
+            computed = len(computed_keys)
+
+        kept = [i for i, key in enumerate(image_keys) if key in found]
+        if not kept:
+            return np.zeros((0, self.load_manifest()["dim"] or 0), dtype=np.float32), kept, computed
+        return np.stack([found[image_keys[i]] for i in kept]), kept, computed
@@ -0,0 +1,42 @@
+"""Fine-tuning des derniers blocs du backbone MobileNetV2 (seconde phase d'entraînement).
+
+Après l'entraînement de la tête sur le backbone gelé, les N derniers blocs
+inversés (`block_{17-N}` à `block_16`, puis la convolution `Conv_1`) sont
+dégelés avec un learning rate plus faible. Les BatchNormalization restent
+gelées (mode inférence, statistiques d'ImageNet): recalculées sur des
+batchs de 8 images, elles dégraderaient le modèle.
+
+Le bas du backbone restant gelé, sa sortie (l'entrée du premier bloc
+dégelé) ne dépend que de l'image: elle peut être calculée une seule fois
+puis réutilisée à chaque époque, qui n'exécute plus que les blocs dégelés
+et la tête.
+"""
+import numpy as np
+from tensorflow import keras
+
+MOBILENET_V2_BLOCKS = 16
+FINE_TUNE_LEARNING_RATE = 1e-5
+
+
+def split_backbone(backbone, num_blocks):
+    """(bas gelé, haut à dégeler) du backbone, sous-modèles partageant ses couches.
+
+    Le haut contient les `num_blocks` derniers blocs et la convolution finale;
+    son entrée est la sortie du bloc précédent (aucune connexion résiduelle
+    ne traverse cette frontière).
+    """
+    if not 1 <= num_blocks <= MOBILENET_V2_BLOCKS:
+        raise ValueError(f"Nombre de blocs à dégeler invalide: {num_blocks} (1 à {MOBILENET_V2_BLOCKS})")
+    boundary = backbone.get_layer(f"block_{MOBILENET_V2_BLOCKS + 1 - num_blocks}_expand").input
+    bottom = keras.Model(backbone.input, boundary, name=f"{backbone.name}_bottom")
+    top = keras.Model(boundary, backbone.output, name=f"{backbone.name}_top")
+    return bottom, top
+
+
+def unfreeze_top(backbone, top):
+    """Dégeler les couches de `top` (BatchNormalization exceptées); retourne le nombre de paramètres dégelés"""
+    top_layers = {id(layer) for layer in top.layers}
+    backbone.trainable = True
+    for layer in backbone.layers:
+        layer.trainable = id(layer) in top_layers and not isinstance(layer, keras.layers.BatchNormalization)
+    return int(sum(np.prod(weight.shape) for weight in backbone.trainable_weights))
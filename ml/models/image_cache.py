@@ -0,0 +1,232 @@
+"""Cache disque local des images d'entraînement déjà décodées.
+
+Les images de `raw-data` sont stockées décodées et redimensionnées
+(224x224x3 uint8) dans un fichier mappé en mémoire, partagé entre les
+époques, les runs d'entraînement et les DAGs qui tournent sur le même
+worker:
+
+    <IMAGE_CACHE_DIR>/<H>x<W>/images.u8     slots (capacité, H, W, 3) uint8
+    <IMAGE_CACHE_DIR>/<H>x<W>/slots.bin     par slot: empreinte de la clé + dernier accès
+    <IMAGE_CACHE_DIR>/<H>x<W>/generation    compteur d'écritures
+    <IMAGE_CACHE_DIR>/<H>x<W>/.lock         verrou fcntl des écritures
+
+Une clé est `<clé S3>@<ETag>`: un objet réécrit dans MinIO n'est jamais
+servi depuis une version périmée. L'index empreinte -> slot est
+reconstruit en mémoire depuis slots.bin quand le compteur d'écritures a
+changé. Les écritures (nouveau slot, éviction LRU) sont sérialisées entre
+processus par un verrou fcntl; une lecture revérifie l'empreinte du slot
+après la copie, ce qui la protège d'une éviction concurrente.
+"""
+import fcntl
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from preprocessing import TARGET_SIZE
+
+SLOT_DTYPE = np.dtype([('digest', np.uint8, (16,)), ('last_used', '<f8')])
+
+
+def key_digest(key):
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).digest()
+
+
+def cache_key(s3_key, etag):
+    """Clé de cache d'une image: clé S3 + ETag (sans les guillemets)"""
+    return f"{s3_key}@{(etag or '').strip(chr(34))}"
+
+
+def fetch_etags(s3_client, bucket_name, s3_keys):
+    """ETags des objets voulus via list_objects_v2 (un appel pour 1000 objets
+    par dossier, au lieu d'un HEAD par image)"""
+    wanted = set(s3_keys)
+    prefixes = {key.rsplit('/', 1)[0] + '/' if '/' in key else '' for key in wanted}
+
+    etags = {}
+    paginator = s3_client.get_paginator('list_objects_v2')
+    for prefix in sorted(prefixes):
+        for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix, Delimiter='/'):
+            for obj in page.get('Contents', []):
+                if obj['Key'] in wanted:
+                    etags[obj['Key']] = obj['ETag']
+    return etags
+
+
+class DecodedImageCache:
+    """Images uint8 décodées dans un fichier mappé en mémoire, éviction LRU"""
+
+    def __init__(self, cache_dir, max_bytes=2 * 1024 ** 3, img_size=TARGET_SIZE):
+        width, height = img_size
+        self.img_size = tuple(img_size)
+        self.image_shape = (height, width, 3)
+        self.capacity = max(int(max_bytes) // int(np.prod(self.image_shape)), 1)
+        self.directory = os.path.join(cache_dir, f"{height}x{width}")
+        os.makedirs(self.directory, exist_ok=True)
+
+        self._thread_lock = threading.Lock()
+        self._lock_file = open(os.path.join(self.directory, '.lock'), 'a+')
+        self._slot_by_digest = {}
+        self._generation = None
+
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+
+        with self._exclusive():
+            self._open_arrays()
+
+    @classmethod
+    def from_env(cls, img_size=TARGET_SIZE):
+        """Cache configuré par IMAGE_CACHE_DIR / IMAGE_CACHE_MAX_MB, None si désactivé"""
+        cache_dir = os.getenv('IMAGE_CACHE_DIR', '')
+        if not cache_dir:
+            return None
+        max_mb = int(os.getenv('IMAGE_CACHE_MAX_MB') or 2048)
+        try:
+            return cls(cache_dir, max_bytes=max_mb * 1024 * 1024, img_size=img_size)
+        except OSError as e:
+            print(f"⚠️ Cache d'images désactivé ({cache_dir}): {e}")
+            return None
+
+    def __getstate__(self):
+        # Les fichiers mappés et verrous sont rouverts dans le processus cible
+        return {
+            'cache_dir': os.path.dirname(self.directory),
+            'max_bytes': self.capacity * int(np.prod(self.image_shape)),
+            'img_size': self.img_size
+        }
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+    @contextmanager
+    def _exclusive(self):
+        # flock exclut les autres processus, le verrou local les autres threads
+        with self._thread_lock:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+
+    def _open_arrays(self):
+        """Ouvrir (ou recréer si la capacité a changé) les fichiers mappés"""
+        paths = {
+            'images': (os.path.join(self.directory, 'images.u8'), self.capacity * int(np.prod(self.image_shape))),
+            'slots': (os.path.join(self.directory, 'slots.bin'), self.capacity * SLOT_DTYPE.itemsize),
+            'generation': (os.path.join(self.directory, 'generation'), 8),
+        }
+        compatible = all(os.path.exists(path) and os.path.getsize(path) == size for path, size in paths.values())
+        if not compatible:
+            print(f"🗂️ Initialisation du cache d'images: {self.capacity} images "
+                  f"({paths['images'][1] / 1024 / 1024:.0f} Mo max) dans {self.directory}")
+            # Fichiers creux: l'espace disque n'est consommé qu'à l'écriture
+            for path, size in paths.values():
+                with open(path, 'wb') as f:
+                    f.truncate(size)
+
+        self._images = np.memmap(paths['images'][0], dtype=np.uint8, mode='r+', shape=(self.capacity, *self.image_shape))
+        self._slots = np.memmap(paths['slots'][0], dtype=SLOT_DTYPE, mode='r+', shape=(self.capacity,))
+        self._generation_counter = np.memmap(paths['generation'][0], dtype='<i8', mode='r+', shape=(1,))
+        self._sync()
+
+    def _sync(self):
+        """Reconstruire l'index si un autre processus a écrit depuis la dernière lecture"""
+        generation = int(self._generation_counter[0])
+        if generation != self._generation:
+            digests = np.array(self._slots['digest'])
+            used = np.flatnonzero(digests.any(axis=1))
+            self._slot_by_digest = {digests[slot].tobytes(): int(slot) for slot in used}
+            self._generation = generation
+
+    def __len__(self):
+        self._sync()
+        return len(self._slot_by_digest)
+
+    def _slot_for(self, digest):
+        slot = self._slot_by_digest.get(digest)
+        if slot is not None and self._slots['digest'][slot].tobytes() == digest:
+            return slot
+        return None
+
+    def contains(self, key):
+        self._sync()
+        return self._slot_for(key_digest(key)) is not None
+
+    def split_cached(self, keys):
+        """(indices présents, indices absents) de `keys`; les absents comptent comme des défauts"""
+        self._sync()
+        cached, missing = [], []
+        for i, key in enumerate(keys):
+            (cached if self._slot_for(key_digest(key)) is not None else missing).append(i)
+        self.misses += len(missing)
+        return cached, missing
+
+    def get(self, key, out=None):
+        """Image uint8 (H, W, 3) en cache (copiée dans `out` si fourni), None sinon"""
+        self._sync()
+        digest = key_digest(key)
+        slot = self._slot_for(digest)
+        if slot is not None:
+            if out is None:
+                out = np.empty(self.image_shape, dtype=np.uint8)
+            out[...] = self._images[slot]
+            # Vérifier que le slot n'a pas été réattribué pendant la copie
+            if self._slots['digest'][slot].tobytes() == digest:
+                self._slots['last_used'][slot] = time.time()
+                self.hits += 1
+                return out
+        self.misses += 1
+        return None
+
+    def put(self, key, image):
+        """Stocker une image uint8 (H, W, 3), en évinçant la moins récemment utilisée si plein"""
+        image = np.asarray(image)
+        if image.shape != self.image_shape or image.dtype != np.uint8:
+            raise ValueError(f"Image {image.shape}/{image.dtype} incompatible avec le cache {self.image_shape}/uint8")
+
+        digest = key_digest(key)
+        with self._exclusive():
+            self._sync()
+            if self._slot_for(digest) is not None:
+                return
+
+            # Les slots libres ont last_used = 0: ils sont choisis avant toute éviction
+            slot = int(np.argmin(self._slots['last_used']))
+            previous = self._slots['digest'][slot].tobytes()
+            if any(previous):
+                self._slot_by_digest.pop(previous, None)
+                self.evictions += 1
+
+            # Invalider le slot avant de réécrire les pixels
+            self._slots['digest'][slot] = 0
+            self._images[slot] = image
+            self._slots['digest'][slot] = np.frombuffer(digest, dtype=np.uint8)
+            self._slots['last_used'][slot] = time.time()
+
+            self._generation_counter[0] += 1
+            self._generation = int(self._generation_counter[0])
+            self._slot_by_digest[digest] = slot
+            self.writes += 1
+
+    def flush(self):
+        self._images.flush()
+        self._slots.flush()
+        self._generation_counter.flush()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "image_cache_hits": self.hits,
+            "image_cache_misses": self.misses,
+            "image_cache_hit_rate": self.hits / lookups if lookups else 0.0,
+            "image_cache_writes": self.writes,
+            "image_cache_evictions": self.evictions,
+            "image_cache_entries": len(self),
+            "image_cache_capacity": self.capacity
+        }
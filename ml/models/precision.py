@@ -0,0 +1,197 @@
+"""Politiques de précision Keras (float32 ou mixed_bfloat16) pour l'entraînement et le serving CPU.
+
+Avec "mixed_bfloat16", les calculs des couches se font en bfloat16
+(AMX / AVX512_BF16 des Xeon récents via oneDNN) tandis que les poids
+restent en float32. La couche softmax de sortie reste en float32 pour que
+les probabilités et la loss gardent leur précision. Le bfloat16 ayant la
+même plage d'exposants que le float32, aucun loss scaling n'est nécessaire.
+
+Keras calcule toujours BatchNormalization en float32: dans MobileNetV2
+(une BN après chaque convolution) les conversions bfloat16 <-> float32
+coûtent plus que le gain des convolutions. Pour l'inférence, les BN sont
+donc repliées dans la convolution qui les précède (`fold_batch_norm=True`).
+
+Module partagé à l'identique entre ml/models et api.
+"""
+import os
+from contextlib import contextmanager
+
+import numpy as np
+from tensorflow import keras
+
+PRECISIONS = ('float32', 'mixed_bfloat16')
+
+
+def resolve_precision(precision=None, env_var='MODEL_PRECISION'):
+    """Précision demandée (argument, sinon variable d'environnement, sinon float32)"""
+    precision = (precision or os.getenv(env_var) or 'float32').lower()
+    if precision not in PRECISIONS:
+        raise ValueError(f"Précision inconnue: {precision} (valeurs: {', '.join(PRECISIONS)})")
+    return precision
+
+
+@contextmanager
+def precision_scope(precision):
+    """Politique globale appliquée aux couches construites dans le bloc"""
+    previous = keras.mixed_precision.global_policy()
+    keras.mixed_precision.set_global_policy(precision)
+    try:
+        yield
+    finally:
+        keras.mixed_precision.set_global_policy(previous)
+
+
+def is_softmax_output(layer):
+    return getattr(layer, 'activation', None) is keras.activations.softmax
+
+
+def layer_precision(layer, precision):
+    """Politique d'une couche: la sortie softmax reste toujours en float32"""
+    return 'float32' if is_softmax_output(layer) else precision
+
+
+def nested_models(model):
+    """Le modèle et ses sous-modèles (ex: backbone dans un Sequential), récursivement"""
+    models = [model]
+    for layer in model.layers:
+        if isinstance(layer, keras.Model):
+            models.extend(nested_models(layer))
+    return models
+
+
+def leaf_layers(model):
+    return [layer for submodel in nested_models(model) for layer in submodel.layers
+            if not isinstance(layer, keras.Model)]
+
+
+def model_precision(model):
+    """Politique de calcul du modèle (celle de ses couches à poids hors softmax)"""
+    for layer in leaf_layers(model):
+        if layer.weights and not is_softmax_output(layer):
+            return layer.dtype_policy.name
+    return 'float32'
+
+
+@keras.utils.register_keras_serializable(package='plant_classifier')
+class FoldedBatchNormalization(keras.layers.Layer):
+    """BatchNormalization repliée dans la convolution précédente: identité"""
+
+    def call(self, inputs, training=None, mask=None):
+        return inputs
+
+
+def tensor_sources(value):
+    """Noms des couches productrices des tenseurs sérialisés dans `value` (config Keras 3)"""
+    if isinstance(value, dict):
+        if value.get('class_name') == '__keras_tensor__':
+            return [value['config']['keras_history'][0]]
+        return [name for item in value.values() for name in tensor_sources(item)]
+    if isinstance(value, (list, tuple)):
+        return [name for item in value for name in tensor_sources(item)]
+    return []
+
+
+def layer_graph(model):
+    """(entrées de chaque appel par couche, nombre d'utilisations de chaque sortie) d'un modèle.
+
+    Lu dans la configuration sérialisée (format de sauvegarde public): ordre
+    des couches pour un Sequential, `inbound_nodes` pour un modèle
+    fonctionnel. Un modèle sous-classé n'a pas de graphe: ({}, {}).
+    """
+    if isinstance(model, keras.Sequential):
+        names = [layer.name for layer in model.layers]
+        calls = {name: [[previous]] for previous, name in zip(names, names[1:])}
+        outputs = names[-1:]
+    else:
+        config = model.get_config()
+        if 'layers' not in config:
+            return {}, {}
+        calls = {entry['name']: [tensor_sources(node) for node in entry.get('inbound_nodes', [])]
+                 for entry in config['layers']}
+        output_layers = config.get('output_layers', [])
+        if output_layers and isinstance(output_layers[0], str):
+            output_layers = [output_layers]
+        outputs = [output[0] for output in output_layers]
+
+    uses = {}
+    for name in [source for inputs in calls.values() for call in inputs for source in call] + outputs:
+        uses[name] = uses.get(name, 0) + 1
+    return calls, uses
+
+
+def batch_norm_folds(model):
+    """{nom de convolution: BN qui la suit} pour les paires repliables.
+
+    La convolution, appelée une seule fois, ne doit alimenter que cette BN,
+    et la BN ne recevoir que cette convolution. Un graphe non reconnu n'est
+    simplement pas replié.
+    """
+    folds = {}
+    for submodel in nested_models(model):
+        calls, uses = layer_graph(submodel)
+        layers = {layer.name: layer for layer in submodel.layers}
+        for name, layer in layers.items():
+            if not isinstance(layer, keras.layers.BatchNormalization) or layer.axis not in (-1, 3):
+                continue
+            inputs = calls.get(name, [])
+            if len(inputs) != 1 or len(inputs[0]) != 1:
+                continue
+            conv = layers.get(inputs[0][0])
+            if (isinstance(conv, (keras.layers.Conv2D, keras.layers.DepthwiseConv2D))
+                    and len(calls.get(conv.name, [[]])) == 1 and uses.get(conv.name) == 1):
+                folds[conv.name] = layer
+    return folds
+
+
+def folded_conv_weights(conv, batch_norm):
+    """Noyau et biais de la convolution absorbant la BN (statistiques mobiles)"""
+    variance = batch_norm.moving_variance.numpy()
+    scale = 1.0 / np.sqrt(variance + batch_norm.epsilon)
+    if batch_norm.gamma is not None:
+        scale = scale * batch_norm.gamma.numpy()
+    shift = -batch_norm.moving_mean.numpy() * scale
+    if batch_norm.beta is not None:
+        shift = shift + batch_norm.beta.numpy()
+
+    kernel = conv.kernel.numpy()
+    if isinstance(conv, keras.layers.DepthwiseConv2D):
+        # Noyau (h, w, canaux d'entrée, multiplicateur): canal de sortie = entrée * multiplicateur + m
+        kernel = kernel * scale.reshape(kernel.shape[2], kernel.shape[3])
+    else:
+        kernel = kernel * scale
+    bias = conv.bias.numpy() * scale if conv.use_bias else 0.0
+    return [kernel.astype(np.float32), (bias + shift).astype(np.float32)]
+
+
+def with_precision(model, precision, fold_batch_norm=False):
+    """Copie du modèle (poids float32) calculant avec la politique demandée.
+
+    `fold_batch_norm=True` replie les BN dans les convolutions: la copie
+    n'est alors valable qu'en inférence (statistiques mobiles figées).
+    Le modèle est renvoyé tel quel s'il n'y a rien à changer.
+    """
+    precision = resolve_precision(precision)
+    folds = batch_norm_folds(model) if fold_batch_norm else {}
+    if model_precision(model) == precision and not folds:
+        return model
+
+    folded_names = {batch_norm.name for batch_norm in folds.values()}
+    weights = {layer.name: layer.get_weights() for layer in leaf_layers(model) if layer.weights}
+    for conv_name, batch_norm in folds.items():
+        conv = next(layer for layer in leaf_layers(model) if layer.name == conv_name)
+        weights[conv_name] = folded_conv_weights(conv, batch_norm)
+
+    def clone_layer(layer):
+        if layer.name in folded_names:
+            return FoldedBatchNormalization(name=layer.name, dtype=precision)
+        config = layer.get_config()
+        config['dtype'] = layer_precision(layer, precision)
+        if layer.name in folds:
+            config['use_bias'] = True
+        return layer.__class__.from_config(config)
+
+    clone = keras.models.clone_model(model, clone_function=clone_layer, recursive=True)
+    for layer in leaf_layers(clone):
+        if layer.name in weights and layer.name not in folded_names:
+            layer.set_weights(weights[layer.name])
+    return clone
@@ -0,0 +1,68 @@
+"""Prétraitement des images partagé par l'entraînement et l'API.
+
+Ce module existe en deux exemplaires identiques, ml/models/preprocessing.py
+et api/preprocessing.py (l'image Docker de l'API ne contient que api/):
+toute modification doit être reportée dans les deux fichiers.
+
+Les images restent en uint8 jusqu'à la normalisation, faite une seule fois
+par batch (dans le graphe pour le serving Keras, par `normalize` ailleurs).
+"""
+import io
+
+import numpy as np
+from PIL import Image
+
+TARGET_SIZE = (224, 224)
+
+
+def open_image(image_bytes):
+    """Ouvrir une image sans la décoder (dimensions et format déjà disponibles)"""
+    return Image.open(io.BytesIO(image_bytes))
+
+
+def to_rgb_resized(image, size=TARGET_SIZE):
+    """Image PIL RGB de taille `size` (largeur, hauteur), redimensionnée une seule fois.
+
+    Pour un JPEG pas encore décodé, `draft` demande au décodeur une réduction
+    1/2, 1/4 ou 1/8 qui reste au moins aussi grande que `size`: une photo de
+    12 Mpx n'est jamais décodée en pleine résolution.
+    """
+    if image.format == 'JPEG':
+        image.draft('RGB', size)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    if image.size != tuple(size):
+        image = image.resize(size, reducing_gap=3.0)
+    return image
+
+
+def image_to_uint8(image, size=TARGET_SIZE, out=None):
+    """Tableau uint8 (H, W, 3) d'une image PIL, écrit dans `out` si fourni"""
+    rgb = to_rgb_resized(image, size)
+    if out is None:
+        return np.asarray(rgb, dtype=np.uint8)
+    out[...] = np.asarray(rgb)
+    return out
+
+
+def decode_to_uint8(image_bytes, size=TARGET_SIZE, out=None):
+    """Décoder des octets d'image en tableau uint8 (H, W, 3)"""
+    return image_to_uint8(open_image(image_bytes), size, out)
+
+
+def new_batch_buffer(batch_size, size=TARGET_SIZE, dtype=np.uint8):
+    """Buffer de batch (N, H, W, 3) à remplir image par image"""
+    return np.empty((batch_size, size[1], size[0], 3), dtype=dtype)
+
+
+def normalize(batch):
+    """Entrée float32 dans [0, 1] du modèle à partir d'un batch uint8 (ou déjà normalisé)"""
+    if batch.dtype == np.uint8:
+        return np.multiply(batch, np.float32(1.0 / 255.0), dtype=np.float32)
+    return batch.astype(np.float32, copy=False)
+
+
+def normalize_inplace(batch):
+    """Normaliser sur place un buffer float32 rempli de valeurs [0, 255]"""
+    batch *= np.float32(1.0 / 255.0)
+    return batch
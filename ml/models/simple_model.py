@@ -11,19 +11,69 @@ import os
 import tempfile
 import pickle
 import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, classification_report
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from preprocessing import decode_to_uint8, new_batch_buffer, normalize, normalize_inplace
+from embedding_cache import EmbeddingStore, backbone_fingerprint
+from fine_tuning import FINE_TUNE_LEARNING_RATE, split_backbone, unfreeze_top
+from data_pipeline import LOADERS, make_image_dataset, make_packed_dataset
+from image_cache import DecodedImageCache, cache_key, fetch_etags
+from model_artifacts import load_model_artifact
+from model_registry import ModelRegistry, file_sha256
+from precision import model_precision, precision_scope, resolve_precision, with_precision
+from tflite_export import convert_to_tflite
 from botocore.exceptions import ClientError, NoCredentialsError
 
 # Configuration pour éviter les erreurs GPU
 tf.config.set_visible_devices([], 'GPU')
 
+# Modes d'entraînement: "full" (images -> modèle complet) ou "embeddings" (tête seule sur embeddings en cache)
+TRAINING_MODES = ('full', 'embeddings')
+
+# Formats de sauvegarde des modèles et upload multipart parallèle (parts de 8 Mo)
+MODEL_FORMATS = ('keras', 'h5')
+MODEL_TRANSFER_CONFIG = TransferConfig(
+    multipart_threshold=8 * 1024 * 1024,
+    multipart_chunksize=8 * 1024 * 1024,
+    max_concurrency=8,
+    use_threads=True
+)
+
+# Client S3 partagé par processus (les clients boto3 ne survivent pas à un fork)
+_s3_client = None
+_s3_client_pid = None
+
+def get_s3_client():
+    """Client S3/MinIO réutilisable, avec pool de connexions, créé une fois par processus"""
+    global _s3_client, _s3_client_pid
+    if _s3_client is None or _s3_client_pid != os.getpid():
+        _s3_client = boto3.client(
+            's3',
+            endpoint_url=os.getenv('MLFLOW_S3_ENDPOINT_URL', 'http://minio:9000'),
+            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID', 'minioadmin'),
+            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY', 'minioadmin123'),
+            region_name='us-east-1',
+            config=Config(max_pool_connections=int(os.getenv('S3_MAX_POOL_CONNECTIONS', '32')))
+        )
+        _s3_client_pid = os.getpid()
+    return _s3_client
+
 class MinIOModelManager:
-    """Gestionnaire pour sauvegarder/charger des modèles depuis MinIO"""
+    """Gestionnaire pour sauvegarder/charger des modèles depuis MinIO
+    
+    Les versions sauvegardées sont inscrites dans le registre du bucket
+    (voir model_registry.py); les clés historiques (`_latest`, listage du
+    bucket) ne servent que pour les modèles antérieurs au registre.
+    """
     
-    def __init__(self):
-        self.s3_client = boto3.client(
+    def __init__(self, s3_client=None):
+        self.s3_client = s3_client or boto3.client(
             's3',
             endpoint_url=os.getenv('MLFLOW_S3_ENDPOINT_URL', 'http://minio:9000'),
             aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID', 'minioadmin'),
@@ -31,8 +81,15 @@ class MinIOModelManager:
             region_name='us-east-1'
         )
         self.bucket_name = 'models'
+        self._registries = {}
+        self.last_load = None
         self._ensure_bucket_exists()
     
+    def registry(self, model_name="plant_classifier"):
+        if model_name not in self._registries:
+            self._registries[model_name] = ModelRegistry(self.s3_client, self.bucket_name, model_name)
+        return self._registries[model_name]
+    
     def _ensure_bucket_exists(self):
         """Assurer que le bucket existe"""
         try:
@@ -47,316 +104,999 @@ class MinIOModelManager:
             else:
                 print(f"⚠️ Erreur accès bucket: {e}")
     
-    def save_model_to_minio(self, model, model_name="plant_classifier"):
-        """Sauvegarder un modèle TensorFlow sur MinIO"""
+    def save_model_to_minio(self, model, model_name="plant_classifier", optimized_models=None, model_format=None,
+                            accuracy=None):
+        """Sauvegarder un modèle TensorFlow sur MinIO
+        
+        Le modèle est sérialisé une seule fois au format `model_format` ("keras"
+        ou "h5", défaut: MODEL_SAVE_FORMAT ou "keras") et uploadé en multipart
+        parallèle; la version "latest" est une copie côté serveur. Les durées
+        de chaque étape sont enregistrées dans les métadonnées. La version est
+        ajoutée au registre en dernier, une fois tous ses artefacts publiés.
+        
+        `optimized_models` (voir export_optimized_models) ajoute les variantes
+        TFLite et leurs mesures (précision, latence) aux artefacts publiés.
+        """
+        model_format = (model_format or os.getenv('MODEL_SAVE_FORMAT') or 'keras').lower()
+        if model_format not in MODEL_FORMATS:
+            raise ValueError(f"Format de modèle inconnu: {model_format} (valeurs: {', '.join(MODEL_FORMATS)})")
+        
         saved_keys = []
+        timings = {}
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        s3_key = f"tensorflow/{model_name}_{timestamp}.{model_format}"
+        latest_key = f"tensorflow/{model_name}_latest.{model_format}"
+        optimized_metadata = {}
+        save_start = time.perf_counter()
         
         with tempfile.TemporaryDirectory() as tmp_dir:
-            # Sauvegarder en format .keras
-            try:
-                keras_path = os.path.join(tmp_dir, f"{model_name}.keras")
-                model.save(keras_path)
-                
-                # Upload vers MinIO
-                s3_key = f"tensorflow/{model_name}_{timestamp}.keras"
-                self.s3_client.upload_file(keras_path, self.bucket_name, s3_key)
-                saved_keys.append(s3_key)
-                print(f"✅ Modèle Keras uploadé: s3://{self.bucket_name}/{s3_key}")
-                
-                # Sauvegarder aussi la version "latest"
-                latest_key = f"tensorflow/{model_name}_latest.keras"
-                self.s3_client.upload_file(keras_path, self.bucket_name, latest_key)
-                saved_keys.append(latest_key)
-                print(f"✅ Modèle Keras latest: s3://{self.bucket_name}/{latest_key}")
-                
-            except Exception as e:
-                print(f"⚠️ Erreur sauvegarde Keras: {e}")
+            model_path = os.path.join(tmp_dir, f"{model_name}.{model_format}")
+            start = time.perf_counter()
+            model.save(model_path)
+            timings["serialize_seconds"] = round(time.perf_counter() - start, 3)
+            size_bytes = os.path.getsize(model_path)
+            sha256 = file_sha256(model_path)
             
-            # Sauvegarder en format .h5
+            start = time.perf_counter()
+            self.s3_client.upload_file(model_path, self.bucket_name, s3_key, Config=MODEL_TRANSFER_CONFIG)
+            timings["upload_seconds"] = round(time.perf_counter() - start, 3)
+        saved_keys.append(s3_key)
+        print(f"✅ Modèle {model_format} uploadé: s3://{self.bucket_name}/{s3_key} ({size_bytes / 1024 / 1024:.1f} Mo)")
+        
+        # "latest": copie côté serveur, sans renvoyer le modèle
+        start = time.perf_counter()
+        model_etag = self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)['ETag'].strip('"')
+        latest_etag = self._copy_object(s3_key, latest_key)
+        timings["copy_latest_seconds"] = round(time.perf_counter() - start, 3)
+        saved_keys.append(latest_key)
+        print(f"✅ Modèle latest: s3://{self.bucket_name}/{latest_key}")
+        
+        # Un latest plus ancien dans un autre format serait encore trouvé par les chargeurs
+        for other_format in MODEL_FORMATS:
+            if other_format != model_format:
+                self.s3_client.delete_object(Bucket=self.bucket_name, Key=f"tensorflow/{model_name}_latest.{other_format}")
+        
+        # Sauvegarder les variantes optimisées pour le serving
+        if optimized_models:
             try:
-                h5_path = os.path.join(tmp_dir, f"{model_name}.h5")
-                model.save(h5_path)
-                
-                # Upload vers MinIO
-                s3_key = f"tensorflow/{model_name}_{timestamp}.h5"
-                self.s3_client.upload_file(h5_path, self.bucket_name, s3_key)
-                saved_keys.append(s3_key)
-                print(f"✅ Modèle H5 uploadé: s3://{self.bucket_name}/{s3_key}")
-                
-                # Sauvegarder aussi la version "latest"
-                latest_key = f"tensorflow/{model_name}_latest.h5"
-                self.s3_client.upload_file(h5_path, self.bucket_name, latest_key)
-                saved_keys.append(latest_key)
-                print(f"✅ Modèle H5 latest: s3://{self.bucket_name}/{latest_key}")
-                
+                start = time.perf_counter()
+                optimized_metadata = self._save_optimized_models(
+                    optimized_models, model_name, timestamp, model_etag, latest_etag
+                )
+                timings["optimized_upload_seconds"] = round(time.perf_counter() - start, 3)
+                saved_keys.extend(
+                    key for variant in optimized_metadata.get('variants', {}).values()
+                    for key in (variant['key'], variant['latest_key'])
+                )
             except Exception as e:
-                print(f"⚠️ Erreur sauvegarde H5: {e}")
+                print(f"⚠️ Erreur sauvegarde variantes optimisées: {e}")
+        
+        timings["total_seconds"] = round(time.perf_counter() - save_start, 3)
+        print(f"⏱️ Sauvegarde: sérialisation {timings['serialize_seconds']}s, upload {timings['upload_seconds']}s, "
+              f"copie latest {timings['copy_latest_seconds']}s, total {timings['total_seconds']}s")
+        
+        # Sauvegarder les métadonnées
+        metadata_key = f"tensorflow/{model_name}_{timestamp}_metadata.json"
+        try:
+            metadata = {
+                "model_name": model_name,
+                "timestamp": timestamp,
+                "tf_version": tf.__version__,
+                "model_type": "MobileNetV2",
+                "input_shape": [224, 224, 3],
+                "num_classes": 2,
+                "class_names": {0: "grass", 1: "dandelion"},
+                "format": model_format,
+                "model_key": s3_key,
+                "latest_key": latest_key,
+                "size_bytes": size_bytes,
+                "sha256": sha256,
+                "accuracy": accuracy,
+                "timings": timings
+            }
+            if optimized_metadata:
+                metadata["optimized_models"] = optimized_metadata
             
-            # Sauvegarder les métadonnées
-            try:
-                metadata = {
-                    "model_name": model_name,
-                    "timestamp": timestamp,
-                    "tf_version": tf.__version__,
-                    "model_type": "MobileNetV2",
-                    "input_shape": [224, 224, 3],
-                    "num_classes": 2,
-                    "class_names": {0: "grass", 1: "dandelion"}
-                }
-                
-                metadata_path = os.path.join(tmp_dir, "metadata.json")
-                with open(metadata_path, 'w') as f:
-                    json.dump(metadata, f, indent=2)
-                
-                metadata_key = f"tensorflow/{model_name}_{timestamp}_metadata.json"
-                self.s3_client.upload_file(metadata_path, self.bucket_name, metadata_key)
-                saved_keys.append(metadata_key)
-                print(f"✅ Métadonnées uploadées: s3://{self.bucket_name}/{metadata_key}")
-                
-            except Exception as e:
-                print(f"⚠️ Erreur sauvegarde métadonnées: {e}")
+            self.s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=metadata_key,
+                Body=json.dumps(metadata, indent=2).encode('utf-8'),
+                ContentType='application/json'
+            )
+            saved_keys.append(metadata_key)
+            print(f"✅ Métadonnées uploadées: s3://{self.bucket_name}/{metadata_key}")
+            
+        except Exception as e:
+            print(f"⚠️ Erreur sauvegarde métadonnées: {e}")
         
-        if not saved_keys:
-            raise Exception("❌ Aucune sauvegarde MinIO n'a fonctionné")
+        # Inscription au registre: la version devient visible (et latest)
+        try:
+            self.registry(model_name).append({
+                "version": timestamp,
+                "key": s3_key,
+                "latest_key": latest_key,
+                "format": model_format,
+                "size": size_bytes,
+                "sha256": sha256,
+                "etag": model_etag,
+                "accuracy": None if accuracy is None else float(accuracy),
+                "metadata_key": metadata_key
+            })
+            print(f"✅ Version {timestamp} inscrite au registre: s3://{self.bucket_name}/{self.registry(model_name).key}")
+        except Exception as e:
+            print(f"⚠️ Erreur inscription au registre: {e}")
         
         return saved_keys
     
+    def _copy_object(self, source_key, target_key, metadata=None):
+        """Copie côté serveur dans le bucket des modèles; retourne l'ETag de la copie"""
+        extra_args = {'Metadata': metadata, 'MetadataDirective': 'REPLACE'} if metadata else {}
+        response = self.s3_client.copy_object(
+            Bucket=self.bucket_name,
+            Key=target_key,
+            CopySource={'Bucket': self.bucket_name, 'Key': source_key},
+            **extra_args
+        )
+        return response['CopyObjectResult']['ETag'].strip('"')
+    
+    def _save_optimized_models(self, optimized_models, model_name, timestamp, model_etag, latest_etag):
+        """Uploader les variantes TFLite et retourner leurs métadonnées
+        
+        Chaque variante porte l'ETag du modèle Keras correspondant (horodaté ou
+        latest), ce qui permet à l'API (INFERENCE_BACKEND=tflite) de la
+        réutiliser sans reconversion.
+        """
+        variants = {}
+        for variant, artifact in optimized_models.get('variants', {}).items():
+            s3_key = f"tensorflow/{model_name}_{timestamp}_{variant}.tflite"
+            self.s3_client.put_object(
+                Bucket=self.bucket_name, Key=s3_key, Body=artifact['tflite_model'],
+                Metadata={'source-etag': model_etag, 'quantization': variant}
+            )
+            print(f"✅ Modèle TFLite {variant} uploadé: s3://{self.bucket_name}/{s3_key}")
+            
+            latest_key = f"tensorflow/{model_name}_latest_{variant}.tflite"
+            self._copy_object(s3_key, latest_key, metadata={'source-etag': latest_etag, 'quantization': variant})
+            
+            variants[variant] = {
+                'key': s3_key,
+                'latest_key': latest_key,
+                **{name: value for name, value in artifact.items() if name != 'tflite_model'}
+            }
+        
+        return {'baseline': optimized_models.get('baseline', {}), 'variants': variants}
+    
     def load_model_from_minio(self, model_name="plant_classifier", version="latest"):
-        """Charger un modèle depuis MinIO"""
+        """Charger un modèle depuis MinIO (version du registre, sinon clés historiques)
+        
+        Le modèle est lu en mémoire (voir model_artifacts.py), sans HEAD
+        préalable; les durées de résolution, téléchargement et désérialisation
+        sont conservées dans `last_load`.
+        """
+        load_start = time.perf_counter()
+        candidates = self.model_candidates(model_name, version)
+        resolve_seconds = round(time.perf_counter() - load_start, 3)
         
-        # Essayer différents formats
-        possible_keys = [
+        print(f"🔍 Candidats: {', '.join(candidate['key'] for candidate in candidates)}")
+        model, loaded, timings = load_model_artifact(self.s3_client, self.bucket_name, candidates)
+        if model is None:
+            print("❌ Aucun modèle trouvé dans MinIO")
+            return None
+        
+        self.last_load = {
+            **loaded,
+            'timings': {'resolve_seconds': resolve_seconds, **timings,
+                        'total_seconds': round(time.perf_counter() - load_start, 3)}
+        }
+        print(f"✅ Modèle chargé depuis MinIO: s3://{self.bucket_name}/{loaded['key']} ({self.last_load['timings']})")
+        return model
+    
+    def model_candidates(self, model_name="plant_classifier", version="latest"):
+        """Objets à essayer, par ordre de préférence: entrée du registre (taille, ETag, sha256), puis clés historiques"""
+        candidates = []
+        try:
+            entry = self.registry(model_name).get(version)
+            if entry:
+                candidates.append({name: entry.get(name) for name in ('key', 'size', 'etag', 'sha256')})
+        except Exception as e:
+            entry = None
+            print(f"⚠️ Erreur lecture du registre: {e}")
+        
+        # Clés historiques (modèles antérieurs au registre)
+        keys = [
             f"tensorflow/{model_name}_{version}.keras",
             f"tensorflow/{model_name}_{version}.h5",
             f"tensorflow/{model_name}_latest.keras",
             f"tensorflow/{model_name}_latest.h5"
         ]
         
-        # Lister tous les modèles disponibles si version n'est pas "latest"
-        if version != "latest":
+        # Version inconnue du registre: les 3 modèles les plus récents du bucket
+        if version != "latest" and entry is None:
             try:
-                response = self.s3_client.list_objects_v2(
-                    Bucket=self.bucket_name,
-                    Prefix=f"tensorflow/{model_name}_"
-                )
-                
-                if 'Contents' in response:
-                    # Trier par date de modification (plus récent en premier)
-                    objects = sorted(response['Contents'], key=lambda x: x['LastModified'], reverse=True)
-                    
-                    # Ajouter les modèles les plus récents à la liste
-                    for obj in objects[:3]:  # Prendre les 3 plus récents
-                        key = obj['Key']
-                        if key.endswith(('.keras', '.h5')) and key not in possible_keys:
-                            possible_keys.append(key)
-                            
+                keys += [model_info['key'] for model_info in self.scan_models(model_name)[:3]]
             except Exception as e:
                 print(f"⚠️ Erreur listage modèles: {e}")
         
-        # Essayer de charger chaque modèle
-        for s3_key in possible_keys:
-            try:
-                print(f"🔍 Tentative de chargement: s3://{self.bucket_name}/{s3_key}")
-                
-                # Vérifier si l'objet existe
-                self.s3_client.head_object(Bucket=self.bucket_name, Key=s3_key)
-                
-                # Télécharger dans un fichier temporaire
-                with tempfile.NamedTemporaryFile(suffix='.keras' if s3_key.endswith('.keras') else '.h5', delete=False) as tmp_file:
-                    self.s3_client.download_file(self.bucket_name, s3_key, tmp_file.name)
-                    
-                    # Charger le modèle
-                    model = keras.models.load_model(tmp_file.name)
-                    
-                    # Nettoyer le fichier temporaire
-                    os.unlink(tmp_file.name)
-                    
-                    print(f"✅ Modèle chargé depuis MinIO: s3://{self.bucket_name}/{s3_key}")
-                    return model
-                    
-            except ClientError as e:
-                if e.response['Error']['Code'] == '404':
-                    print(f"⚠️ Modèle non trouvé: s3://{self.bucket_name}/{s3_key}")
-                else:
-                    print(f"⚠️ Erreur accès modèle {s3_key}: {e}")
-            except Exception as e:
-                print(f"⚠️ Erreur chargement modèle {s3_key}: {e}")
+        for s3_key in keys:
+            if all(candidate['key'] != s3_key for candidate in candidates):
+                candidates.append({'key': s3_key})
+        return candidates
+    
+    def scan_models(self, model_name="plant_classifier"):
+        """Modèles trouvés en listant le bucket (toutes les pages), du plus récent au plus ancien"""
+        models = []
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=f"tensorflow/{model_name}_"):
+            for obj in page.get('Contents', []):
+                key = obj['Key']
+                if key.endswith(('.keras', '.h5')):
+                    models.append({
+                        'key': key,
+                        'size': obj['Size'],
+                        'last_modified': obj['LastModified'].isoformat(),
+                        'format': 'keras' if key.endswith('.keras') else 'h5'
+                    })
         
-        print("❌ Aucun modèle trouvé dans MinIO")
-        return None
+        models.sort(key=lambda x: x['last_modified'], reverse=True)
+        return models
     
     def list_models(self, model_name="plant_classifier"):
-        """Lister tous les modèles disponibles"""
+        """Lister tous les modèles disponibles (registre, sinon listage du bucket)"""
         try:
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.bucket_name,
-                Prefix=f"tensorflow/{model_name}_"
-            )
-            
-            if 'Contents' in response:
-                models = []
-                for obj in response['Contents']:
-                    key = obj['Key']
-                    if key.endswith(('.keras', '.h5')):
-                        models.append({
-                            'key': key,
-                            'size': obj['Size'],
-                            'last_modified': obj['LastModified'].isoformat(),
-                            'format': 'keras' if key.endswith('.keras') else 'h5'
-                        })
-                
-                # Trier par date de modification (plus récent en premier)
-                models.sort(key=lambda x: x['last_modified'], reverse=True)
-                return models
-            else:
-                return []
-                
+            versions, total, _ = self.registry(model_name).page()
+            if total:
+                return [{**entry, 'last_modified': entry['created_at']} for entry in versions]
+            return self.scan_models(model_name)
         except Exception as e:
             print(f"⚠️ Erreur listage modèles: {e}")
             return []
 
-class MinIOImageDataGenerator(keras.utils.Sequence):
-    def __init__(self, s3_keys, labels, batch_size=8, img_size=(224, 224), shuffle=True):
-        self.s3_keys = s3_keys
+# Pool de threads partagé pour les téléchargements des générateurs (un par processus)
+_fetch_executor = None
+_fetch_executor_pid = None
+_http_session = None
+_http_session_pid = None
+
+def get_fetch_executor():
+    """Pool de threads partagé par les générateurs pour télécharger les images d'un batch"""
+    global _fetch_executor, _fetch_executor_pid
+    if _fetch_executor is None or _fetch_executor_pid != os.getpid():
+        _fetch_executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv('DATA_FETCH_WORKERS', '16')),
+            thread_name_prefix='image-fetch'
+        )
+        _fetch_executor_pid = os.getpid()
+    return _fetch_executor
+
+def get_http_session():
+    """Session requests réutilisable (connexions keep-alive), créée une fois par processus"""
+    global _http_session, _http_session_pid
+    if _http_session is None or _http_session_pid != os.getpid():
+        import requests
+        _http_session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_maxsize=int(os.getenv('DATA_FETCH_WORKERS', '16')))
+        _http_session.mount('http://', adapter)
+        _http_session.mount('https://', adapter)
+        _http_session_pid = os.getpid()
+    return _http_session
+
+class PrefetchingImageSequence(keras.utils.Sequence):
+    """Base des générateurs d'images: téléchargements concurrents et batchs préchargés.
+    
+    Les images d'un batch sont téléchargées en parallèle sur le pool partagé
+    (get_fetch_executor) et les `prefetch_batches` batchs suivants sont
+    préparés en arrière-plan pendant que le modèle s'entraîne. Les pools et
+    clients sont recréés par processus: le générateur reste utilisable avec
+    `workers>1` et `use_multiprocessing=True` (arguments Keras 3 transmis
+    via `**kwargs`).
+    
+    Avec `image_cache`, les images déjà décodées sont lues depuis le cache
+    local et seules les autres sont téléchargées puis ajoutées au cache.
+    
+    Les sous-classes implémentent `fetch(i)` (octets de l'image i).
+    Les temps de chargement sont mesurés dans le processus qui charge les
+    batchs (le processus principal sauf avec `use_multiprocessing`).
+    """
+    
+    def __init__(self, sources, labels, batch_size=8, img_size=(224, 224), shuffle=True,
+                 prefetch_batches=2, image_cache=None, cache_keys=None, **kwargs):
+        super().__init__(**kwargs)
+        self.sources = sources
         self.labels = labels
+        # Cache local d'images décodées (DecodedImageCache), une clé par source
+        self.image_cache = image_cache
+        self.cache_keys = cache_keys if image_cache is not None else None
         self.batch_size = batch_size
         self.img_size = img_size
         self.shuffle = shuffle
-        self.indices = np.arange(len(self.s3_keys))
+        self.prefetch_batches = prefetch_batches
+        self.indices = np.arange(len(self.sources))
         
-        # Initialiser le client S3/MinIO
-        self.s3_client = boto3.client(
-            's3',
-            endpoint_url=os.getenv('MLFLOW_S3_ENDPOINT_URL', 'http://minio:9000'),
-            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID', 'minioadmin'),
-            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY', 'minioadmin123'),
-            region_name='us-east-1'
-        )
+        # Temps par batch: téléchargement + décodage, et attente effective de l'appelant
+        self.fetch_times = []
+        self.wait_times = []
         
-        self.bucket_name = 'raw-data'
+        self._init_prefetch_state()
         self.on_epoch_end()
     
+    def _init_prefetch_state(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._prefetch_executor = None
+        self._owner_pid = os.getpid()
+    
+    def __getstate__(self):
+        # Les threads, verrous et futures ne traversent pas un fork/pickle
+        state = self.__dict__.copy()
+        for key in ('_lock', '_pending', '_prefetch_executor', '_owner_pid'):
+            state.pop(key, None)
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_prefetch_state()
+    
     def __len__(self):
-        return len(self.s3_keys) // self.batch_size
+        return len(self.sources) // self.batch_size
     
-    def __getitem__(self, index):
-        batch_indices = self.indices[index * self.batch_size:(index + 1) * self.batch_size]
-        batch_images = []
-        batch_labels = []
+    def fetch(self, i):
+        raise NotImplementedError
+    
+    def _get_prefetch_executor(self):
+        if self._prefetch_executor is None:
+            self._prefetch_executor = ThreadPoolExecutor(
+                max_workers=max(self.prefetch_batches, 1), thread_name_prefix='batch-prefetch'
+            )
+        return self._prefetch_executor
+    
+    def _fetch_or_none(self, i):
+        try:
+            return self.fetch(i)
+        except Exception as e:
+            print(f"Erreur chargement image {i} ({self.sources[i]}): {e}")
+            return None
+    
+    def _store_in_cache(self, key, image):
+        try:
+            self.image_cache.put(key, image)
+        except Exception as e:
+            print(f"⚠️ Erreur écriture cache d'images: {e}")
+    
+    def _load_batch(self, batch_indices):
+        start = time.perf_counter()
+        batch_images = new_batch_buffer(len(batch_indices), self.img_size, dtype=np.float32)
+        batch_labels = np.zeros(len(batch_indices), dtype=np.int64)
+        
+        # Images déjà décodées dans le cache local
+        to_fetch = []
+        for row, i in enumerate(batch_indices):
+            if self.cache_keys is not None and self.image_cache.get(self.cache_keys[i], out=batch_images[row]) is not None:
+                batch_labels[row] = 1 if self.labels[i] == 'dandelion' else 0
+            else:
+                to_fetch.append((row, i))
+        
+        # Téléchargement concurrent des autres images du batch
+        contents = get_fetch_executor().map(self._fetch_or_none, [i for _, i in to_fetch])
         
-        for i in batch_indices:
+        for (row, i), image_data in zip(to_fetch, contents):
             try:
-                # Récupérer l'image depuis MinIO
-                s3_key = self.s3_keys[i]
-                
-                # Télécharger l'image depuis MinIO
-                response = self.s3_client.get_object(Bucket=self.bucket_name, Key=s3_key)
-                image_data = response['Body'].read()
-                
-                # Ouvrir l'image
-                image = Image.open(io.BytesIO(image_data)).convert('RGB')
-                
-                # Redimensionner et normaliser
-                image = image.resize(self.img_size)
-                image_array = np.array(image) / 255.0
+                if image_data is None:
+                    raise ValueError("image non téléchargée")
                 
-                batch_images.append(image_array)
+                if self.cache_keys is not None:
+                    image = decode_to_uint8(image_data, self.img_size)
+                    self._store_in_cache(self.cache_keys[i], image)
+                    batch_images[row] = image
+                else:
+                    # Décoder et redimensionner directement dans le buffer du batch
+                    decode_to_uint8(image_data, self.img_size, out=batch_images[row])
                 
                 # Label: 0 = grass, 1 = dandelion
-                label = 1 if self.labels[i] == 'dandelion' else 0
-                batch_labels.append(label)
+                batch_labels[row] = 1 if self.labels[i] == 'dandelion' else 0
                 
             except Exception as e:
-                print(f"Erreur chargement image {i} ({s3_key}): {e}")
+                print(f"Erreur décodage image {i}: {e}")
                 # Image par défaut
-                default_image = np.random.random((*self.img_size, 3))
-                batch_images.append(default_image)
-                batch_labels.append(0)
+                batch_images[row] = np.random.random((*self.img_size, 3)) * 255.0
+                batch_labels[row] = 0
+        
+        # Normalisation unique du batch
+        result = normalize_inplace(batch_images), batch_labels
+        self.fetch_times.append(time.perf_counter() - start)
+        return result
+    
+    def _submit(self, index):
+        """Future du batch `index` (appelé avec le verrou tenu)"""
+        future = self._pending.get(index)
+        if future is None:
+            batch_indices = self.indices[index * self.batch_size:(index + 1) * self.batch_size].copy()
+            future = self._get_prefetch_executor().submit(self._load_batch, batch_indices)
+            self._pending[index] = future
+        return future
+    
+    def __getitem__(self, index):
+        if self._owner_pid != os.getpid():
+            # Processus worker issu d'un fork: repartir d'un état vierge
+            self._init_prefetch_state()
+        with self._lock:
+            future = self._submit(index)
+            for next_index in range(index + 1, min(index + 1 + self.prefetch_batches, len(self))):
+                self._submit(next_index)
         
-        return np.array(batch_images), np.array(batch_labels)
+        start = time.perf_counter()
+        try:
+            return future.result()
+        finally:
+            self.wait_times.append(time.perf_counter() - start)
+            with self._lock:
+                self._pending.pop(index, None)
     
     def on_epoch_end(self):
-        if self.shuffle:
-            np.random.shuffle(self.indices)
+        # Les batchs préchargés correspondent à l'ancien ordre: les abandonner
+        with self._lock:
+            for future in self._pending.values():
+                future.cancel()
+            self._pending.clear()
+            if self.shuffle:
+                np.random.shuffle(self.indices)
+    
+    def pop_timings(self):
+        """(temps de chargement, temps d'attente) des batchs depuis le dernier appel"""
+        fetch_times, wait_times = self.fetch_times, self.wait_times
+        self.fetch_times, self.wait_times = [], []
+        return fetch_times, wait_times
+
+class MinIOImageDataGenerator(PrefetchingImageSequence):
+    def __init__(self, s3_keys, labels, batch_size=8, img_size=(224, 224), shuffle=True,
+                 bucket_name='raw-data', **kwargs):
+        self.bucket_name = bucket_name
+        super().__init__(s3_keys, labels, batch_size, img_size, shuffle, **kwargs)
+    
+    @property
+    def s3_keys(self):
+        return self.sources
+    
+    @property
+    def s3_client(self):
+        # Client partagé du processus (pool de connexions boto3)
+        return get_s3_client()
+    
+    def fetch(self, i):
+        response = self.s3_client.get_object(Bucket=self.bucket_name, Key=self.sources[i])
+        return response['Body'].read()
 
 # Générateur simple pour les URLs (fallback)
-class SimpleImageDataGenerator(keras.utils.Sequence):
-    def __init__(self, image_urls, labels, batch_size=8, img_size=(224, 224), shuffle=True):
-        self.image_urls = image_urls
-        self.labels = labels
-        self.batch_size = batch_size
-        self.img_size = img_size
-        self.shuffle = shuffle
-        self.indices = np.arange(len(self.image_urls))
-        self.on_epoch_end()
+class SimpleImageDataGenerator(PrefetchingImageSequence):
+    def __init__(self, image_urls, labels, batch_size=8, img_size=(224, 224), shuffle=True, **kwargs):
+        super().__init__(image_urls, labels, batch_size, img_size, shuffle, **kwargs)
+    
+    @property
+    def image_urls(self):
+        return self.sources
+    
+    def fetch(self, i):
+        response = get_http_session().get(self.sources[i], timeout=10)
+        response.raise_for_status()
+        return response.content
+
+class LoaderTimingCallback(keras.callbacks.Callback):
+    """Temps de chargement vs calcul par époque pour un générateur préchargé.
+    
+    `data_wait_ms` est le temps où l'entraînement attend réellement les
+    données; `io_bound_ratio` proche de 1 indique que le GPU/CPU est affamé.
+    """
+    
+    def __init__(self, generator):
+        super().__init__()
+        self.generator = generator
+        self._compute_times = []
+        self._batch_start = None
+    
+    def on_epoch_begin(self, epoch, logs=None):
+        self.generator.pop_timings()
+        self._compute_times = []
+    
+    def on_train_batch_begin(self, batch, logs=None):
+        self._batch_start = time.perf_counter()
+    
+    def on_train_batch_end(self, batch, logs=None):
+        if self._batch_start is not None:
+            self._compute_times.append(time.perf_counter() - self._batch_start)
+    
+    def on_epoch_end(self, epoch, logs=None):
+        fetch_times, wait_times = self.generator.pop_timings()
+        if not self._compute_times:
+            return
         
-    def __len__(self):
-        return len(self.image_urls) // self.batch_size
+        compute_s = float(np.sum(self._compute_times))
+        wait_s = float(np.sum(wait_times))
+        metrics = {
+            "data_fetch_ms_per_batch": 1000 * float(np.mean(fetch_times)) if fetch_times else 0.0,
+            "data_wait_ms_per_batch": 1000 * wait_s / len(self._compute_times),
+            "compute_ms_per_batch": 1000 * compute_s / len(self._compute_times),
+            "io_bound_ratio": wait_s / (wait_s + compute_s) if wait_s + compute_s > 0 else 0.0
+        }
+        print(f"⏱️ Époque {epoch + 1}: chargement {metrics['data_fetch_ms_per_batch']:.0f} ms/batch, "
+              f"attente {metrics['data_wait_ms_per_batch']:.0f} ms/batch, "
+              f"calcul {metrics['compute_ms_per_batch']:.0f} ms/batch "
+              f"(I/O-bound à {metrics['io_bound_ratio']:.0%})")
+        if mlflow.active_run() is not None:
+            mlflow.log_metrics(metrics, step=epoch)
+
+def fetch_minio_image(s3_key, bucket_name='raw-data'):
+    """Octets d'une image MinIO (client partagé du processus)"""
+    response = get_s3_client().get_object(Bucket=bucket_name, Key=s3_key)
+    return response['Body'].read()
+
+def fetch_url_image(image_url):
+    """Octets d'une image téléchargée par URL (session partagée du processus)"""
+    response = get_http_session().get(image_url, timeout=10)
+    response.raise_for_status()
+    return response.content
+
+def image_cache_keys(s3_keys, bucket_name='raw-data'):
+    """Clés du cache d'images décodées (clé S3 + ETag courant dans MinIO)"""
+    etags = fetch_etags(get_s3_client(), bucket_name, s3_keys)
+    return [cache_key(s3_key, etags.get(s3_key)) for s3_key in s3_keys]
+
+def make_data_loaders(loader, train_sources, train_labels, val_sources, val_labels, source="minio", batch_size=8,
+                      image_cache=None, seed=None):
+    """Données d'entraînement et de validation selon `loader` ("tf_data", "shards" ou "sequence")
     
-    def __getitem__(self, index):
-        batch_indices = self.indices[index * self.batch_size:(index + 1) * self.batch_size]
-        batch_images = []
-        batch_labels = []
+    `image_cache` (DecodedImageCache) n'est utilisé que pour les images MinIO
+    lues une à une, dont l'ETag permet de détecter une réécriture. `seed`
+    fixe le mélange des datasets tf.data.
+    """
+    if loader not in LOADERS:
+        raise ValueError(f"Loader inconnu: {loader} (valeurs: {', '.join(LOADERS)})")
+    
+    train_cache_keys = val_cache_keys = None
+    if image_cache is not None and source == "minio":
+        try:
+            train_cache_keys = image_cache_keys(train_sources)
+            val_cache_keys = image_cache_keys(val_sources)
+        except Exception as e:
+            print(f"⚠️ ETags indisponibles, cache d'images ignoré: {e}")
+            image_cache = None
+    else:
+        image_cache = None
+    
+    if loader == "shards":
+        if source != "minio":
+            raise ValueError("Le loader 'shards' ne s'applique qu'aux images MinIO")
+        return (
+            make_packed_dataset(train_sources, train_labels, fetch_minio_image, get_s3_client,
+                                batch_size=batch_size, shuffle=True, seed=seed),
+            make_packed_dataset(val_sources, val_labels, fetch_minio_image, get_s3_client,
+                                batch_size=batch_size, shuffle=False)
+        )
+    
+    if loader == "tf_data":
+        fetch_fn = fetch_minio_image if source == "minio" else fetch_url_image
+        return (
+            make_image_dataset(train_sources, train_labels, fetch_fn, batch_size=batch_size, shuffle=True,
+                               image_cache=image_cache, cache_keys=train_cache_keys, seed=seed),
+            make_image_dataset(val_sources, val_labels, fetch_fn, batch_size=batch_size, shuffle=False,
+                               image_cache=image_cache, cache_keys=val_cache_keys)
+        )
+    
+    generator_class = MinIOImageDataGenerator if source == "minio" else SimpleImageDataGenerator
+    return (
+        generator_class(train_sources, train_labels, batch_size=batch_size, shuffle=True,
+                        image_cache=image_cache, cache_keys=train_cache_keys),
+        generator_class(val_sources, val_labels, batch_size=batch_size, shuffle=False,
+                        image_cache=image_cache, cache_keys=val_cache_keys)
+    )
+
+def create_simple_model(input_shape=(224, 224, 3), num_classes=2, precision="float32", weights='imagenet'):
+    """Crée un modèle simple avec MobileNetV2
+    
+    precision="mixed_bfloat16": calculs en bfloat16, poids et softmax en float32.
+    """
+    with precision_scope(resolve_precision(precision)):
+        # Base model avec MobileNetV2
+        base_model = keras.applications.MobileNetV2(
+            input_shape=input_shape,
+            include_top=False,
+            weights=weights
+        )
         
-        for i in batch_indices:
-            try:
-                # Télécharger l'image
-                import requests
-                response = requests.get(self.image_urls[i], timeout=10)
-                image = Image.open(io.BytesIO(response.content)).convert('RGB')
-                
-                # Redimensionner et normaliser
-                image = image.resize(self.img_size)
-                image_array = np.array(image) / 255.0
-                
-                batch_images.append(image_array)
-                
-                # Label: 0 = grass, 1 = dandelion
-                label = 1 if self.labels[i] == 'dandelion' else 0
-                batch_labels.append(label)
-                
-            except Exception as e:
-                print(f"Erreur chargement image {i}: {e}")
-                # Image par défaut
-                default_image = np.random.random((*self.img_size, 3))
-                batch_images.append(default_image)
-                batch_labels.append(0)
+        # Geler les couches de base
+        base_model.trainable = False
         
-        return np.array(batch_images), np.array(batch_labels)
+        # Ajouter les couches personnalisées (sortie softmax en float32)
+        # Entrée explicite: sinon Sequential la crée dans la précision de calcul
+        model = keras.Sequential([
+            keras.Input(input_shape),
+            base_model,
+            keras.layers.GlobalAveragePooling2D(),
+            keras.layers.Dropout(0.2),
+            keras.layers.Dense(128, activation='relu'),
+            keras.layers.Dropout(0.2),
+            keras.layers.Dense(num_classes, activation='softmax', dtype='float32')
+        ])
     
-    def on_epoch_end(self):
-        if self.shuffle:
-            np.random.shuffle(self.indices)
+    return model
 
-def create_simple_model(input_shape=(224, 224, 3), num_classes=2):
-    """Crée un modèle simple avec MobileNetV2"""
+def split_simple_model(model):
+    """Séparer le modèle en extracteur (backbone + pooling) et tête dense.
+    
+    Les deux sous-modèles partagent les couches du modèle complet: entraîner
+    la tête met directement à jour le modèle à sauvegarder.
+    """
+    input_shape = tuple(model.layers[0].input.shape[1:])
+    if not model.built:
+        model.build((None, *input_shape))
+    
+    feature_extractor = keras.Sequential([keras.Input(input_shape), *model.layers[:2]])
+    head = keras.Sequential([keras.Input((feature_extractor.output_shape[-1],)), *model.layers[2:]])
+    return feature_extractor, head
+
+def fold_frozen_backbone(model):
+    """Modèle d'entraînement mixed_bfloat16: backbone gelé aux BN repliées, tête partagée.
+    
+    Les couches de la tête sont celles de `model`: l'entraîner met directement
+    à jour le modèle à sauvegarder. Un modèle float32 (ou au backbone
+    entraînable) est renvoyé tel quel.
+    """
+    precision = model_precision(model)
+    if precision == "float32" or model.layers[0].trainable:
+        return model
     
-    # Base model avec MobileNetV2
-    base_model = keras.applications.MobileNetV2(
-        input_shape=input_shape,
-        include_top=False,
-        weights='imagenet'
+    input_shape = tuple(model.layers[0].input.shape[1:])
+    if not model.built:
+        model.build((None, *input_shape))
+    backbone = with_precision(model.layers[0], precision, fold_batch_norm=True)
+    backbone.trainable = False
+    return keras.Sequential([keras.Input(input_shape), backbone, *model.layers[1:]])
+
+def compute_embeddings(feature_extractor, s3_keys, batch_size=32):
+    """Embeddings du backbone pour des images MinIO: (float32 (N, D), indices chargés)"""
+    parts = []
+    loaded_indices = []
+    for start in range(0, len(s3_keys), batch_size):
+        images, loaded = load_images_from_minio(s3_keys[start:start + batch_size])
+        if len(images) == 0:
+            continue
+        parts.append(tf.cast(feature_extractor(images, training=False), tf.float32).numpy())
+        loaded_indices.extend(start + i for i in loaded)
+    
+    if not parts:
+        return np.zeros((0, *feature_extractor.output_shape[1:]), dtype=np.float32), loaded_indices
+    return np.concatenate(parts), loaded_indices
+
+def load_or_compute_embeddings(feature_extractor, s3_keys, bucket_name='models'):
+    """Étape d'extraction: n'exécute le backbone que pour les images absentes du cache MinIO"""
+    backbone_id = backbone_fingerprint(feature_extractor.layers[0])
+    store = EmbeddingStore(backbone_id, get_s3_client(), bucket_name)
+    
+    # En bfloat16, le backbone gelé s'exécute avec ses BN repliées dans les convolutions
+    precision = model_precision(feature_extractor)
+    if precision != "float32":
+        feature_extractor = with_precision(feature_extractor, precision, fold_batch_norm=True)
+    
+    start = time.perf_counter()
+    embeddings, kept, computed = store.get_or_compute(
+        s3_keys, lambda keys: compute_embeddings(feature_extractor, keys)
+    )
+    print(f"Embeddings {backbone_id}: {len(kept)} images, {computed} calculées, "
+          f"{len(kept) - computed} en cache ({time.perf_counter() - start:.1f}s)")
+    return embeddings, kept, {"backbone_id": backbone_id, "computed": computed, "cached": len(kept) - computed}
+
+def fit_head_on_embeddings(model, train_keys, train_labels, val_keys, val_labels, num_epochs, callbacks, batch_size=32):
+    """Entraîner uniquement la tête dense sur les embeddings en cache du backbone gelé"""
+    feature_extractor, head = split_simple_model(model)
+    head.compile(
+        optimizer=keras.optimizers.Adam(learning_rate=0.001),
+        loss='sparse_categorical_crossentropy',
+        metrics=['accuracy']
     )
     
-    # Geler les couches de base
-    base_model.trainable = False
+    train_embeddings, train_kept, train_stats = load_or_compute_embeddings(feature_extractor, train_keys)
+    val_embeddings, val_kept, val_stats = load_or_compute_embeddings(feature_extractor, val_keys)
+    y_train = np.array([1 if train_labels[i] == 'dandelion' else 0 for i in train_kept])
+    y_val = np.array([1 if val_labels[i] == 'dandelion' else 0 for i in val_kept])
     
-    # Ajouter les couches personnalisées
-    model = keras.Sequential([
-        base_model,
-        keras.layers.GlobalAveragePooling2D(),
-        keras.layers.Dropout(0.2),
-        keras.layers.Dense(128, activation='relu'),
-        keras.layers.Dropout(0.2),
-        keras.layers.Dense(num_classes, activation='softmax')
-    ])
+    start = time.perf_counter()
+    history = head.fit(
+        train_embeddings, y_train,
+        validation_data=(val_embeddings, y_val),
+        epochs=num_epochs,
+        batch_size=batch_size,
+        shuffle=True,
+        callbacks=callbacks,
+        verbose=1
+    )
+    head_fit_seconds = time.perf_counter() - start
     
-    return model
+    val_loss, val_accuracy = head.evaluate(val_embeddings, y_val, verbose=0)
+    
+    return history, val_loss, val_accuracy, {
+        "embedding_backbone": train_stats["backbone_id"],
+        "embeddings_computed": train_stats["computed"] + val_stats["computed"],
+        "embeddings_cached": train_stats["cached"] + val_stats["cached"],
+        "head_fit_seconds": round(head_fit_seconds, 2)
+    }
+
+def fine_tune_top_blocks(model, train_keys, train_labels, val_keys, val_labels, num_blocks, num_epochs,
+                         learning_rate=FINE_TUNE_LEARNING_RATE, cache_activations=True, loader="tf_data",
+                         image_cache=None, batch_size=8):
+    """Seconde phase: entraîner les `num_blocks` derniers blocs du backbone (BN gelées) et la tête.
+    
+    Avec `cache_activations`, le bas gelé du backbone n'est exécuté qu'une fois
+    par image (activations gardées en mémoire en float16); sinon chaque
+    époque relit les images et exécute le backbone complet.
+    Retourne (history, val_loss, val_accuracy, statistiques de coût).
+    """
+    backbone = model.layers[0]
+    bottom, top = split_backbone(backbone, num_blocks)
+    stats = {"fine_tune_trainable_params": unfreeze_top(backbone, top)}
+    callbacks = [
+        keras.callbacks.EarlyStopping(monitor='val_accuracy', patience=2, restore_best_weights=True),
+        keras.callbacks.ReduceLROnPlateau(monitor='val_loss', factor=0.5, patience=1, min_lr=1e-8)
+    ]
+    start = time.perf_counter()
+    
+    if cache_activations:
+        # Bas du backbone gelé: BN repliées, une seule exécution par image
+        extractor = with_precision(bottom, model_precision(model), fold_batch_norm=True)
+        train_activations, train_kept = compute_embeddings(extractor, train_keys, batch_size=32)
+        val_activations, val_kept = compute_embeddings(extractor, val_keys, batch_size=32)
+        train_activations, val_activations = train_activations.astype(np.float16), val_activations.astype(np.float16)
+        y_train = np.array([1 if train_labels[i] == 'dandelion' else 0 for i in train_kept])
+        y_val = np.array([1 if val_labels[i] == 'dandelion' else 0 for i in val_kept])
+        stats["fine_tune_activation_seconds"] = round(time.perf_counter() - start, 2)
+        stats["fine_tune_activation_mb"] = round((train_activations.nbytes + val_activations.nbytes) / 1024 / 1024, 1)
+        print(f"🧊 Activations du bas du backbone {train_activations.shape[1:]}: {len(train_kept) + len(val_kept)} images, "
+              f"{stats['fine_tune_activation_mb']} Mo ({stats['fine_tune_activation_seconds']}s)")
+        
+        # Couches partagées avec `model`: l'entraînement met directement à jour le modèle à sauvegarder
+        training_model = keras.Sequential([keras.Input(train_activations.shape[1:]), top, *model.layers[1:]])
+        train_data = tf.data.Dataset.from_tensor_slices((train_activations, y_train)).shuffle(
+            max(len(y_train), 1), reshuffle_each_iteration=True
+        ).batch(batch_size)
+        val_data = tf.data.Dataset.from_tensor_slices((val_activations, y_val)).batch(batch_size)
+    else:
+        training_model = model
+        train_data, val_data = make_data_loaders(
+            loader, train_keys, train_labels, val_keys, val_labels, source="minio", batch_size=batch_size,
+            image_cache=image_cache
+        )
+    
+    training_model.compile(
+        optimizer=keras.optimizers.Adam(learning_rate=learning_rate),
+        loss='sparse_categorical_crossentropy',
+        metrics=['accuracy']
+    )
+    history = training_model.fit(train_data, validation_data=val_data, epochs=num_epochs, callbacks=callbacks, verbose=1)
+    val_loss, val_accuracy = training_model.evaluate(val_data, verbose=0)
+    
+    stats["fine_tune_seconds"] = round(time.perf_counter() - start, 2)
+    backbone.trainable = False
+    return history, val_loss, val_accuracy, stats
+
+def load_images_from_minio(s3_keys, img_size=(224, 224), bucket_name='raw-data'):
+    """Charger et prétraiter une liste d'images depuis MinIO (images illisibles ignorées)"""
+    s3_client = get_s3_client()
+    
+    images = new_batch_buffer(len(s3_keys), img_size, dtype=np.float32)
+    loaded_indices = []
+    for i, s3_key in enumerate(s3_keys):
+        try:
+            response = s3_client.get_object(Bucket=bucket_name, Key=s3_key)
+            decode_to_uint8(response['Body'].read(), img_size, out=images[len(loaded_indices)])
+            loaded_indices.append(i)
+        except Exception as e:
+            print(f"Erreur chargement image {s3_key}: {e}")
+    
+    return normalize_inplace(images[:len(loaded_indices)]), loaded_indices
+
+def make_tflite_predictor(tflite_model):
+    """Fonction de prédiction image par image sur un interpréteur TFLite unique"""
+    interpreter = tf.lite.Interpreter(model_content=tflite_model)
+    interpreter.allocate_tensors()
+    input_detail = interpreter.get_input_details()[0]
+    output_detail = interpreter.get_output_details()[0]
+    
+    def predict(images):
+        predictions = []
+        for image in images:
+            interpreter.set_tensor(input_detail['index'], np.expand_dims(image, axis=0).astype(np.float32))
+            interpreter.invoke()
+            predictions.append(interpreter.get_tensor(output_detail['index'])[0].copy())
+        return np.array(predictions)
+    
+    return predict
+
+def measure_latency_ms(predict_fn, image, num_runs=20, warmup_runs=3):
+    """Latence médiane (ms) d'une prédiction sur une seule image"""
+    for _ in range(warmup_runs):
+        predict_fn(image)
+    
+    timings = []
+    for _ in range(num_runs):
+        start = time.perf_counter()
+        predict_fn(image)
+        timings.append((time.perf_counter() - start) * 1000)
+    return float(np.median(timings))
+
+def export_optimized_models(model, calibration_keys, val_keys, val_labels,
+                            variants=('float16', 'int8'), max_calibration_images=100):
+    """Produire les variantes TFLite du modèle et mesurer leur coût/précision
+    
+    La calibration int8 utilise un échantillon des images d'entraînement du
+    bucket raw-data. Chaque variante est évaluée sur le jeu de validation:
+    écart de précision par rapport au modèle Keras et latence CPU sur une image.
+    """
+    calibration_images, _ = load_images_from_minio(list(calibration_keys)[:max_calibration_images])
+    val_images, loaded_indices = load_images_from_minio(val_keys)
+    if len(val_images) == 0:
+        raise ValueError("Aucune image de validation disponible pour évaluer les variantes")
+    
+    y_true = np.array([1 if val_labels[i] == 'dandelion' else 0 for i in loaded_indices])
+    sample = val_images[:1]
+    
+    keras_accuracy = accuracy_score(y_true, np.argmax(model.predict(val_images, verbose=0), axis=1))
+    keras_latency = measure_latency_ms(lambda image: model.predict(image, verbose=0), sample)
+    
+    optimized = {
+        'baseline': {
+            'format': 'keras',
+            'accuracy': float(keras_accuracy),
+            'latency_ms': round(keras_latency, 3)
+        },
+        'variants': {}
+    }
+    
+    for variant in variants:
+        try:
+            tflite_model = convert_to_tflite(model, variant, calibration_images)
+            predict_tflite = make_tflite_predictor(tflite_model)
+            accuracy = accuracy_score(y_true, np.argmax(predict_tflite(val_images), axis=1))
+            latency = measure_latency_ms(predict_tflite, sample)
+            
+            optimized['variants'][variant] = {
+                'tflite_model': tflite_model,
+                'size_bytes': len(tflite_model),
+                'accuracy': float(accuracy),
+                'accuracy_delta': float(accuracy - keras_accuracy),
+                'latency_ms': round(latency, 3),
+                'calibration_images': len(calibration_images) if variant == 'int8' else 0
+            }
+            print(f"✅ Variante {variant}: précision {accuracy:.4f} "
+                  f"(Δ {accuracy - keras_accuracy:+.4f}), latence {latency:.2f} ms")
+        except Exception as e:
+            print(f"⚠️ Erreur export variante {variant}: {e}")
+    
+    return optimized
+
+def log_optimized_models_to_mlflow(optimized):
+    """Enregistrer les mesures des variantes optimisées dans le run MLflow actif"""
+    metrics = {"keras_latency_ms": optimized['baseline']['latency_ms']}
+    for variant, artifact in optimized['variants'].items():
+        metrics[f"tflite_{variant}_accuracy"] = artifact['accuracy']
+        metrics[f"tflite_{variant}_accuracy_delta"] = artifact['accuracy_delta']
+        metrics[f"tflite_{variant}_latency_ms"] = artifact['latency_ms']
+        metrics[f"tflite_{variant}_size_bytes"] = artifact['size_bytes']
+    mlflow.log_metrics(metrics)
+
+def publish_trained_model(model, train_keys, val_keys, val_labels, export_optimized=True, accuracy=None):
+    """Exporter les variantes, sauvegarder sur MinIO et enregistrer dans le run MLflow actif.
+    
+    Retourne (modèle float32, clés MinIO sauvegardées).
+    """
+    # Artefacts toujours en float32 (mêmes poids): conversion TFLite et choix de précision côté API
+    model = with_precision(model, "float32")
+    
+    # Variantes optimisées pour le serving (TFLite float16 / int8)
+    optimized_models = None
+    if export_optimized:
+        try:
+            optimized_models = export_optimized_models(model, train_keys, val_keys, val_labels)
+            log_optimized_models_to_mlflow(optimized_models)
+        except Exception as e:
+            print(f"⚠️ Erreur export des variantes optimisées: {e}")
+    
+    # Sauvegarder le modèle sur MinIO
+    minio_manager = MinIOModelManager()
+    try:
+        saved_keys = minio_manager.save_model_to_minio(
+            model, "plant_classifier", optimized_models=optimized_models, accuracy=accuracy
+        )
+        print(f"✅ Modèle sauvegardé sur MinIO: {saved_keys}")
+    except Exception as e:
+        print(f"❌ Erreur sauvegarde MinIO: {e}")
+        saved_keys = []
+    
+    # Log du modèle dans MLflow
+    try:
+        mlflow.tensorflow.log_model(
+            model,
+            "model",
+            registered_model_name="plant-classifier-minio"
+        )
+        print("✅ Modèle enregistré dans MLflow")
+    except Exception as e:
+        print(f"⚠️ Erreur enregistrement MLflow: {e}")
+    
+    print(f"Modèle sauvegardé sur MinIO avec les clés: {saved_keys}")
+    return model, saved_keys
 
-def train_model_from_minio(s3_keys, labels, num_epochs=3):
-    """Entraîne le modèle avec les données depuis MinIO"""
-    print(f"Entraînement avec {len(s3_keys)} images depuis MinIO")
+def fine_tune_phase(model, train_keys, train_labels, val_keys, val_labels, num_blocks, num_epochs,
+                    cache_activations, loader, val_loss, val_accuracy, training_seconds):
+    """Seconde phase de `train_model_from_minio`: coût et gain loggés dans le run MLflow actif.
+    
+    Retourne (val_loss, val_accuracy) du modèle conservé.
+    """
+    print(f"\n🔓 Fine-tuning des {num_blocks} derniers blocs du backbone "
+          f"({'activations en cache' if cache_activations else 'backbone complet'})")
+    mlflow.log_params({
+        "fine_tune_epochs": num_epochs,
+        "fine_tune_learning_rate": FINE_TUNE_LEARNING_RATE,
+        "fine_tune_activation_cache": cache_activations
+    })
+    
+    first_phase_weights = model.get_weights()
+    image_cache = DecodedImageCache.from_env() if not cache_activations and loader != "shards" else None
+    history, tuned_loss, tuned_accuracy, stats = fine_tune_top_blocks(
+        model, train_keys, train_labels, val_keys, val_labels, num_blocks, num_epochs,
+        cache_activations=cache_activations, loader=loader, image_cache=image_cache
+    )
+    
+    # Conservé seulement s'il améliore la précision (à précision égale, la loss)
+    kept = (tuned_accuracy, -tuned_loss) > (val_accuracy, -val_loss)
+    stats.update({
+        "fine_tune_val_loss": tuned_loss,
+        "fine_tune_val_accuracy": tuned_accuracy,
+        "fine_tune_val_accuracy_gain": tuned_accuracy - val_accuracy,
+        "fine_tune_val_loss_gain": val_loss - tuned_loss,
+        "fine_tune_cost_ratio": round(stats["fine_tune_seconds"] / max(training_seconds, 1e-6), 2),
+        "fine_tune_epochs_run": len(history.history['loss']),
+        "fine_tune_kept": int(kept)
+    })
+    mlflow.log_metrics(stats)
+    print(f"🔓 Fine-tuning: précision {val_accuracy:.4f} -> {tuned_accuracy:.4f} "
+          f"({stats['fine_tune_seconds']}s, x{stats['fine_tune_cost_ratio']} le temps de la première phase)")
+    
+    if kept:
+        return tuned_loss, tuned_accuracy
+    print("↩️ Fine-tuning sans gain: poids de la première phase conservés")
+    model.set_weights(first_phase_weights)
+    return val_loss, val_accuracy
+
+def train_model_from_minio(s3_keys, labels, num_epochs=3, export_optimized=True, training_mode="full",
+                           loader="tf_data", precision=None, fine_tune_blocks=None, fine_tune_epochs=None,
+                           cache_activations=None):
+    """Entraîne le modèle avec les données depuis MinIO
+    
+    loader="tf_data" (défaut): pipeline tf.data à téléchargements parallèles
+    et images décodées en cache; loader="shards": lecture en flux des shards
+    TFRecord empaquetés à l'ingestion; loader="sequence": générateur historique.
+    
+    training_mode="embeddings": le backbone gelé n'est exécuté qu'une fois par
+    image (embeddings en cache dans MinIO) et seule la tête dense est entraînée;
+    le modèle complet sauvegardé est identique au mode "full".
+    
+    precision="mixed_bfloat16" (ou TRAINING_PRECISION): calculs en bfloat16,
+    le modèle sauvegardé reste en float32 (l'API choisit sa propre précision).
+    
+    fine_tune_blocks=N (ou FINE_TUNE_BLOCKS): seconde phase dégelant les N
+    derniers blocs du backbone (voir fine_tuning.py), sur les activations en
+    cache du bas du backbone sauf cache_activations=False (ou
+    FINE_TUNE_ACTIVATION_CACHE=false). Son coût et son gain sont loggés dans
+    MLflow; les poids de la première phase sont conservés si elle n'améliore
+    pas la précision de validation.
+    """
+    if training_mode not in TRAINING_MODES:
+        raise ValueError(f"Mode d'entraînement inconnu: {training_mode} (valeurs: {', '.join(TRAINING_MODES)})")
+    precision = resolve_precision(precision, env_var='TRAINING_PRECISION')
+    if fine_tune_blocks is None:
+        fine_tune_blocks = int(os.getenv('FINE_TUNE_BLOCKS', '0'))
+    if cache_activations is None:
+        cache_activations = os.getenv('FINE_TUNE_ACTIVATION_CACHE', 'true').lower() in ('1', 'true', 'yes')
+    fine_tune_epochs = fine_tune_epochs or num_epochs
+    
+    print(f"Entraînement avec {len(s3_keys)} images depuis MinIO (mode {training_mode}, précision {precision})")
     
     # Diviser les données
     train_keys, val_keys, train_labels, val_labels = train_test_split(
@@ -365,19 +1105,13 @@ def train_model_from_minio(s3_keys, labels, num_epochs=3):
     
     print(f"Train: {len(train_keys)}, Val: {len(val_keys)}")
     
-    # Créer les générateurs
-    train_generator = MinIOImageDataGenerator(
-        train_keys, train_labels, batch_size=8, shuffle=True
-    )
-    val_generator = MinIOImageDataGenerator(
-        val_keys, val_labels, batch_size=8, shuffle=False
-    )
-    
     # Créer le modèle
-    model = create_simple_model()
+    model = create_simple_model(precision=precision)
+    # En bfloat16, le backbone gelé est exécuté avec ses BN repliées (tête partagée avec `model`)
+    training_model = fold_frozen_backbone(model)
     
     # Compiler le modèle
-    model.compile(
+    training_model.compile(
         optimizer=keras.optimizers.Adam(learning_rate=0.001),
         loss='sparse_categorical_crossentropy',
         metrics=['accuracy']
@@ -394,13 +1128,17 @@ def train_model_from_minio(s3_keys, labels, num_epochs=3):
         mlflow.log_params({
             "model_type": "MobileNetV2_TensorFlow",
             "data_source": "MinIO",
+            "training_mode": training_mode,
+            "loader": loader,
+            "precision": precision,
             "num_epochs": num_epochs,
-            "batch_size": 8,
+            "batch_size": 32 if training_mode == "embeddings" else 8,
             "learning_rate": 0.001,
             "train_samples": len(train_keys),
             "val_samples": len(val_keys),
             "optimizer": "Adam",
             "base_model": "MobileNetV2",
+            "fine_tune_blocks": fine_tune_blocks,
             "tf_version": tf.__version__
         })
         
@@ -419,17 +1157,50 @@ def train_model_from_minio(s3_keys, labels, num_epochs=3):
             )
         ]
         
-        # Entraînement
-        history = model.fit(
-            train_generator,
-            validation_data=val_generator,
-            epochs=num_epochs,
-            callbacks=callbacks,
-            verbose=1
-        )
+        phase_start = time.perf_counter()
+        if training_mode == "embeddings":
+            # Entraînement de la tête seule sur les embeddings en cache
+            history, val_loss, val_accuracy, embedding_stats = fit_head_on_embeddings(
+                model, train_keys, train_labels, val_keys, val_labels, num_epochs, callbacks
+            )
+            mlflow.log_param("embedding_backbone", embedding_stats.pop("embedding_backbone"))
+            mlflow.log_metrics(embedding_stats)
+        else:
+            # Créer les données d'entraînement et de validation (cache local d'images si IMAGE_CACHE_DIR)
+            image_cache = DecodedImageCache.from_env() if loader != "shards" else None
+            train_generator, val_generator = make_data_loaders(
+                loader, train_keys, train_labels, val_keys, val_labels, source="minio", image_cache=image_cache
+            )
+            if loader == "sequence":
+                callbacks.append(LoaderTimingCallback(train_generator))
+            
+            # Entraînement
+            history = training_model.fit(
+                train_generator,
+                validation_data=val_generator,
+                epochs=num_epochs,
+                callbacks=callbacks,
+                verbose=1
+            )
+            
+            # Évaluation finale
+            val_loss, val_accuracy = training_model.evaluate(val_generator, verbose=0)
+            
+            if image_cache is not None:
+                image_cache.flush()
+                cache_stats = image_cache.stats()
+                print(f"🗂️ Cache d'images: {cache_stats['image_cache_hit_rate']:.0%} de succès "
+                      f"({cache_stats['image_cache_hits']} hits, {cache_stats['image_cache_misses']} défauts, "
+                      f"{cache_stats['image_cache_evictions']} évictions)")
+                mlflow.log_metrics(cache_stats)
         
-        # Évaluation finale
-        val_loss, val_accuracy = model.evaluate(val_generator, verbose=0)
+        training_seconds = time.perf_counter() - phase_start
+        
+        if fine_tune_blocks:
+            val_loss, val_accuracy = fine_tune_phase(
+                model, train_keys, train_labels, val_keys, val_labels, fine_tune_blocks, fine_tune_epochs,
+                cache_activations, loader, val_loss, val_accuracy, training_seconds
+            )
         
         print(f"\nRésultats finaux:")
         print(f"Validation Loss: {val_loss:.4f}")
@@ -439,34 +1210,18 @@ def train_model_from_minio(s3_keys, labels, num_epochs=3):
         mlflow.log_metrics({
             "final_val_loss": val_loss,
             "final_val_accuracy": val_accuracy,
-            "best_val_accuracy": max(history.history['val_accuracy'])
+            "best_val_accuracy": max(history.history['val_accuracy']),
+            "training_seconds": round(training_seconds, 2)
         })
         
-        # Sauvegarder le modèle sur MinIO
-        minio_manager = MinIOModelManager()
-        try:
-            saved_keys = minio_manager.save_model_to_minio(model, "plant_classifier")
-            print(f"✅ Modèle sauvegardé sur MinIO: {saved_keys}")
-        except Exception as e:
-            print(f"❌ Erreur sauvegarde MinIO: {e}")
-            saved_keys = []
-        
-        # Log du modèle dans MLflow
-        try:
-            mlflow.tensorflow.log_model(
-                model,
-                "model",
-                registered_model_name="plant-classifier-minio"
-            )
-            print("✅ Modèle enregistré dans MLflow")
-        except Exception as e:
-            print(f"⚠️ Erreur enregistrement MLflow: {e}")
-        
-        print(f"Modèle sauvegardé sur MinIO avec les clés: {saved_keys}")
+        # Export, sauvegarde MinIO et enregistrement MLflow
+        model, saved_keys = publish_trained_model(
+            model, train_keys, val_keys, val_labels, export_optimized, accuracy=val_accuracy
+        )
         
         return model, val_accuracy
 
-def train_quick_model(image_urls, labels, num_epochs=3):
+def train_quick_model(image_urls, labels, num_epochs=3, loader="tf_data"):
     """Entraîne le modèle avec des URLs (fallback)"""
     print(f"Entraînement avec {len(image_urls)} images depuis URLs")
     
@@ -477,12 +1232,9 @@ def train_quick_model(image_urls, labels, num_epochs=3):
     
     print(f"Train: {len(train_urls)}, Val: {len(val_urls)}")
     
-    # Créer les générateurs
-    train_generator = SimpleImageDataGenerator(
-        train_urls, train_labels, batch_size=8, shuffle=True
-    )
-    val_generator = SimpleImageDataGenerator(
-        val_urls, val_labels, batch_size=8, shuffle=False
+    # Créer les données d'entraînement et de validation
+    train_generator, val_generator = make_data_loaders(
+        loader, train_urls, train_labels, val_urls, val_labels, source="url"
     )
     
     # Créer le modèle
@@ -506,6 +1258,7 @@ def train_quick_model(image_urls, labels, num_epochs=3):
         mlflow.log_params({
             "model_type": "MobileNetV2_TensorFlow",
             "data_source": "URLs",
+            "loader": loader,
             "num_epochs": num_epochs,
             "batch_size": 8,
             "learning_rate": 0.001,
@@ -530,6 +1283,8 @@ def train_quick_model(image_urls, labels, num_epochs=3):
                 min_lr=1e-7
             )
         ]
+        if loader == "sequence":
+            callbacks.append(LoaderTimingCallback(train_generator))
         
         # Entraînement
         history = model.fit(
@@ -557,7 +1312,7 @@ def train_quick_model(image_urls, labels, num_epochs=3):
         # Sauvegarder le modèle sur MinIO
         minio_manager = MinIOModelManager()
         try:
-            saved_keys = minio_manager.save_model_to_minio(model, "plant_classifier")
+            saved_keys = minio_manager.save_model_to_minio(model, "plant_classifier", accuracy=val_accuracy)
             print(f"✅ Modèle sauvegardé sur MinIO: {saved_keys}")
         except Exception as e:
             print(f"❌ Erreur sauvegarde MinIO: {e}")
@@ -587,26 +1342,12 @@ def load_model_for_prediction(model_name="plant_classifier", version="latest"):
 def predict_image_from_minio(model, s3_key):
     """Fait une prédiction sur une image depuis MinIO"""
     try:
-        # Initialiser le client S3/MinIO
-        s3_client = boto3.client(
-            's3',
-            endpoint_url=os.getenv('MLFLOW_S3_ENDPOINT_URL', 'http://minio:9000'),
-            aws_access_key_id=os.getenv('AWS_ACCESS_KEY_ID', 'minioadmin'),
-            aws_secret_access_key=os.getenv('AWS_SECRET_ACCESS_KEY', 'minioadmin123'),
-            region_name='us-east-1'
-        )
-        
-        # Télécharger l'image depuis MinIO
-        response = s3_client.get_object(Bucket='raw-data', Key=s3_key)
+        # Télécharger l'image depuis MinIO (client partagé entre les appels)
+        response = get_s3_client().get_object(Bucket='raw-data', Key=s3_key)
         image_data = response['Body'].read()
         
-        # Ouvrir l'image
-        image = Image.open(io.BytesIO(image_data)).convert('RGB')
-        
         # Preprocessing
-        image = image.resize((224, 224))
-        image_array = np.array(image) / 255.0
-        image_array = np.expand_dims(image_array, axis=0)
+        image_array = normalize(decode_to_uint8(image_data)[np.newaxis])
         
         # Prédiction
         predictions = model.predict(image_array, verbose=0)
@@ -637,12 +1378,8 @@ def predict_image_from_url(model, image_url):
         response = requests.get(image_url, timeout=10)
         response.raise_for_status()
         
-        image = Image.open(io.BytesIO(response.content)).convert('RGB')
-        
         # Preprocessing
-        image = image.resize((224, 224))
-        image_array = np.array(image) / 255.0
-        image_array = np.expand_dims(image_array, axis=0)
+        image_array = normalize(decode_to_uint8(response.content)[np.newaxis])
         
         # Prédiction
         predictions = model.predict(image_array, verbose=0)
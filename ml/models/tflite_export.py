@@ -0,0 +1,43 @@
+"""Conversion des modèles Keras en flatbuffers TFLite quantifiés.
+
+Utilisée à l'entraînement (variantes float16 / int8 évaluées et exportées)
+et au serving (backend tflite). Les images de calibration int8 sont
+acceptées en uint8 [0, 255] ou déjà normalisées en float32 [0, 1].
+
+Module partagé à l'identique entre ml/models et api.
+"""
+import numpy as np
+import tensorflow as tf
+
+from preprocessing import normalize
+
+TFLITE_QUANTIZATIONS = ('dynamic', 'float16', 'int8')
+
+
+def convert_to_tflite(model, quantization, representative_images=None):
+    """Convertir un modèle Keras en flatbuffer TFLite quantifié.
+
+    - dynamic: poids int8, activations float (aucune donnée nécessaire)
+    - float16: poids float16
+    - int8: poids et activations int8, calibrés sur `representative_images`
+    """
+    if quantization not in TFLITE_QUANTIZATIONS:
+        raise ValueError(f"Quantification inconnue: {quantization} (valeurs: {', '.join(TFLITE_QUANTIZATIONS)})")
+
+    converter = tf.lite.TFLiteConverter.from_keras_model(model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+
+    if quantization == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    elif quantization == 'int8':
+        if representative_images is None or len(representative_images) == 0:
+            raise ValueError("La quantification int8 nécessite des images de calibration")
+
+        def representative_dataset():
+            for image in representative_images:
+                yield [normalize(np.expand_dims(image, axis=0))]
+
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+
+    return converter.convert()
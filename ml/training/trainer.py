@@ -36,7 +36,7 @@ def get_model_info_safe(minio_manager, model_name="plant_classifier"):
         }
 
 # Modifier les fonctions pour utiliser get_model_info_safe
-def train_from_s3_keys(s3_keys, labels, num_epochs=3):
+def train_from_s3_keys(s3_keys, labels, num_epochs=3, loader="tf_data"):
     """Entraîne le modèle avec des clés S3 spécifiques"""
     
     print(f"🎯 Entraînement avec {len(s3_keys)} images spécifiques depuis MinIO")
@@ -45,7 +45,7 @@ def train_from_s3_keys(s3_keys, labels, num_epochs=3):
     mlflow.set_tracking_uri(os.getenv('MLFLOW_TRACKING_URI', 'http://mlflow:5000'))
     
     # Entraîner le modèle
-    model, accuracy = train_model_from_minio(s3_keys, labels, num_epochs=num_epochs)
+    model, accuracy = train_model_from_minio(s3_keys, labels, num_epochs=num_epochs, loader=loader)
     
     # Obtenir les informations du modèle sauvegardé
     minio_manager = MinIOModelManager()
@@ -59,8 +59,18 @@ def train_from_s3_keys(s3_keys, labels, num_epochs=3):
         'storage': 'MinIO'
     }
 
-def train_from_database_minio(num_epochs=3):
-    """Entraîne le modèle avec les données de la base"""
+def train_from_database_minio(num_epochs=3, training_mode="full", loader="tf_data", num_workers=None,
+                              precision=None, fine_tune_blocks=None):
+    """Entraîne le modèle avec les données de la base.
+
+    `training_mode="embeddings"` n'entraîne que la tête dense sur les
+    embeddings du backbone mis en cache dans MinIO (voir embedding_cache.py).
+    `num_workers` > 1 (défaut: TRAINING_WORKERS) répartit l'entraînement
+    "full" sur plusieurs processus locaux (voir distributed.py), avec la
+    même précision. Le fine-tuning (`fine_tune_blocks`, défaut:
+    FINE_TUNE_BLOCKS) n'existe qu'en mono-processus: s'il est demandé,
+    l'entraînement n'est pas distribué.
+    """
     
     # Récupérer les clés S3 depuis la base de données
     try:
@@ -107,7 +117,25 @@ def train_from_database_minio(num_epochs=3):
         mlflow.set_tracking_uri(os.getenv('MLFLOW_TRACKING_URI', 'http://mlflow:5000'))
         
         # Entraîner le modèle avec les données de MinIO
-        model, accuracy = train_model_from_minio(s3_keys, labels, num_epochs=num_epochs)
+        num_workers = int(num_workers or os.getenv('TRAINING_WORKERS') or 1)
+        if fine_tune_blocks is None:
+            fine_tune_blocks = int(os.getenv('FINE_TUNE_BLOCKS', '0'))
+        if num_workers > 1 and training_mode == "full" and fine_tune_blocks > 0:
+            print(f"⚠️ Fine-tuning ({fine_tune_blocks} blocs) non supporté en distribué: "
+                  f"entraînement mono-processus au lieu de {num_workers} workers")
+            num_workers = 1
+        if num_workers > 1 and training_mode == "full":
+            from distributed import launch_local_workers
+            result = launch_local_workers(
+                s3_keys, labels, num_workers=num_workers, num_epochs=num_epochs, loader=loader,
+                precision=precision
+            )
+            accuracy = result['val_accuracy']
+        else:
+            model, accuracy = train_model_from_minio(
+                s3_keys, labels, num_epochs=num_epochs, training_mode=training_mode, loader=loader,
+                precision=precision, fine_tune_blocks=fine_tune_blocks
+            )
         
         # Obtenir les informations du modèle sauvegardé
         minio_manager = MinIOModelManager()
@@ -169,7 +197,7 @@ def train_from_default_data(num_epochs=3):
         'storage': 'MinIO'
     }
 
-def train_from_s3_keys(s3_keys, labels, num_epochs=3):
+def train_from_s3_keys(s3_keys, labels, num_epochs=3, loader="tf_data"):
     """Entraîne le modèle avec des clés S3 spécifiques"""
     
     print(f"🎯 Entraînement avec {len(s3_keys)} images spécifiques depuis MinIO")
@@ -178,7 +206,7 @@ def train_from_s3_keys(s3_keys, labels, num_epochs=3):
     mlflow.set_tracking_uri(os.getenv('MLFLOW_TRACKING_URI', 'http://mlflow:5000'))
     
     # Entraîner le modèle
-    model, accuracy = train_model_from_minio(s3_keys, labels, num_epochs=num_epochs)
+    model, accuracy = train_model_from_minio(s3_keys, labels, num_epochs=num_epochs, loader=loader)
     
     # Obtenir les informations du modèle sauvegardé
     minio_manager = MinIOModelManager()
@@ -208,9 +236,9 @@ def get_model_info(model_name="plant_classifier"):
     }
 
 # Fonctions de compatibilité
-def train_from_database(num_epochs=3):
+def train_from_database(num_epochs=3, training_mode="full"):
     """Fonction de compatibilité - redirige vers la version MinIO"""
-    return train_from_database_minio(num_epochs)
+    return train_from_database_minio(num_epochs, training_mode=training_mode)
 
 def train_from_urls(image_urls, labels, num_epochs=3):
     """Fonction de compatibilité - utilise les URLs directement"""
@@ -92,3 +92,101 @@ class TestAPIInDocker:
             
         except requests.exceptions.RequestException as e:
             pytest.fail(f"Test reload-model échoué: {e}")
+
+    def test_api_predict_batch(self, api_base_url, sample_image):
+        """Test de prédiction batch avec erreurs par élément"""
+        try:
+            files = [
+                ("files", ("image_1.jpg", sample_image, "image/jpeg")),
+                ("files", ("image_2.jpg", sample_image, "image/jpeg")),
+                ("files", ("corrompue.jpg", b"pas une image", "image/jpeg")),
+            ]
+            
+            response = requests.post(f"{api_base_url}/predict-batch", files=files, timeout=60)
+            assert response.status_code == 200
+            
+            data = response.json()
+            assert data["total"] == 3
+            assert data["succeeded"] == 2
+            assert data["failed"] == 1
+            
+            results = data["results"]
+            assert [result["index"] for result in results] == [0, 1, 2]
+            assert results[0]["predicted_class"] in ["grass", "dandelion"]
+            assert results[2]["status"] == "error"
+            
+        except requests.exceptions.RequestException as e:
+            pytest.fail(f"Test predict-batch échoué: {e}")
+
+    def test_api_predict_upload_validation(self, api_base_url, sample_image):
+        """Test de /predict: métadonnées issues du décodage unique et limites de taille"""
+        try:
+            response = requests.post(
+                f"{api_base_url}/predict",
+                files={"file": ("image.jpg", sample_image, "image/jpeg")},
+                timeout=60
+            )
+            if response.status_code == 503:
+                pytest.skip("Modèle non chargé")
+            assert response.status_code == 200
+            file_info = response.json()["file_info"]
+            assert file_info["file_size"] == len(sample_image)
+            assert file_info["width"] > 0 and file_info["height"] > 0
+            
+            too_large = b"\0" * (10 * 1024 * 1024 + 1)
+            response = requests.post(
+                f"{api_base_url}/predict",
+                files={"file": ("trop_grande.jpg", too_large, "image/jpeg")},
+                timeout=60
+            )
+            assert response.status_code == 400
+            
+        except requests.exceptions.RequestException as e:
+            pytest.fail(f"Test predict échoué: {e}")
+    
+    def test_api_predict_stream(self, api_base_url):
+        """Test de classification en flux NDJSON"""
+        try:
+            test_url = "https://raw.githubusercontent.com/btphan95/greenr-airflow/refs/heads/master/data/grass/00000000.jpg"
+            body = "\n".join([test_url, json.dumps({"image_url": test_url}), "{invalide"]) + "\n"
+            
+            response = requests.post(
+                f"{api_base_url}/predict-stream",
+                data=body.encode("utf-8"),
+                headers={"Content-Type": "application/x-ndjson"},
+                timeout=60
+            )
+            assert response.status_code == 200
+            
+            lines = [json.loads(line) for line in response.text.splitlines() if line]
+            assert sorted(line["index"] for line in lines) == [0, 1, 2]
+            
+            by_index = {line["index"]: line for line in lines}
+            assert by_index[0]["predicted_class"] in ["grass", "dandelion"]
+            assert by_index[2]["status"] == "error"
+            
+        except requests.exceptions.RequestException as e:
+            pytest.fail(f"Test predict-stream échoué: {e}")
+    
+    def test_api_predict_s3_missing_key(self, api_base_url):
+        """Test de prédiction sur une clé MinIO inexistante"""
+        try:
+            response = requests.post(
+                f"{api_base_url}/predict-s3",
+                json={"s3_key": "s3://raw-data/raw/inexistante.jpg"},
+                timeout=30
+            )
+            assert response.status_code in [404, 503]
+            
+            response = requests.post(
+                f"{api_base_url}/predict-s3-batch",
+                json={"s3_keys": ["raw/inexistante.jpg"]},
+                timeout=30
+            )
+            if response.status_code == 200:
+                data = response.json()
+                assert data["failed"] == 1
+                assert data["results"][0]["status"] == "error"
+            
+        except requests.exceptions.RequestException as e:
+            pytest.fail(f"Test predict-s3 échoué: {e}")
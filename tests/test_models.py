@@ -4,6 +4,7 @@ from unittest.mock import patch, Mock, MagicMock
 import sys
 import os
 import tempfile
+import json
 
 # Configuration pour les tests Docker
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
@@ -106,4 +107,604 @@ class TestModelsInDocker:
             assert models[0]['format'] == 'keras'
             
         except Exception as e:
-            pytest.fail(f"Erreur test MinIOModelManager: {e}")
\ No newline at end of file
+            pytest.fail(f"Erreur test MinIOModelManager: {e}")
+
+
+class TestPreprocessing:
+    """Tests du prétraitement partagé entraînement / API"""
+
+    @pytest.fixture
+    def preprocessing(self):
+        try:
+            import preprocessing
+            return preprocessing
+        except ImportError:
+            pytest.skip("Module preprocessing non disponible")
+
+    def test_jpeg_draft_decode_to_uint8(self, preprocessing):
+        """Test du décodage JPEG réduit vers un buffer uint8 préalloué"""
+        import io
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (1600, 1200), (200, 40, 10)).save(buffer, 'JPEG')
+
+        batch = preprocessing.new_batch_buffer(2)
+        preprocessing.decode_to_uint8(buffer.getvalue(), out=batch[1])
+
+        assert batch.shape == (2, 224, 224, 3)
+        assert batch.dtype == np.uint8
+        assert np.allclose(batch[1].mean(axis=(0, 1)), [200, 40, 10], atol=3)
+
+        normalized = preprocessing.normalize(batch[1:])
+        assert normalized.dtype == np.float32
+        assert 0.0 <= normalized.min() and normalized.max() <= 1.0
+
+    @pytest.mark.parametrize('module', ['preprocessing.py', 'precision.py', 'model_registry.py', 'model_artifacts.py',
+                                        'tflite_export.py'])
+    def test_api_and_ml_copies_in_sync(self, module):
+        """Test que les deux exemplaires des modules partagés sont identiques"""
+        root = os.path.join(os.path.dirname(__file__), '..')
+        copies = [os.path.join(root, 'ml', 'models', module), os.path.join(root, 'api', module)]
+        if not all(os.path.exists(path) for path in copies):
+            pytest.skip("Sources ml/ et api/ non disponibles")
+
+        contents = [open(path, encoding='utf-8').read() for path in copies]
+        assert contents[0] == contents[1]
+
+
+class TestEmbeddingCache:
+    """Tests du cache MinIO des embeddings du backbone"""
+
+    def test_only_new_images_are_embedded(self, mock_s3_client):
+        """Test que seules les images absentes du cache sont calculées"""
+        from embedding_cache import EmbeddingStore
+
+        computed_keys = []
+
+        def compute(keys):
+            computed_keys.extend(keys)
+            loaded = [i for i, key in enumerate(keys) if 'corrompue' not in key]
+            embeddings = np.array([[len(keys[i]), i] for i in loaded], dtype=np.float32)
+            return embeddings, loaded
+
+        store = EmbeddingStore('backbone-test', mock_s3_client)
+        embeddings, kept, computed = store.get_or_compute(['raw/a.jpg', 'raw/corrompue.jpg'], compute)
+        assert kept == [0]
+        assert computed == 1
+        assert embeddings.shape == (1, 2)
+
+        # Nouvelle instance: le manifest est relu depuis MinIO
+        store = EmbeddingStore('backbone-test', mock_s3_client)
+        embeddings, kept, computed = store.get_or_compute(['raw/b.jpg', 'raw/a.jpg'], compute)
+        assert kept == [0, 1]
+        assert computed == 1
+        assert computed_keys == ['raw/a.jpg', 'raw/corrompue.jpg', 'raw/b.jpg']
+        assert embeddings.dtype == np.float32
+        assert np.allclose(embeddings[1], [9, 0])
+
+
+class TestDataPipeline:
+    """Tests du chargement tf.data des images d'entraînement"""
+
+    def test_dataset_skips_unreadable_images(self):
+        """Test des batchs normalisés et de l'exclusion des images illisibles"""
+        from data_pipeline import make_image_dataset
+        import io
+        from PIL import Image
+
+        blobs = {}
+        for i in range(5):
+            buffer = io.BytesIO()
+            Image.new('RGB', (320, 240), (255, 0, 0)).save(buffer, 'JPEG')
+            blobs[f"raw/{i}.jpg"] = buffer.getvalue()
+        blobs['raw/corrompue.jpg'] = b'pas une image'
+
+        keys = list(blobs) + ['raw/absente.jpg']
+        labels = ['dandelion', 'grass', 'dandelion', 'grass', 'dandelion', 'grass', 'grass']
+        dataset = make_image_dataset(keys, labels, lambda key: blobs[key], batch_size=4, shuffle=False)
+
+        batches = list(dataset)
+        assert [len(batch_labels) for _, batch_labels in batches] == [4, 1]
+        images, batch_labels = batches[0]
+        assert images.shape == (4, 224, 224, 3)
+        assert images.dtype.name == 'float32'
+        assert 0.0 <= float(images.numpy().min()) and float(images.numpy().max()) <= 1.0
+        assert list(batch_labels.numpy()) == [1, 0, 1, 0]
+
+
+class TestPrefetchingSequence:
+    """Tests des générateurs Sequence à téléchargements concurrents"""
+
+    def test_batches_prefetched_and_picklable(self):
+        """Test du préchargement des batchs suivants et de la sérialisation pour les workers"""
+        from simple_model import PrefetchingImageSequence
+        import copy
+        import io
+        import threading
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new('RGB', (320, 240), (0, 255, 0)).save(buffer, 'JPEG')
+        image_bytes = buffer.getvalue()
+        fetched = []
+
+        class InMemorySequence(PrefetchingImageSequence):
+            def fetch(self, i):
+                fetched.append(i)
+                if self.sources[i] == 'corrompue':
+                    raise IOError("objet absent")
+                return image_bytes
+
+        sources = ['a', 'b', 'corrompue', 'c', 'd', 'e', 'f', 'g']
+        labels = ['dandelion', 'grass'] * 4
+        sequence = InMemorySequence(sources, labels, batch_size=2, shuffle=False, prefetch_batches=2)
+
+        images, batch_labels = sequence[0]
+        assert images.shape == (2, 224, 224, 3)
+        assert list(batch_labels) == [1, 0]
+        assert len(sequence._pending) == 2
+
+        images, batch_labels = sequence[1]
+        assert list(batch_labels) == [0, 0]  # image illisible: label par défaut
+
+        sequence.on_epoch_end()
+        assert sequence._pending == {}
+        fetch_times, wait_times = sequence.pop_timings()
+        assert len(wait_times) == 2
+
+        # Même chemin __getstate__/__setstate__ que la sérialisation vers les workers
+        clone = copy.deepcopy(sequence)
+        assert isinstance(clone._lock, type(threading.Lock()))
+        assert len(clone[3][1]) == 2
+
+
+class TestDecodedImageCache:
+    """Tests du cache local d'images décodées"""
+
+    @pytest.fixture
+    def image_cache_module(self):
+        import image_cache
+        return image_cache
+
+    def test_lru_eviction_and_shared_index(self, image_cache_module, tmp_path):
+        """Test de l'éviction LRU et de la visibilité des écritures entre instances"""
+        image_bytes = 224 * 224 * 3
+        cache = image_cache_module.DecodedImageCache(str(tmp_path), max_bytes=2 * image_bytes)
+        other = image_cache_module.DecodedImageCache(str(tmp_path), max_bytes=2 * image_bytes)
+        assert cache.capacity == 2
+
+        images = {key: np.full((224, 224, 3), value, dtype=np.uint8) for key, value in (('a', 10), ('b', 20), ('c', 30))}
+        cache.put('a@1', images['a'])
+        cache.put('b@1', images['b'])
+
+        # Une autre instance (autre processus) voit les écritures via le compteur de génération
+        assert other.get('a@1')[0, 0, 0] == 10
+        assert other.get('a@2') is None  # ETag différent: défaut de cache
+
+        # 'b' est le moins récemment utilisé: il est évincé par 'c'
+        cache.put('c@1', images['c'])
+        assert not other.contains('b@1')
+        assert cache.get('c@1')[0, 0, 0] == 30
+        assert cache.evictions == 1
+
+        reopened = image_cache_module.DecodedImageCache(str(tmp_path), max_bytes=2 * image_bytes)
+        assert len(reopened) == 2
+        assert reopened.split_cached(['a@1', 'b@1', 'c@1']) == ([0, 2], [1])
+        assert reopened.stats()['image_cache_misses'] == 1
+
+    def test_cache_keys_follow_etags(self, image_cache_module, mock_s3_client):
+        """Test des clés de cache construites à partir des ETags MinIO"""
+        mock_s3_client.put_object(Bucket='raw-data', Key='raw/grass/1.jpg', Body=b'v1')
+        etags = image_cache_module.fetch_etags(mock_s3_client, 'raw-data', ['raw/grass/1.jpg', 'raw/grass/absente.jpg'])
+        assert list(etags) == ['raw/grass/1.jpg']
+        first_key = image_cache_module.cache_key('raw/grass/1.jpg', etags['raw/grass/1.jpg'])
+
+        mock_s3_client.put_object(Bucket='raw-data', Key='raw/grass/1.jpg', Body=b'v2')
+        etags = image_cache_module.fetch_etags(mock_s3_client, 'raw-data', ['raw/grass/1.jpg'])
+        assert image_cache_module.cache_key('raw/grass/1.jpg', etags['raw/grass/1.jpg']) != first_key
+        assert '"' not in first_key
+
+
+class TestDatasetShards:
+    """Tests de l'empaquetage incrémental en shards TFRecord"""
+
+    def test_incremental_packing_and_streaming(self, mock_s3_client):
+        """Test que seules les nouvelles images produisent de nouveaux shards lisibles en flux"""
+        from dataset_shards import load_manifest, make_shard_dataset, pack_new_images
+        import io
+        from PIL import Image
+
+        keys, labels = [], []
+        for i in range(5):
+            buffer = io.BytesIO()
+            Image.new('RGB', (320, 240), (40 * i, 0, 0)).save(buffer, 'JPEG')
+            keys.append(f"raw/{'dandelion' if i % 2 else 'grass'}/{i}.jpg")
+            labels.append('dandelion' if i % 2 else 'grass')
+            mock_s3_client.put_object(Bucket='raw-data', Key=keys[-1], Body=buffer.getvalue())
+
+        # ~150 Ko par image: 2 images par shard de 300 Ko
+        summary = pack_new_images(keys[:4], labels[:4], mock_s3_client, shard_bytes=300 * 1024)
+        assert summary['new_images'] == 4
+        assert len(summary['new_shards']) == 2
+
+        summary = pack_new_images(keys, labels, mock_s3_client, shard_bytes=300 * 1024)
+        assert summary['new_images'] == 1
+        assert summary['total_shards'] == 3
+
+        manifest = load_manifest(mock_s3_client)
+        assert sorted(manifest['packed']) == sorted(keys)
+
+        shard_keys = [shard['key'] for shard in manifest['shards']]
+        dataset = make_shard_dataset(shard_keys, lambda: mock_s3_client, keep_keys=keys[1:])
+        records = sorted((int(label), int(image[0, 0, 0])) for image, label in dataset)
+        assert [label for label, _ in records] == [0, 0, 1, 1]
+        assert all(image.shape == (224, 224, 3) for image, _ in dataset)
+
+    def test_tfrecords_split_across_chunks(self, tmp_path):
+        """Test de la lecture en flux d'enregistrements à cheval sur plusieurs lectures"""
+        import io
+        import tensorflow as tf
+        from dataset_shards import iter_tfrecords
+
+        path = str(tmp_path / 'shard.tfrecord')
+        payloads = [b'a' * 5, b'', b'b' * 40]
+        with tf.io.TFRecordWriter(path) as writer:
+            for payload in payloads:
+                writer.write(payload)
+        with open(path, 'rb') as f:
+            data = f.read()
+
+        assert list(iter_tfrecords(io.BytesIO(data), chunk_size=7)) == payloads
+        with pytest.raises(ValueError):
+            list(iter_tfrecords(io.BytesIO(data[:-3]), chunk_size=7))
+
+
+class TestPrecision:
+    """Tests des politiques de précision et du repliement des BatchNormalization"""
+
+    def _make_model(self, keras):
+        keras.utils.set_random_seed(0)
+        inputs = keras.Input((16, 16, 3))
+        x = keras.layers.Conv2D(8, 3, use_bias=False)(inputs)
+        x = keras.layers.BatchNormalization()(x)
+        x = keras.layers.ReLU(6.0)(x)
+        x = keras.layers.DepthwiseConv2D(3, depth_multiplier=2)(x)
+        x = keras.layers.BatchNormalization()(x)
+        x = keras.layers.GlobalAveragePooling2D()(x)
+        outputs = keras.layers.Dense(2, activation='softmax')(x)
+        model = keras.Model(inputs, outputs)
+
+        rng = np.random.default_rng(0)
+        for layer in model.layers:
+            if isinstance(layer, keras.layers.BatchNormalization):
+                size = layer.moving_variance.shape[0]
+                layer.moving_mean.assign(rng.normal(0, 0.5, size).astype(np.float32))
+                layer.moving_variance.assign(rng.uniform(0.5, 2.0, size).astype(np.float32))
+                layer.gamma.assign(rng.uniform(0.5, 1.5, size).astype(np.float32))
+                layer.beta.assign(rng.normal(0, 0.5, size).astype(np.float32))
+        return model
+
+    def test_folded_and_bfloat16_copies_match_float32(self):
+        """Test que les copies repliées / bfloat16 gardent les prédictions et une sortie float32"""
+        import tensorflow as tf
+        from tensorflow import keras
+        from precision import model_precision, with_precision
+
+        model = self._make_model(keras)
+        images = np.random.default_rng(1).random((4, 16, 16, 3), dtype=np.float32)
+        expected = model(images, training=False).numpy()
+
+        folded = with_precision(model, 'float32', fold_batch_norm=True)
+        assert not any(isinstance(layer, keras.layers.BatchNormalization) for layer in folded.layers)
+        np.testing.assert_allclose(folded(images, training=False).numpy(), expected, atol=1e-5)
+
+        mixed = with_precision(model, 'mixed_bfloat16', fold_batch_norm=True)
+        assert model_precision(mixed) == 'mixed_bfloat16'
+        assert mixed.layers[-1].dtype_policy.name == 'float32'
+        predictions = mixed(images, training=False)
+        assert predictions.dtype == tf.float32
+        np.testing.assert_allclose(predictions.numpy(), expected, atol=2e-2)
+
+        # Retour en float32 sans repliement: mêmes poids, mêmes prédictions
+        restored = with_precision(with_precision(model, 'mixed_bfloat16'), 'float32')
+        np.testing.assert_allclose(restored(images, training=False).numpy(), expected, atol=1e-6)
+        assert with_precision(model, 'float32') is model
+
+    def test_folds_found_in_nested_graph(self):
+        """Test des paires repliables d'un backbone imbriqué: une convolution partagée n'est pas repliée"""
+        from tensorflow import keras
+        from precision import batch_norm_folds, with_precision
+
+        keras.utils.set_random_seed(0)
+        inputs = keras.Input((16, 16, 3))
+        x = keras.layers.Conv2D(4, 3, padding='same', name='conv_bn')(inputs)
+        x = keras.layers.BatchNormalization(name='bn')(x)
+        shared = keras.layers.Conv2D(4, 1, name='conv_shared')(x)
+        y = keras.layers.BatchNormalization(name='bn_shared')(shared)
+        backbone = keras.Model(inputs, keras.layers.Add(name='add')([y, shared]), name='backbone')
+        model = keras.Sequential([
+            backbone,
+            keras.layers.DepthwiseConv2D(3, name='head_depthwise'),
+            keras.layers.BatchNormalization(name='head_bn'),
+            keras.layers.GlobalAveragePooling2D(),
+            keras.layers.Dense(2, activation='softmax')
+        ])
+
+        rng = np.random.default_rng(0)
+        for layer in [backbone.get_layer('bn'), backbone.get_layer('bn_shared'), model.get_layer('head_bn')]:
+            size = layer.moving_variance.shape[0]
+            layer.moving_mean.assign(rng.normal(0, 0.5, size).astype(np.float32))
+            layer.moving_variance.assign(rng.uniform(0.5, 2.0, size).astype(np.float32))
+
+        folds = batch_norm_folds(model)
+        assert {conv: batch_norm.name for conv, batch_norm in folds.items()} == {
+            'conv_bn': 'bn', 'head_depthwise': 'head_bn'
+        }
+
+        images = rng.random((3, 16, 16, 3), dtype=np.float32)
+        folded = with_precision(model, 'float32', fold_batch_norm=True)
+        np.testing.assert_allclose(folded(images, training=False).numpy(),
+                                   model(images, training=False).numpy(), atol=1e-5)
+
+
+class TestDistributed:
+    """Tests du découpage multi-worker"""
+
+    def test_worker_shards_and_steps(self):
+        """Test que les parts des workers sont disjointes et couvrent le dataset"""
+        from distributed import shard_for_worker, steps_per_epoch, worker_task
+
+        keys = [f"raw/grass/{i:08d}.jpg" for i in range(11)]
+        labels = ['grass'] * 11
+        shards = [shard_for_worker(keys, labels, index, 3) for index in range(3)]
+        assert sorted(key for shard_keys, _ in shards for key in shard_keys) == keys
+        assert [len(shard_keys) for shard_keys, _ in shards] == [4, 4, 3]
+        assert steps_per_epoch(11, 3, batch_size=2) == 1
+        assert steps_per_epoch(2, 3, batch_size=8) == 1
+
+        tf_config = {"cluster": {"worker": ["localhost:1", "localhost:2"]}, "task": {"type": "worker", "index": 1}}
+        with patch.dict(os.environ, {"TF_CONFIG": json.dumps(tf_config)}):
+            assert worker_task() == (1, 2)
+        with patch.dict(os.environ, {"TF_CONFIG": ""}):
+            assert worker_task() == (0, 1)
+
+    def test_padded_validation_covers_every_example(self):
+        """Test que la validation de chaque worker couvre toute sa part, bourrage masqué"""
+        import tensorflow as tf
+        from distributed import eval_steps, padded_eval_dataset, shard_for_worker
+
+        keys = list(range(11))
+        steps = eval_steps(len(keys), 3, batch_size=2)
+        assert steps == 2
+        for index in range(3):
+            shard, _ = shard_for_worker(keys, keys, index, 3)
+            dataset = tf.data.Dataset.from_tensor_slices((
+                tf.zeros([len(shard), 4, 4, 3]), tf.constant(shard, tf.int64)
+            )).batch(2)
+            batches = list(padded_eval_dataset(dataset, steps, batch_size=2))
+            assert len(batches) == steps
+            masks = np.concatenate([mask.numpy() for _, _, mask in batches])
+            labels = np.concatenate([batch_labels.numpy() for _, batch_labels, _ in batches])
+            assert sorted(labels[masks == 1].tolist()) == shard
+
+
+class TestFineTuning:
+    """Tests du dégel partiel du backbone"""
+
+    def test_split_and_unfreeze_top_blocks(self):
+        """Test que le découpage du backbone est exact et que seules les couches hautes hors BN sont dégelées"""
+        from tensorflow import keras
+        from fine_tuning import split_backbone, unfreeze_top
+
+        backbone = keras.applications.MobileNetV2(input_shape=(96, 96, 3), alpha=0.35, include_top=False, weights=None)
+        backbone.trainable = False
+        bottom, top = split_backbone(backbone, 2)
+        images = np.random.default_rng(0).random((2, 96, 96, 3), dtype=np.float32)
+        np.testing.assert_allclose(top(bottom(images)).numpy(), backbone(images).numpy(), atol=1e-5)
+        assert top.get_layer('block_15_expand') is backbone.get_layer('block_15_expand')
+
+        assert unfreeze_top(backbone, top) > 0
+        assert backbone.get_layer('block_15_expand').trainable
+        assert backbone.get_layer('Conv_1').trainable
+        assert not backbone.get_layer('block_15_expand_BN').trainable
+        assert not backbone.get_layer('block_14_expand').trainable
+
+        with pytest.raises(ValueError):
+            split_backbone(backbone, 17)
+
+
+class TestOptimizedExport:
+    """Tests de l'export des variantes TFLite à la fin de l'entraînement"""
+
+    def test_exported_variants_load_and_predict(self, mock_s3_client):
+        """Test que les variantes float16 et int8 se chargent et prédisent comme le modèle Keras"""
+        import io
+        from tensorflow import keras
+        from PIL import Image
+        import simple_model
+
+        keys, labels = [], []
+        for i in range(6):
+            buffer = io.BytesIO()
+            Image.new('RGB', (256, 256), (40 * i, 255 - 40 * i, 60)).save(buffer, 'JPEG')
+            keys.append(f"raw/{i}.jpg")
+            labels.append('dandelion' if i % 2 else 'grass')
+            mock_s3_client.put_object(Bucket='raw-data', Key=keys[-1], Body=buffer.getvalue())
+
+        keras.utils.set_random_seed(0)
+        model = keras.Sequential([
+            keras.Input((224, 224, 3)),
+            keras.layers.Conv2D(4, 3, strides=8, activation='relu'),
+            keras.layers.GlobalAveragePooling2D(),
+            keras.layers.Dense(2, activation='softmax')
+        ])
+
+        with patch.object(simple_model, 'get_s3_client', return_value=mock_s3_client):
+            optimized = simple_model.export_optimized_models(model, keys[:4], keys[4:], labels[4:])
+            images, _ = simple_model.load_images_from_minio(keys[4:])
+        assert set(optimized['variants']) == {'float16', 'int8'}
+        assert optimized['variants']['int8']['calibration_images'] == 4
+
+        expected = model(images).numpy()
+        for variant, artifact in optimized['variants'].items():
+            predict = simple_model.make_tflite_predictor(artifact['tflite_model'])
+            np.testing.assert_allclose(predict(images), expected, atol=0.05 if variant == 'int8' else 1e-2)
+
+        with patch.object(simple_model.mlflow, 'log_metrics') as log_metrics:
+            simple_model.log_optimized_models_to_mlflow(optimized)
+        metrics = log_metrics.call_args[0][0]
+        assert {'keras_latency_ms', 'tflite_int8_accuracy', 'tflite_float16_size_bytes'} <= set(metrics)
+
+
+class TestModelSaving:
+    """Tests de la sauvegarde MinIO des modèles"""
+
+    def test_single_serialization_and_server_side_latest(self, mock_s3_client):
+        """Test qu'un seul format est uploadé et que latest est une copie côté serveur"""
+        from tensorflow import keras
+        from simple_model import MinIOModelManager
+
+        manager = MinIOModelManager(s3_client=mock_s3_client)
+        mock_s3_client.put_object(Bucket='models', Key='tensorflow/test_latest.h5', Body=b'ancien')
+        model = keras.Sequential([keras.Input((4,)), keras.layers.Dense(2, activation='softmax')])
+        optimized = {'baseline': {}, 'variants': {'float16': {'tflite_model': b'tflite', 'size_bytes': 6}}}
+
+        with patch.object(mock_s3_client, 'upload_file', wraps=mock_s3_client.upload_file) as upload_file:
+            saved_keys = manager.save_model_to_minio(model, "test", optimized_models=optimized)
+        assert upload_file.call_count == 1
+
+        keys = {obj['Key'] for obj in mock_s3_client.list_objects_v2(Bucket='models')['Contents']}
+        assert 'tensorflow/test_latest.keras' in keys and 'tensorflow/test_latest.h5' not in keys
+        assert not any(key.endswith('.h5') for key in saved_keys)
+
+        latest_etag = mock_s3_client.head_object(Bucket='models', Key='tensorflow/test_latest.keras')['ETag'].strip('"')
+        tflite = mock_s3_client.head_object(Bucket='models', Key='tensorflow/test_latest_float16.tflite')
+        assert tflite['Metadata']['source-etag'] == latest_etag
+
+        metadata = json.loads(mock_s3_client.get_object(Bucket='models', Key=saved_keys[-1])['Body'].read())
+        assert metadata['format'] == 'keras'
+        assert {'serialize_seconds', 'upload_seconds', 'copy_latest_seconds'} <= set(metadata['timings'])
+
+        latest = manager.registry("test").latest()
+        assert latest['key'] == saved_keys[0] and latest['sha256'] == metadata['sha256']
+        assert manager.list_models("test")[0]['version'] == latest['version']
+
+
+class TestModelRegistry:
+    """Tests du registre des versions de modèles"""
+
+    def test_append_resolves_latest_and_retries_on_conflict(self, mock_s3_client):
+        """Test de l'ajout conditionnel, de la résolution des versions et de la revalidation par ETag"""
+        try:
+            from botocore.exceptions import ClientError
+            from model_registry import ModelRegistry
+        except ImportError:
+            pytest.skip("Module model_registry non disponible")
+
+        registry = ModelRegistry(mock_s3_client, 'models', 'test')
+        assert registry.latest() is None and registry.page() == ([], 0, None)
+
+        registry.append({"version": "v1", "key": "tensorflow/test_v1.keras"})
+        registry.append({"version": "v2", "key": "tensorflow/test_v2.keras", "status": "failed"})
+
+        # Écriture concurrente: le premier put est refusé, le second passe après relecture
+        put_object = mock_s3_client.put_object
+        attempts = []
+
+        def put_after_conflict(**kwargs):
+            attempts.append(kwargs)
+            if len(attempts) == 1:
+                raise ClientError({'Error': {'Code': 'PreconditionFailed', 'Message': ''}}, 'PutObject')
+            return put_object(**kwargs)
+
+        with patch.object(mock_s3_client, 'put_object', side_effect=put_after_conflict):
+            registry.append({"version": "v3", "key": "tensorflow/test_v3.keras"})
+        assert len(attempts) == 2 and all('IfMatch' in kwargs for kwargs in attempts)
+
+        reader = ModelRegistry(mock_s3_client, 'models', 'test')
+        assert reader.latest()['version'] == 'v3'
+        assert reader.get('v2')['status'] == 'failed'
+        assert reader.get('v9') is None
+        versions, total, etag = reader.page(offset=1, limit=1)
+        assert [entry['version'] for entry in versions] == ['v2'] and total == 3 and etag
+
+        # Manifest inchangé: revalidation sans relecture du corps
+        with patch.object(mock_s3_client, 'get_object', wraps=mock_s3_client.get_object) as get_object:
+            assert reader.latest()['version'] == 'v3'
+        assert get_object.call_args.kwargs['IfNoneMatch'] == etag
+
+        with pytest.raises(ValueError):
+            reader.append({"version": "v1", "key": "tensorflow/test_v1.keras"})
+
+
+class TestModelLoading:
+    """Tests du chargement en mémoire des modèles depuis MinIO"""
+
+    def test_ranged_download_verified_without_head(self, mock_s3_client):
+        """Test du téléchargement par plages, de la vérification sha256 et du repli sur latest"""
+        from tensorflow import keras
+        import model_artifacts
+        from simple_model import MinIOModelManager
+
+        manager = MinIOModelManager(s3_client=mock_s3_client)
+        model = keras.Sequential([keras.Input((4,)), keras.layers.Dense(2, activation='softmax')])
+        saved_keys = manager.save_model_to_minio(model, "test")
+        entry = manager.registry("test").latest()
+
+        with patch.object(model_artifacts, 'DOWNLOAD_PART_SIZE', 4096), \
+                patch.object(mock_s3_client, 'get_object', wraps=mock_s3_client.get_object) as get_object, \
+                patch.object(mock_s3_client, 'head_object') as head_object:
+            loaded = manager.load_model_from_minio("test")
+        assert not head_object.called
+        ranges = [call.kwargs['Range'] for call in get_object.call_args_list if 'Range' in call.kwargs]
+        assert len(ranges) == -(-entry['size'] // 4096)
+        np.testing.assert_allclose(loaded.get_weights()[0], model.get_weights()[0])
+        assert manager.last_load['key'] == saved_keys[0] and manager.last_load['etag'] == entry['etag']
+        assert {'resolve_seconds', 'download_seconds', 'deserialize_seconds', 'total_seconds'} <= set(manager.last_load['timings'])
+
+        # Contenu différent de l'empreinte du registre: candidat écarté, repli sur latest
+        with pytest.raises(model_artifacts.ArtifactIntegrityError):
+            model_artifacts.verify_sha256(b'corrompu', entry['sha256'], entry['key'])
+        with patch.object(model_artifacts, 'verify_sha256', side_effect=[model_artifacts.ArtifactIntegrityError('sha256'), None]):
+            assert manager.load_model_from_minio("test") is not None
+        assert manager.last_load['key'] == 'tensorflow/test_latest.keras'
+
+    def test_local_cache_reused_until_content_changes(self, mock_s3_client, tmp_path):
+        """Test du cache disque: réutilisation sans téléchargement, revalidation par ETag et éviction LRU"""
+        import model_artifacts
+        from simple_model import MinIOModelManager
+        from tensorflow import keras
+
+        manager = MinIOModelManager(s3_client=mock_s3_client)
+        model = keras.Sequential([keras.Input((4,)), keras.layers.Dense(2, activation='softmax')])
+        manager.save_model_to_minio(model, "test")
+        entry = manager.registry("test").latest()
+        registry_candidate = {name: entry[name] for name in ('key', 'size', 'etag', 'sha256')}
+        legacy_candidate = {'key': 'tensorflow/test_latest.keras'}
+        cache = model_artifacts.ModelFileCache(tmp_path / 'cache', max_versions=1)
+
+        def load(candidate):
+            with patch.object(mock_s3_client, 'get_object', wraps=mock_s3_client.get_object) as get_object:
+                _, loaded, _ = model_artifacts.load_model_artifact(mock_s3_client, 'models', [candidate], cache=cache)
+            return loaded['source'], [call.kwargs for call in get_object.call_args_list]
+
+        assert load(registry_candidate)[0] == 'download'
+        assert load(registry_candidate) == ('cache', [])
+
+        # Clé historique: GET conditionnel sur l'ETag du dernier téléchargement
+        assert load(legacy_candidate)[0] == 'download'
+        source, calls = load(legacy_candidate)
+        assert source == 'cache' and len(calls) == 1 and 'IfNoneMatch' in calls[0]
+
+        # Fichier corrompu: écarté et retéléchargé
+        cached = tmp_path / 'cache' / f"{entry['sha256']}.keras"
+        cached.write_bytes(b'corrompu')
+        assert load(registry_candidate)[0] == 'download'
+
+        # Nouvelle version: l'ancienne est évincée (max_versions=1)
+        model.layers[-1].set_weights([w + 1 for w in model.layers[-1].get_weights()])
+        model.save(tmp_path / 'v2.keras')
+        mock_s3_client.put_object(Bucket='models', Key='tensorflow/test_v2.keras', Body=(tmp_path / 'v2.keras').read_bytes())
+        assert load({'key': 'tensorflow/test_v2.keras'})[0] == 'download'
+        assert not cached.exists() and cache.stats['evictions'] == 1
@@ -0,0 +1,582 @@
+import pytest
+import asyncio
+import numpy as np
+from unittest.mock import Mock, patch
+
+class TestMicroBatcher:
+    """Tests du micro-batching de l'API"""
+
+    @pytest.fixture
+    def batcher_module(self):
+        try:
+            import batching
+            return batching
+        except ImportError:
+            pytest.skip("Module batching de l'API non disponible")
+
+    def test_concurrent_requests_share_batch(self, batcher_module):
+        """Test que des requêtes concurrentes sont regroupées en un seul appel"""
+        calls = []
+
+        def predict_fn(batch):
+            calls.append(batch.shape[0])
+            return np.tile([[0.25, 0.75]], (batch.shape[0], 1))
+
+        async def scenario():
+            batcher = batcher_module.MicroBatcher(predict_fn, max_batch_size=8, max_wait_us=50000)
+            await batcher.start()
+            try:
+                images = [np.zeros((4, 4, 3)) for _ in range(5)]
+                return await asyncio.gather(*(batcher.submit(image) for image in images))
+            finally:
+                await batcher.stop()
+
+        results = asyncio.run(scenario())
+
+        assert calls == [5]
+        for probabilities, batch_info in results:
+            assert np.allclose(probabilities, [0.25, 0.75])
+            assert batch_info["batch_size"] == 5
+            assert batch_info["max_batch_size"] == 8
+
+    def test_flush_on_max_batch_size(self, batcher_module):
+        """Test que le batch est déclenché dès que la taille maximale est atteinte"""
+        calls = []
+
+        def predict_fn(batch):
+            calls.append(batch.shape[0])
+            return np.zeros((batch.shape[0], 2))
+
+        async def scenario():
+            batcher = batcher_module.MicroBatcher(predict_fn, max_batch_size=2, max_wait_us=1000000)
+            await batcher.start()
+            try:
+                await asyncio.gather(*(batcher.submit(np.zeros((4, 4, 3))) for _ in range(4)))
+            finally:
+                await batcher.stop()
+
+        asyncio.run(asyncio.wait_for(scenario(), timeout=5))
+
+        assert calls == [2, 2]
+
+    def test_error_propagates_to_all_waiters(self, batcher_module):
+        """Test qu'une erreur du modèle est renvoyée à chaque requête du batch"""
+        def predict_fn(batch):
+            raise ValueError("modèle indisponible")
+
+        async def scenario():
+            batcher = batcher_module.MicroBatcher(predict_fn, max_batch_size=4, max_wait_us=1000)
+            await batcher.start()
+            try:
+                return await asyncio.gather(
+                    *(batcher.submit(np.zeros((4, 4, 3))) for _ in range(3)),
+                    return_exceptions=True
+                )
+            finally:
+                await batcher.stop()
+
+        results = asyncio.run(scenario())
+
+        assert all(isinstance(result, ValueError) for result in results)
+
+    def test_batch_split_by_model_version(self, batcher_module):
+        """Test qu'un batch mêlant deux versions du modèle fait une passe par version"""
+        calls = []
+
+        def make_predict(label):
+            def predict_fn(batch):
+                calls.append((label, batch.shape[0]))
+                return np.full((batch.shape[0], 2), label)
+            return predict_fn
+
+        old, new = make_predict(0.0), make_predict(1.0)
+
+        async def scenario():
+            batcher = batcher_module.MicroBatcher(old, max_batch_size=8, max_wait_us=50000)
+            await batcher.start()
+            try:
+                return await asyncio.gather(
+                    batcher.submit(np.zeros((4, 4, 3))),
+                    batcher.submit(np.zeros((4, 4, 3)), new),
+                    batcher.submit(np.zeros((4, 4, 3)), old)
+                )
+            finally:
+                await batcher.stop()
+
+        results = asyncio.run(scenario())
+
+        assert sorted(calls) == [(0.0, 2), (1.0, 1)]
+        assert [probabilities[0] for probabilities, _ in results] == [0.0, 1.0, 0.0]
+
+class TestInferenceExecutor:
+    """Tests de l'exécuteur d'inférence dédié"""
+
+    @pytest.fixture
+    def inference_module(self):
+        try:
+            import inference
+            return inference
+        except ImportError:
+            pytest.skip("Module inference de l'API non disponible")
+
+    def test_queue_depth_tracks_pending_tasks(self, inference_module):
+        """Test que la profondeur de file suit les tâches en cours"""
+        import threading
+
+        executor = inference_module.InferenceExecutor(max_workers=1)
+        release = threading.Event()
+
+        try:
+            futures = [executor.submit(release.wait, 5) for _ in range(3)]
+            assert executor.queue_depth == 3
+
+            release.set()
+            for future in futures:
+                future.result(timeout=5)
+            executor.shutdown(wait=True)
+            assert executor.queue_depth == 0
+        finally:
+            release.set()
+            executor.shutdown(wait=True)
+
+    def test_run_does_not_block_event_loop(self, inference_module):
+        """Test que la boucle asyncio reste disponible pendant une tâche bloquante"""
+        import time
+
+        executor = inference_module.InferenceExecutor(max_workers=1)
+
+        async def scenario():
+            slow = asyncio.ensure_future(executor.run(time.sleep, 0.2))
+            start = time.perf_counter()
+            await asyncio.sleep(0.01)
+            elapsed = time.perf_counter() - start
+            await slow
+            return elapsed
+
+        try:
+            assert asyncio.run(scenario()) < 0.15
+        finally:
+            executor.shutdown(wait=True)
+
+class TestPredictionCache:
+    """Tests du cache de prédictions de l'API"""
+
+    @pytest.fixture
+    def cache_module(self):
+        try:
+            import prediction_cache
+            return prediction_cache
+        except ImportError:
+            pytest.skip("Module prediction_cache de l'API non disponible")
+
+    def test_lru_eviction_and_model_version(self, cache_module):
+        """Test de l'éviction LRU et de l'isolation par version du modèle"""
+        cache = cache_module.PredictionCache.from_config('memory', max_entries=2, ttl_seconds=60)
+
+        async def scenario():
+            await cache.set("v1", "a", {"prediction": {"predicted_class": "grass"}})
+            await cache.set("v1", "b", {"prediction": {"predicted_class": "dandelion"}})
+            assert await cache.get("v1", "a") is not None  # "a" devient le plus récent
+            await cache.set("v1", "c", {"prediction": {"predicted_class": "grass"}})
+            return [await cache.get(version, key) for version, key in (("v1", "a"), ("v1", "b"), ("v2", "a"))]
+
+        a, b, other_version = asyncio.run(scenario())
+
+        assert a == {"prediction": {"predicted_class": "grass"}}
+        assert b is None
+        assert other_version is None
+        assert cache.stats()["hits"] == 2
+        assert cache.stats()["entries"] == 2
+
+    def test_ttl_and_invalidate(self, cache_module):
+        """Test de l'expiration et de l'invalidation au rechargement du modèle"""
+        cache = cache_module.PredictionCache.from_config('memory', max_entries=10, ttl_seconds=0)
+
+        async def scenario():
+            await cache.set("v1", "expired", {"prediction": {}})
+            expired = await cache.get("v1", "expired")
+            cache.backend.ttl_seconds = 60
+            await cache.set("v1", "kept", {"prediction": {}})
+            await cache.invalidate()
+            return expired, await cache.get("v1", "kept")
+
+        assert asyncio.run(scenario()) == (None, None)
+
+    def test_cache_keys(self, cache_module):
+        """Test de la normalisation des clés (octets, URL, clé MinIO)"""
+        assert cache_module.bytes_cache_key(b"abc") == cache_module.bytes_cache_key(b"abc")
+        assert cache_module.bytes_cache_key(b"abc") != cache_module.bytes_cache_key(b"abd")
+        assert cache_module.remote_cache_key({"image_url": "HTTP://Example.com/a.jpg?b=2&a=1#frag"}) == \
+            cache_module.remote_cache_key({"image_url": "http://example.com/a.jpg?a=1&b=2"})
+        assert cache_module.remote_cache_key({"s3_key": "raw/x.jpg"}) == "s3:raw/x.jpg"
+
+class TestStreaming:
+    """Tests du découpage du flux /predict-stream"""
+
+    @pytest.fixture
+    def streaming_module(self):
+        try:
+            import streaming
+            return streaming
+        except ImportError:
+            pytest.skip("Module streaming de l'API non disponible")
+
+    def test_long_and_invalid_lines_become_errors(self, streaming_module):
+        """Test qu'une ligne trop longue ou non UTF-8 donne une erreur sans interrompre le flux"""
+        chunks = [b'raw/dandelion/1.jpg\nraw/gr', b'ass/2.jpg\n' + b'x' * 40, b'x' * 40 + b'\n\xff\xfe\n', b'raw/grass/3.jpg']
+
+        async def scenario():
+            async def stream():
+                for chunk in chunks:
+                    yield chunk
+            return [line async for line in streaming_module.iter_ndjson_lines(stream(), max_line_bytes=32)]
+
+        items = []
+        for line in asyncio.run(scenario()):
+            try:
+                items.append(streaming_module.parse_stream_item(line))
+            except ValueError as e:
+                items.append(str(e))
+
+        assert items[0] == {"s3_key": "raw/dandelion/1.jpg"}
+        assert items[1] == {"s3_key": "raw/grass/2.jpg"}
+        assert "trop longue" in items[2]
+        assert "UTF-8" in items[3]
+        assert items[4] == {"s3_key": "raw/grass/3.jpg"}
+        assert len(items) == 5
+
+
+class TestImageFetcher:
+    """Tests du téléchargement des images distantes"""
+
+    @pytest.fixture
+    def fetcher_module(self):
+        try:
+            import fetcher
+            import httpx
+            return fetcher, httpx
+        except ImportError:
+            pytest.skip("Module fetcher de l'API non disponible")
+
+    def test_abort_above_max_bytes(self, fetcher_module):
+        """Test que le téléchargement s'arrête au-delà de la taille maximale"""
+        fetcher, httpx = fetcher_module
+
+        def handler(request):
+            return httpx.Response(200, content=b"x" * 2048)
+
+        async def scenario():
+            image_fetcher = fetcher.ImageFetcher(1024, transport=httpx.MockTransport(handler))
+            await image_fetcher.start()
+            try:
+                await image_fetcher.fetch("http://images.example/big.jpg")
+            finally:
+                await image_fetcher.stop()
+
+        with pytest.raises(fetcher.ImageTooLargeError):
+            asyncio.run(scenario())
+
+    def test_disk_cache_revalidation(self, fetcher_module, tmp_path):
+        """Test du cache disque: hit sans requête, puis revalidation par ETag"""
+        fetcher, httpx = fetcher_module
+        requests_seen = []
+
+        def handler(request):
+            requests_seen.append(request.headers.get("if-none-match"))
+            if request.headers.get("if-none-match") == '"v1"':
+                return httpx.Response(304)
+            return httpx.Response(200, content=b"image-bytes", headers={"ETag": '"v1"'})
+
+        async def scenario():
+            image_fetcher = fetcher.ImageFetcher(
+                1024, cache_dir=tmp_path, cache_ttl=60, transport=httpx.MockTransport(handler)
+            )
+            await image_fetcher.start()
+            try:
+                first = await image_fetcher.fetch("http://images.example/a.jpg")
+                second = await image_fetcher.fetch("http://images.example/a.jpg")
+                image_fetcher.cache_ttl = 0
+                third = await image_fetcher.fetch("http://images.example/a.jpg")
+                return [first, second, third], image_fetcher.stats
+            finally:
+                await image_fetcher.stop()
+
+        contents, stats = asyncio.run(scenario())
+
+        assert contents == [b"image-bytes"] * 3
+        assert requests_seen == [None, '"v1"']
+        assert stats["cache_hits"] == 1
+        assert stats["revalidated"] == 1
+
+    def test_disk_cache_eviction(self, fetcher_module, tmp_path):
+        """Test que le cache disque reste sous sa limite sans fichier temporaire résiduel"""
+        fetcher, httpx = fetcher_module
+
+        def handler(request):
+            return httpx.Response(200, content=b"x" * 1000, headers={"ETag": f'"{request.url.path}"'})
+
+        async def scenario():
+            image_fetcher = fetcher.ImageFetcher(
+                4096, cache_dir=tmp_path, cache_max_bytes=2500, transport=httpx.MockTransport(handler)
+            )
+            await image_fetcher.start()
+            try:
+                for name in ("a", "b", "c"):
+                    await image_fetcher.fetch(f"http://images.example/{name}.jpg")
+                return image_fetcher, image_fetcher.info()
+            finally:
+                await image_fetcher.stop()
+
+        image_fetcher, info = asyncio.run(scenario())
+
+        assert info["disk_cache_bytes"] == 2000
+        assert sum(path.stat().st_size for path in tmp_path.glob("*.bin")) == 2000
+        assert not list(tmp_path.glob("*.tmp"))
+        assert image_fetcher._read_cache("http://images.example/a.jpg") is None
+        assert image_fetcher._read_cache("http://images.example/c.jpg") is not None
+
+
+class TestKerasBackend:
+    """Tests de la signature de serving Keras compilée"""
+
+    def test_signatures_buckets_and_large_batches(self):
+        """Test des entrées float32 / uint8, du rognage des batchs complétés et des batchs > 32"""
+        from tensorflow import keras
+        import backends
+
+        keras.utils.set_random_seed(0)
+        model = keras.Sequential([
+            keras.Input((8, 8, 3)),
+            keras.layers.Conv2D(4, 3, activation='relu'),
+            keras.layers.GlobalAveragePooling2D(),
+            keras.layers.Dense(2, activation='softmax')
+        ])
+        backend = backends.KerasBackend(model)
+        images = np.random.default_rng(0).integers(0, 256, (40, 8, 8, 3), dtype=np.uint8)
+        expected = model(images.astype(np.float32) / 255.0).numpy()
+
+        from_uint8 = backend.predict(images[:3])
+        from_float32 = backend.predict(images[:3].astype(np.float32) / 255.0)
+        assert from_uint8.shape == from_float32.shape == (3, 2)
+        np.testing.assert_allclose(from_uint8, from_float32, atol=1e-6)
+        np.testing.assert_allclose(from_uint8, expected[:3], atol=1e-6)
+
+        large = backend.predict(images)
+        assert large.shape == (40, 2)
+        np.testing.assert_allclose(large, expected, atol=1e-6)
+
+
+class TestTFLiteBackend:
+    """Tests du backend TFLite et de son cache MinIO"""
+
+    @pytest.fixture(scope='class')
+    def tiny_model(self):
+        from tensorflow import keras
+        keras.utils.set_random_seed(0)
+        return keras.Sequential([
+            keras.Input((8, 8, 3)),
+            keras.layers.Conv2D(4, 3, activation='relu'),
+            keras.layers.GlobalAveragePooling2D(),
+            keras.layers.Dense(2, activation='softmax')
+        ])
+
+    def test_outputs_match_keras_without_reallocation(self, tiny_model):
+        """Test des sorties proches de Keras et d'un interpréteur alloué par bucket"""
+        import backends
+
+        backend = backends.TFLiteBackend(backends.convert_to_tflite(tiny_model, 'float16'), 'float16')
+        images = np.random.default_rng(0).integers(0, 256, (40, 8, 8, 3), dtype=np.uint8)
+        expected = tiny_model(images.astype(np.float32) / 255.0).numpy()
+
+        for size in (3, 3, 5, 40):
+            probabilities = backend.predict(images[:size])
+            assert probabilities.shape == (size, 2)
+            np.testing.assert_allclose(probabilities, expected[:size], atol=1e-2)
+
+        # 3 -> bucket 4, 5 -> bucket 8, 40 -> deux passes de 32 puis 8
+        interpreters = backend._pool.get()
+        assert sorted(interpreters) == [4, 8, 32]
+
+    def test_conversion_cached_by_source_etag(self, tiny_model, mock_s3_client):
+        """Test que le flatbuffer en cache n'est réutilisé que pour le même modèle source"""
+        import backends
+
+        mock_s3_client.put_object(Bucket='models', Key='plant_classifier/v1.keras', Body=b'v1')
+        with patch.object(backends, 'convert_to_tflite', return_value=b'flatbuffer') as convert:
+            first, tflite_key = backends.load_or_convert_tflite(
+                tiny_model, mock_s3_client, 'models', 'plant_classifier/v1.keras', 'dynamic'
+            )
+            second, _ = backends.load_or_convert_tflite(
+                tiny_model, mock_s3_client, 'models', 'plant_classifier/v1.keras', 'dynamic'
+            )
+            assert convert.call_count == 1
+
+            mock_s3_client.put_object(Bucket='models', Key='plant_classifier/v1.keras', Body=b'v2')
+            backends.load_or_convert_tflite(tiny_model, mock_s3_client, 'models', 'plant_classifier/v1.keras', 'dynamic')
+            assert convert.call_count == 2
+
+        assert first == second == b'flatbuffer'
+        assert tflite_key == 'plant_classifier/v1_dynamic.tflite'
+
+
+class TestRawDataReader:
+    """Tests de la lecture du bucket raw-data et des endpoints /predict-s3"""
+
+    class StubS3:
+        """Client boto3 minimal: get_object avec délai par clé et suivi des lectures simultanées"""
+
+        def __init__(self, objects, delays=None):
+            import threading
+            self.objects = objects
+            self.delays = delays or {}
+            self.bodies = []
+            self.in_flight = 0
+            self.max_in_flight = 0
+            self._lock = threading.Lock()
+
+        def get_object(self, Bucket, Key):
+            import io
+            import time
+            from botocore.exceptions import ClientError
+            with self._lock:
+                self.in_flight += 1
+                self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            try:
+                time.sleep(self.delays.get(Key, 0))
+                if Key not in self.objects:
+                    raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': 'absente'}}, 'GetObject')
+                body = io.BytesIO(self.objects[Key])
+                body.read = Mock(side_effect=body.read)
+                self.bodies.append(body)
+                return {'Body': body, 'ContentLength': len(self.objects[Key])}
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+
+    @staticmethod
+    def _jpeg(color):
+        import io
+        from PIL import Image
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 64), color).save(buffer, 'JPEG')
+        return buffer.getvalue()
+
+    def _reader(self, stub, max_bytes):
+        import object_store
+        with patch.object(object_store.boto3, 'client', return_value=stub):
+            return object_store.RawDataReader('raw-data', max_bytes, max_pool_connections=4)
+
+    def test_content_length_limit(self):
+        """Test qu'un objet trop volumineux est refusé d'après ContentLength, sans lire le corps"""
+        import fetcher
+
+        stub = self.StubS3({'raw/petite.jpg': b'x' * 10, 'raw/grande.jpg': b'x' * 1000})
+        reader = self._reader(stub, max_bytes=100)
+        try:
+            assert asyncio.run(reader.read('raw/petite.jpg')) == b'x' * 10
+            with pytest.raises(fetcher.ImageTooLargeError):
+                asyncio.run(reader.read('raw/grande.jpg'))
+        finally:
+            reader.shutdown()
+        assert not stub.bodies[1].read.called and all(body.closed for body in stub.bodies)
+
+    def test_predict_endpoints(self):
+        """Test de l'ordre du batch malgré des lectures concurrentes et des clés absentes"""
+        import json
+        from fastapi import HTTPException
+        import app as api_app
+        from batching import MicroBatcher
+        from model_holder import ServedModel
+
+        class ColorBackend:
+            """Probabilité "dandelion" = part du rouge (rouge / (rouge + vert))"""
+            name = 'stub'
+
+            def predict(self, batch):
+                red, green = batch[..., 0].mean(axis=(1, 2)), batch[..., 1].mean(axis=(1, 2))
+                dandelion = red / (red + green + 1e-6)
+                return np.stack([1 - dandelion, dandelion], axis=1)
+
+        stub = self.StubS3(
+            {'raw/herbe.jpg': self._jpeg((0, 200, 0)), 'raw/pissenlit.jpg': self._jpeg((230, 20, 0))},
+            delays={'raw/herbe.jpg': 0.1}
+        )
+        reader = self._reader(stub, max_bytes=1024 * 1024)
+
+        async def scenario():
+            batcher = MicroBatcher(lambda batch: ColorBackend().predict(batch), max_batch_size=8, max_wait_us=1000)
+            await batcher.start()
+            with patch.object(api_app, 'raw_data_reader', reader), patch.object(api_app, 'batcher', batcher), \
+                    patch.object(api_app, 'prediction_cache', None), \
+                    patch.object(api_app.model_holder, 'current', ServedModel(ColorBackend(), 'stub-v1')):
+                try:
+                    batch = await api_app.predict_batch_from_s3(api_app.S3BatchRequest(
+                        s3_keys=['raw/herbe.jpg', 'raw/absente.jpg', 's3://raw-data/raw/pissenlit.jpg']
+                    ))
+                    with pytest.raises(HTTPException) as missing:
+                        await api_app.predict_from_s3(api_app.S3ImageRequest(s3_key='s3://raw-data/raw/absente.jpg'))
+                    return json.loads(batch.body), missing.value
+                finally:
+                    await batcher.stop()
+
+        try:
+            body, missing = asyncio.run(scenario())
+        finally:
+            reader.shutdown()
+
+        results = body['results']
+        assert [result['index'] for result in results] == [0, 1, 2]
+        assert [result['s3_key'] for result in results] == ['raw/herbe.jpg', 'raw/absente.jpg', 'raw/pissenlit.jpg']
+        assert results[0]['predicted_class'] == 'grass' and results[2]['predicted_class'] == 'dandelion'
+        assert results[1]['status'] == 'error' and 'NoSuchKey' in results[1]['error']
+        assert (body['succeeded'], body['failed']) == (2, 1)
+        assert stub.max_in_flight >= 2
+        assert missing.status_code == 404
+
+
+class TestModelHolder:
+    """Tests du remplacement à chaud du modèle servi"""
+
+    @pytest.fixture
+    def holder_module(self):
+        try:
+            import model_holder
+            return model_holder
+        except ImportError:
+            pytest.skip("Module model_holder de l'API non disponible")
+
+    def test_swap_drains_in_flight_and_keeps_version_on_failure(self, holder_module):
+        """Test de la bascule après préparation, du drain des requêtes en cours et de l'échec sans bascule"""
+        holder = holder_module.ModelHolder(drain_timeout=5)
+        swapped = []
+
+        async def after_swap():
+            swapped.append(holder.current.version)
+
+        def failing_prepare():
+            raise RuntimeError("MinIO indisponible")
+
+        async def scenario():
+            await holder.reload(lambda: holder_module.ServedModel(object(), 'v1'))
+            v1 = holder.current
+
+            # Une requête en cours sur v1 garde sa version pendant le rechargement
+            with holder.lease() as leased:
+                task = holder.start_reload(lambda: holder_module.ServedModel(object(), 'v2'), after_swap)
+                while holder.current is v1:
+                    await asyncio.sleep(0.01)
+                assert leased is v1 and v1.in_flight == 1
+                assert holder.start_reload(lambda: holder_module.ServedModel(object(), 'v3')) is task
+                await asyncio.sleep(0.05)
+                assert not task.done() and swapped == []
+            reload = await task
+
+            failure = await holder.reload(failing_prepare)
+            return reload, failure
+
+        reload, failure = asyncio.run(asyncio.wait_for(scenario(), timeout=10))
+
+        assert reload["status"] == "success" and reload["previous"] == "v1" and reload["drained"]
+        assert swapped == ['v2']
+        assert failure["status"] == "failure" and failure["serving"] == "v2"
+        assert holder.current.version == 'v2' and holder.current.in_flight == 0